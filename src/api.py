@@ -1,55 +1,52 @@
+import asyncio
 import os
 import requests
 import json
 import time
 import re
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from src.config import (
      MODEL_NAME, TIMEOUT, PROMPT_FILE, FEW_SHOT_FILE,
     JSON_SCHEME_FILE, SCHEME_HINTS_FILE, ERROR_CODES, MODEL_NAME_VERY_SMART,
-    CATEGORIES_DICT, THEMES_DICT, EVENT_AGE_LIMITS
+    CATEGORIES_DICT, THEMES_DICT, EVENT_AGE_LIMITS, ROUTER_ENABLED,
+    RESULT_CACHE_ENABLED, NEAR_DUPLICATE_ENABLED, FAST_PATH_ENABLED, MODEL_POOL_RAM_BUDGET_GB
 )
-from src.utils import EventValidator
+from src.utils import EventValidator, load_parsed_results
 from src.local_model import LocalModel
 from src.prompt_manager import PromptManager
+from src.router import ModelRouter
+from src.result_cache import ResultCache
+from src.near_duplicate import NearDuplicateIndex
+from src.fast_path import FastPathParser
+from src.category_classifier import CategoryClassifier, HEADS
 from datetime import datetime
 
 def get_timestamp():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-class PromptManager:
-    def __init__(self):
-        self.prompt = self._load_file(PROMPT_FILE)
-        self.json_scheme = self._load_file(JSON_SCHEME_FILE)
-        # Remove few_shot examples and scheme_hints to reduce token count
-        self.few_shot = self._load_file(FEW_SHOT_FILE)
-        self.scheme_hints = self._load_file(SCHEME_HINTS_FILE)
-
-    @staticmethod
-    def _load_file(file_path: str) -> str:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
-
-    def replace_variables(self, text: str, variables: Dict[str, str]) -> str:
-        """Replaces variables in text with actual data"""
-        for var_name, var_value in variables.items():
-            text = text.replace(f"{{{{ {var_name} }}}}", str(var_value))
-        return text
-
-    def prepare_prompt(self, message: str) -> str:
-        """Prepares the full prompt with all variables"""
-        variables = {
-            "json_schema": self.json_scheme,
-            "schema_hints": self.scheme_hints,
-            "few_shot_examples": self.few_shot,
-            "message": message
-        }
-        return self.replace_variables(self.prompt, variables)
-
 class ModelAPI: 
-    def __init__(self):
-        self.prompt_manager = PromptManager()
-        self.model = LocalModel()
+    def __init__(
+        self,
+        n_threads: Optional[int] = None,
+        stats_file: str = 'data/parser_stats.json',
+        ram_budget_gb: Optional[float] = MODEL_POOL_RAM_BUDGET_GB,
+    ):
+        # History of parsed results is read once and shared by everything that learns from it
+        history = load_parsed_results()
+        self.prompt_manager = PromptManager(history)
+        self.model = LocalModel(
+            n_threads=n_threads, prompt_manager=self.prompt_manager, history=history, ram_budget_gb=ram_budget_gb
+        )
+        self.router = ModelRouter(history=history) if ROUTER_ENABLED else None
+        self.result_cache = ResultCache() if RESULT_CACHE_ENABLED else None
+        self.near_duplicates = NearDuplicateIndex() if NEAR_DUPLICATE_ENABLED else None
+        if self.near_duplicates is not None:
+            self.near_duplicates.load_history(history)
+        self.fast_path = FastPathParser() if FAST_PATH_ENABLED else None
+        self.classifier = CategoryClassifier.load()
+        # cache key -> future of the inference currently running for that text
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats_file = stats_file
         self.stats = {
             'total_events': 0,
             'processing_times': [],
@@ -66,6 +63,8 @@ class ModelAPI:
                 },
                 'last_errors': []  # Store last 10 errors with details
             },
+            'speculative': {'requests': 0, 'proposed': 0, 'accepted': 0},
+            'classifier': {'skipped_model_calls': 0, 'filled_fields': 0},
             'milestones': {
                 '10': {'avg_time': 0, 'smart_usage': 0},
                 '50': {'avg_time': 0, 'smart_usage': 0},
@@ -82,12 +81,18 @@ class ModelAPI:
                 'smart_usage_percent': (self.stats['very_smart_usage'] / self.stats['total_events']) * 100 if self.stats['total_events'] > 0 else 0,
                 'error_rate': (self.stats['errors']['total_errors'] / self.stats['total_events']) * 100 if self.stats['total_events'] > 0 else 0,
                 'errors_by_type': self.stats['errors']['by_type'],
-                'last_errors': self.stats['errors']['last_errors']
+                'last_errors': self.stats['errors']['last_errors'],
+                'speculative_accept_rate': self.stats['speculative']['accepted'] / self.stats['speculative']['proposed'] if self.stats['speculative']['proposed'] else 0,
+                'routing': self.router.report() if self.router else None,
+                'result_cache': self.result_cache.report() if self.result_cache else None,
+                'near_duplicates': self.near_duplicates.stats if self.near_duplicates else None,
+                'fast_path': self.fast_path.report() if self.fast_path else None,
+                'classifier': self.stats['classifier']
             },
             'milestones': self.stats['milestones']
         }
         
-        with open('data/parser_stats.json', 'w', encoding='utf-8') as f:
+        with open(self.stats_file, 'w', encoding='utf-8') as f:
             json.dump(stats_data, f, ensure_ascii=False, indent=2)
 
     def get_stats(self) -> Dict[str, Any]:
@@ -125,6 +130,16 @@ class ModelAPI:
             'last_errors': self.stats['errors']['last_errors']
         }
 
+    def _track_speculative(self):
+        """Accumulates draft acceptance stats of the last model call"""
+        spec_stats = self.model.last_speculative_stats
+        if not spec_stats:
+            return
+        self.stats['speculative']['requests'] += 1
+        self.stats['speculative']['proposed'] += spec_stats['proposed']
+        self.stats['speculative']['accepted'] += spec_stats['accepted']
+        self.model.last_speculative_stats = None
+
     def _track_error(self, error_code: str, error_details: str):
         """Tracks error statistics"""
         self.stats['errors']['total_errors'] += 1
@@ -148,8 +163,104 @@ class ModelAPI:
         # Save stats after each error
         self.save_stats_to_json()
 
-    async def call_model_api(self, text: str) -> Dict[str, Any]:
-        """Calls the model API and processes the response"""
+    def _lookup_known_result(self, text: str, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Returns a stored result for the same or a near-duplicate text, if any"""
+        if key is not None:
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                revalidated = self._revalidate_known_result(cached, text)
+                if revalidated is not None:
+                    print(f"[{get_timestamp()}] 🗄️ Результат взят из кеша: {cached.get('eventTitle', '')}")
+                    return revalidated
+        if self.near_duplicates is None:
+            return None
+        reused = self.near_duplicates.reuse(text)
+        if reused is None:
+            return None
+        return self._revalidate_known_result(reused, text)
+
+    def _revalidate_known_result(self, result: Dict[str, Any], text: str) -> Optional[Dict[str, Any]]:
+        """A stored result must pass the same validation as a fresh model response: the event may have passed since"""
+        validate_response = self._validate_response(result, text)
+        if validate_response.get("type") != "success":
+            return None
+        return self._update_event_with_validation(result, validate_response)
+
+    def _remember_result(self, text: str, key: Optional[str], response: Dict[str, Any],
+                         event_id: Optional[str] = None):
+        result = response.get("result")
+        if not isinstance(result, dict) or 'errorCode' in result:
+            return
+        if key is not None:
+            self.result_cache.put(key, result)
+        # Индекс почти-дубликатов ссылается на событие в ResultStore — без id запоминать нечего
+        if self.near_duplicates is not None and event_id is not None:
+            self.near_duplicates.add(text, event_id)
+
+    def _known_result_response(self, result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        processing_time = time.time() - start_time
+        self.stats['total_events'] += 1
+        self.stats['processing_times'].append(processing_time)
+        return {
+            "result": result,
+            "processing_time": processing_time,
+            "cached": True
+        }
+
+    def lookup_known(self, text: str) -> Optional[Dict[str, Any]]:
+        """Returns a ready response for a repeated or near-duplicate text, without inference"""
+        start_time = time.time()
+        key = self.result_cache.key(text) if self.result_cache else None
+        known = self._lookup_known_result(text, key)
+        if known is None:
+            return None
+        response = self._known_result_response(known, start_time)
+        self.save_stats_to_json()
+        return response
+
+    async def call_model_api(self, text: str, lookup: bool = True,
+                             event_id: Optional[str] = None) -> Dict[str, Any]:
+        """Calls the model API, serving repeated and near-duplicate texts without inference.
+
+        lookup=False skips the known-result lookup when the caller has already done it.
+        event_id lets the near-duplicate index point at the event's stored result.
+        """
+        start_time = time.time()
+        if lookup:
+            known = self.lookup_known(text)
+            if known is not None:
+                return known
+        key = self.result_cache.key(text) if self.result_cache else None
+        if key is None:
+            response = await self._call_model_api(text)
+            self._remember_result(text, key, response, event_id)
+            return response
+
+        # Single-flight: тот же текст уже в работе — ждём его результат вместо второго инференса
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                response = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if inflight.cancelled():
+                    return await self.call_model_api(text, lookup, event_id)
+                raise
+            return {**response, "processing_time": time.time() - start_time}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._call_model_api(text)
+            self._remember_result(text, key, response, event_id)
+            future.set_result(response)
+            return response
+        finally:
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(key, None)
+
+    async def _call_model_api(self, text: str) -> Dict[str, Any]:
+        """Runs inference for one text and processes the response"""
         start_time = time.time()
         
         try:
@@ -182,6 +293,59 @@ class ModelAPI:
                 start_time
             )
 
+    async def call_model_api_batch(self, texts: List[str],
+                                   event_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Processes several events, decoding only the ones without a known result"""
+        if event_ids is None:
+            event_ids = [None] * len(texts)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        keys = [self.result_cache.key(text) if self.result_cache else None for text in texts]
+        for i, (text, key) in enumerate(zip(texts, keys)):
+            start_time = time.time()
+            known = self._lookup_known_result(text, key)
+            if known is not None:
+                results[i] = self._known_result_response(known, start_time)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            responses = await self._call_model_api_batch([texts[i] for i in pending])
+            for i, response in zip(pending, responses):
+                self._remember_result(texts[i], keys[i], response, event_ids[i])
+                results[i] = response
+        return results
+
+    async def _call_model_api_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Processes several events with one batched decode of the regular model"""
+        start_time = time.time()
+        try:
+            responses = await self.model.agenerate_structured_batch(
+                [self._get_request_data(text) for text in texts],
+                MODEL_NAME
+            )
+        except Exception as e:
+            return [self._create_error_response(f"💥 Ошибка при вызове модели: {str(e)}", start_time) for _ in texts]
+
+        # Время батча делится поровну между его событиями
+        batch_time = (time.time() - start_time) / len(texts)
+        results = []
+        for text, response in zip(texts, responses):
+            item_start = time.time()
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                result = await self._handle_regular_response(text, response)
+            except Exception as e:
+                results.append(self._create_error_response(f"💥 Ошибка при вызове модели: {str(e)}", item_start - batch_time))
+                continue
+            processing_time = batch_time + time.time() - item_start
+            self.stats['total_events'] += 1
+            self.stats['processing_times'].append(processing_time)
+            results.append({
+                "result": result,
+                "processing_time": processing_time
+            })
+        self.save_stats_to_json()
+        return results
+
     async def _make_api_request(self, text: str, isVerySmart: bool = False) -> Dict[str, Any]:
         """Makes the actual API request to the model"""
         if isVerySmart:
@@ -209,57 +373,153 @@ class ModelAPI:
                 dict_event[key] = validate_response.get(key, "")
         return dict_event
 
+    @staticmethod
+    def _dump_request(prompt: str):
+        """Writes the last regular-model prompt for debugging"""
+        os.makedirs('data', exist_ok=True)
+        with open('data/regular_request.txt', 'w', encoding='utf-8') as f:
+            f.write(prompt)
+
+    @staticmethod
+    def _append_request_error(error_data: Dict[str, Any]):
+        """Appends a failed regular-model response to data/regular_request_error.json"""
+        # Читаем существующие ошибки или создаем новый список
+        try:
+            with open('data/regular_request_error.json', 'r', encoding='utf-8') as f:
+                errors = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            errors = []
+        
+        if not isinstance(errors, list):
+            errors = []
+            
+        # Добавляем новую ошибку
+        errors.append(error_data)
+        
+        # Сохраняем обновленный список ошибок
+        with open('data/regular_request_error.json', 'w', encoding='utf-8') as f:
+            json.dump(errors, ensure_ascii=False, indent=2, fp=f)
+
     async def _make_regular_request(self, text: str) -> Dict[str, Any]:
         """Makes request using regular model"""
-        os.makedirs('data', exist_ok=True)
-        open('data/regular_request.txt', 'w', encoding='utf-8').write(self._get_request_data(text))
+        fast_result = await self._make_fast_path_request(text)
+        if fast_result is not None:
+            return fast_result
+        if self.router and self.router.should_use_very_smart(text):
+            return await self._make_very_smart_request(text)
+        # Промпт собирается один раз и только когда событию действительно нужна модель
+        prompt = self._get_request_data(text)
+        # Файловый ввод-вывод вне event loop, пока идёт инференс других событий
+        await asyncio.to_thread(self._dump_request, prompt)
+        try:
+            request_start = time.time()
+            response = await self.model.agenerate_structured_response(prompt, MODEL_NAME)
+            if self.router:
+                self.router.observe_time('regular', time.time() - request_start)
+            self._track_speculative()
+            return await self._handle_regular_response(text, response)
+        except Exception as e:
+            print(f"[{get_timestamp()}] 💥 Error in _make_regular_request: {str(e)}")
+            raise
+
+    async def _make_fast_path_request(self, text: str) -> Optional[Dict[str, Any]]:
+        """Parses templated inputs by rules and asks the model only for categories and themes"""
+        if self.fast_path is None:
+            return None
+        parsed = self.fast_path.parse(text)
+        if parsed is None:
+            return None
+        dict_event, fields = parsed
+        prediction = self.classifier.predict(text) if self.classifier else None
+        try:
+            if prediction and all(prediction['confident'].values()):
+                # Классификатор уверен в обоих полях — модель не нужна вовсе
+                classification = {field: prediction[field] for field in HEADS}
+                self.stats['classifier']['skipped_model_calls'] += 1
+            else:
+                classification = await self.model.aclassify_event(
+                    self.fast_path.classification_prompt(fields),
+                    MODEL_NAME
+                )
+        except Exception as e:
+            print(f"[{get_timestamp()}] ⚡ Быстрый путь: модель не выбрала категории ({str(e)}), полный разбор")
+            self.fast_path.record(covered=False)
+            return None
+        dict_event.update(classification)
+        validate_response = self._validate_response(dict_event, text)
+        if validate_response.get("type") == "error_date_in_past":
+            self.fast_path.record(covered=True)
+            self._track_error('DATE_IN_PAST', str(validate_response.get("errorDetails", "No details")))
+            return {
+                'errorCode': ERROR_CODES['NOT_PARSED'] + '_1',
+                'errorDetails': dict_event,
+                'errorText': 'NOT_PARSED'
+            }
+        if validate_response.get("type") != "success":
+            self.fast_path.record(covered=False)
+            return None
+        self.fast_path.record(covered=True)
+        print(f"[{get_timestamp()}] ⚡ success: {dict_event.get('eventTitle', '')} быстрый путь")
+        return self._update_event_with_validation(dict_event, validate_response)
+
+    def _fill_from_classifier(self, dict_event: Dict[str, Any], text: str):
+        """Replaces empty or out-of-dictionary categories/themes with confident classifier labels"""
+        if self.classifier is None or not isinstance(dict_event, dict):
+            return
+        prediction = None
+        for field, labels in HEADS.items():
+            values = dict_event.get(field)
+            if isinstance(values, list) and any(value in labels for value in values):
+                continue
+            prediction = prediction or self.classifier.predict(text)
+            if prediction['confident'][field]:
+                dict_event[field] = prediction[field]
+                self.stats['classifier']['filled_fields'] += 1
+                print(f"[{get_timestamp()}] 🏷️ {field} взяты из классификатора: {prediction[field]}")
+
+    async def _handle_regular_response(self, text: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Validates regular model output and escalates to the very smart model if needed"""
         try:
-            response = self.model.generate_structured_response(
-                self._get_request_data(text),
-                MODEL_NAME
-            )
             dict_event = response.get('data', {})
+            if response.get('earlyAbort'):
+                # Досрочный отказ по датам умная модель не исправит, это не провал обычной
+                if self.router:
+                    self.router.record(text, failed=False)
+                return self._early_abort_response(response, '_1')
+            self._fill_from_classifier(dict_event, text)
   
             validate_response = self._validate_response(dict_event, text)
-            if validate_response.get("type") == "error" or validate_response.get("type") == "error_date_in_past":
-    
+            # Прошедшее событие или отказ самой модели (реклама, нет даты) — окончательный ответ
+            if validate_response.get("type") == "error_date_in_past" or (
+                validate_response.get("type") == "error" and 'errorCode' in dict_event
+            ):
                 self._track_error('NOT_PARSED', str(validate_response.get("errorDetails", "No details")))
+                if self.router:
+                    self.router.record(text, failed=False)
                 return {
                     'errorCode': ERROR_CODES['NOT_PARSED'] + '_1',
                     'errorDetails': dict_event,
                     'errorText': 'NOT_PARSED'
                 }
-            if validate_response.get("type") != "success" and 'errorCode' not in dict_event:
+            if validate_response.get("type") != "success":
                 error_data = {
                     "timestamp": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
                     "text": text,
                     "dict_event": dict_event,
                     "validate_response": validate_response
                 }
-                
-                # Читаем существующие ошибки или создаем новый список
-                try:
-                    with open('data/regular_request_error.json', 'r', encoding='utf-8') as f:
-                        errors = json.load(f)
-                except (FileNotFoundError, json.JSONDecodeError):
-                    errors = []
-                
-                if not isinstance(errors, list):
-                    errors = []
-                    
-                # Добавляем новую ошибку
-                errors.append(error_data)
-                
-                # Сохраняем обновленный список ошибок
-                with open('data/regular_request_error.json', 'w', encoding='utf-8') as f:
-                    json.dump(errors, ensure_ascii=False, indent=2, fp=f)
+                await asyncio.to_thread(self._append_request_error, error_data)
                 print(f"[{get_timestamp()}] ♻️ Модель {MODEL_NAME} не смогла распарсить событие, пытаюсь еще раз с умной моделью {MODEL_NAME_VERY_SMART}")
+                if self.router:
+                    self.router.record(text, failed=True)
                 return await self._make_very_smart_request(text)
 
+            if self.router:
+                self.router.record(text, failed=False)
             print(f"[{get_timestamp()}] 🏷️ success: {dict_event.get('eventTitle', '')} model {MODEL_NAME.split('/')[-1]}")
             return self._update_event_with_validation(dict_event, validate_response)
         except Exception as e:
-            print(f"[{get_timestamp()}] 💥 Error in _make_regular_request: {str(e)}")
+            print(f"[{get_timestamp()}] 💥 Error in _handle_regular_response: {str(e)}")
             raise
 
     async def _make_very_smart_request(self, text: str) -> Dict[str, Any]:
@@ -268,11 +528,18 @@ class ModelAPI:
         self.stats['very_smart_usage'] += 1
 
         try:
-            response = self.model.generate_structured_response(
+            request_start = time.time()
+            response = await self.model.agenerate_structured_response(
                 self._get_request_data(text),
                 MODEL_NAME_VERY_SMART
             )
+            if self.router:
+                self.router.observe_time('very_smart', time.time() - request_start)
+            self._track_speculative()
             dict_event = response.get('data', {})
+            if response.get('earlyAbort'):
+                return self._early_abort_response(response, '_2')
+            self._fill_from_classifier(dict_event, text)
             validate_response = self._validate_response(dict_event, text)
 
             if validate_response.get("type") == "error" or validate_response.get("type") == "error_date_in_past":
@@ -290,6 +557,17 @@ class ModelAPI:
             print(f"[{get_timestamp()}] 💥 Error in _make_very_smart_request: {str(e)}")
             raise
 
+    def _early_abort_response(self, response: Dict[str, Any], suffix: str) -> Dict[str, Any]:
+        """Builds NOT_PARSED result for a generation stopped early by StreamGuard"""
+        abort = response['earlyAbort']
+        self._track_error(abort['reason'], abort['details'])
+        print(f"[{get_timestamp()}] ✂️ Событие отклонено досрочно: {abort['details']}")
+        return {
+            'errorCode': ERROR_CODES['NOT_PARSED'] + suffix,
+            'errorDetails': response.get('data', {}),
+            'errorText': 'NOT_PARSED'
+        }
+
     @staticmethod
     def _validate_response(response, initial_text: str) -> bool:
         try:
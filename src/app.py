@@ -2,7 +2,7 @@ from flask import Flask, jsonify, render_template_string
 from src.api import ModelAPI
 from .utils import DataLoader
 from .templates import MAIN_TEMPLATE
-from .sync import getListForSync ,fillLocalList, clearLocalList
+from .sync import getListForSync ,fillLocalList, getBackendClient
 app = Flask(__name__)
 model_api = ModelAPI()
 data_loader = DataLoader()
@@ -13,8 +13,11 @@ def index():
 
 @app.route("/get_events", methods=["GET"])
 async def get_events():
-    clearLocalList()
-    list = await getListForSync()
+    try:
+        list = await getListForSync()
+    finally:
+        # Flask запускает каждый запрос в своём event loop: сессию закрываем, пока он жив
+        await getBackendClient().close()
     fillLocalList(list)
     data = data_loader.load_test_data()
     if not data:
@@ -23,11 +26,7 @@ async def get_events():
 
 @app.route("/process_single/<string:event_id>", methods=["GET"])
 async def process_single(event_id):
-    data = data_loader.load_test_data()
-    if not data:
-        return jsonify({"error": "test.json не найден"}), 404
-    
-    event = data_loader.get_event_by_id(event_id, data)
+    event = data_loader.get_event_by_id(event_id)
     if not event:
         return jsonify({"error": "Событие не найдено"}), 404
     
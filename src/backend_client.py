@@ -0,0 +1,121 @@
+import asyncio
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import aiohttp
+from src.config import (
+    ACCESS_TOKEN, BACKEND_URL, BACKEND_CONCURRENCY, BACKEND_TIMEOUT, BACKEND_RETRIES, BACKEND_BACKOFF
+)
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class BackendError(Exception):
+    """Запрос к бэкенду не удался и после всех повторов; status — HTTP-код, если ответ был"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class BackendClient:
+    """Асинхронный клиент интеграционного API momenta с общим пулом соединений.
+
+    Одна aiohttp-сессия держит keep-alive соединения, семафор ограничивает число
+    одновременных запросов, у каждого вызова свой таймаут. Сетевые ошибки, 429 и
+    5xx повторяются с экспоненциальной задержкой и случайным разбросом. Сессия
+    привязана к event loop, поэтому при вызове из другого цикла она создаётся
+    заново, а старая закрывается на своём цикле. Короткоживущий цикл (Flask
+    создаёт новый на каждый запрос) должен сам вызвать close до своего завершения.
+    """
+
+    def __init__(
+        self,
+        base_url: str = BACKEND_URL,
+        token: str = ACCESS_TOKEN,
+        concurrency: int = BACKEND_CONCURRENCY,
+        timeout: float = BACKEND_TIMEOUT,
+        retries: int = BACKEND_RETRIES,
+        backoff: float = BACKEND_BACKOFF,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json'
+        }
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._loop is not loop:
+            self._drop_stale_session()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._session
+
+    def _drop_stale_session(self):
+        """Закрывает сессию другого цикла, не трогая текущий"""
+        session, loop = self._session, self._loop
+        self._session = None
+        if loop is not None and loop.is_running():
+            # Цикл работает в другом потоке: закрываем сессию на нём же
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        # Цикл не работает, и await на нём невозможен: сессию только отвязываем,
+        # закрывать её нужно через close() до завершения цикла
+        print(f"[{get_timestamp()}] 🌐 Сессия завершённого event loop не была закрыта через close()")
+        session.detach()
+
+    async def post(self, endpoint: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        session = self._get_session()
+        url = f"{self.base_url}/{endpoint}"
+        for attempt in range(self.retries + 1):
+            self.stats["requests"] += 1
+            try:
+                async with self._semaphore:
+                    async with session.post(url, json=payload) as response:
+                        if response.status not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+                        error: Exception = BackendError(f"{endpoint}: HTTP {response.status}", response.status)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            except aiohttp.ClientResponseError as e:
+                self.stats["failures"] += 1
+                raise BackendError(f"{endpoint}: HTTP {e.status}", e.status) from e
+            if attempt < self.retries:
+                self.stats["retries"] += 1
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                print(f"[{get_timestamp()}] 🌐 {endpoint}: {error!r}, повтор через {delay:.1f} сек")
+                await asyncio.sleep(delay)
+        self.stats["failures"] += 1
+        raise BackendError(f"{endpoint}: {error!r}", getattr(error, "status", None)) from error
+
+    async def get_events_for_parsing(self) -> List[Dict[str, Any]]:
+        response = await self.post("getEventsForParsing")
+        return response['data']
+
+    async def fill_parsing_event_result(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.post("fillParsingEventResult", payload)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
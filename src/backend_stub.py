@@ -0,0 +1,57 @@
+import argparse
+import json
+import random
+from datetime import datetime
+from typing import Any, Dict, List
+from aiohttp import web
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def make_app(events: List[Dict[str, Any]], failure_rate: float = 0.0) -> web.Application:
+    """Локальная замена интеграционного API для запуска sync без сети.
+
+    getEventsForParsing отдаёт события, ещё не получившие результат,
+    fillParsingEventResult сохраняет результат в памяти. С вероятностью
+    failure_rate запрос отвечает 503, чтобы проверить повторы клиента.
+    """
+    results: Dict[str, Any] = {}
+
+    def maybe_fail():
+        if random.random() < failure_rate:
+            raise web.HTTPServiceUnavailable()
+
+    async def get_events_for_parsing(request: web.Request) -> web.Response:
+        maybe_fail()
+        return web.json_response({"data": [event for event in events if event["id"] not in results]})
+
+    async def fill_parsing_event_result(request: web.Request) -> web.Response:
+        maybe_fail()
+        payload = await request.json()
+        results[str(payload["id"])] = payload.get("result")
+        print(f"[{get_timestamp()}] 📬 Результат по событию {payload['id']} получен")
+        return web.json_response({"message": "Успешное сохранение результата"})
+
+    app = web.Application()
+    app["results"] = results
+    app.router.add_post("/getEventsForParsing", get_events_for_parsing)
+    app.router.add_post("/fillParsingEventResult", fill_parsing_event_result)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка бэкенда: BACKEND_URL=http://127.0.0.1:8099")
+    parser.add_argument("--events", help='JSON-файл вида {"data": [{"id": ..., "input": ...}]}')
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    events = []
+    if args.events:
+        with open(args.events, "r", encoding="utf-8") as f:
+            events = json.load(f)["data"]
+    web.run_app(make_app(events, args.failure_rate), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+from datetime import datetime
+from typing import List, Optional, Sequence
+import time
+import llama_cpp
+from llama_cpp import Llama, LlamaGrammar
+from llama_cpp import _internals as internals
+from src.config import BATCH_N_CTX
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BatchDecoder:
+    """Параллельное декодирование нескольких событий в одном llama-контексте.
+
+    Статический префикс вычисляется один раз в последовательности 0 и копируется
+    в остальные через общий KV-кеш, дальше каждая последовательность дописывает
+    свой суффикс и декодируется под собственной грамматикой. На каждом шаге все
+    активные последовательности проходят через модель одним батчем.
+    """
+
+    def __init__(self, llama: Llama, n_seq_max: int, n_ctx: int = BATCH_N_CTX):
+        self.llama = llama
+        self.n_seq_max = n_seq_max
+        self.n_batch = llama.n_batch
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = n_ctx
+        params.n_batch = llama.context_params.n_batch
+        params.n_ubatch = llama.context_params.n_ubatch
+        params.n_threads = llama.context_params.n_threads
+        params.n_threads_batch = llama.context_params.n_threads_batch
+        params.n_seq_max = n_seq_max
+        # Общий буфер нужен, чтобы префикс физически хранился один раз для всех последовательностей
+        params.kv_unified = True
+        self.ctx = internals.LlamaContext(model=llama._model, params=params, verbose=False)
+        self.batch = internals.LlamaBatch(
+            n_tokens=max(self.n_batch, n_seq_max), embd=0, n_seq_max=n_seq_max, verbose=False
+        )
+        self.n_ctx = n_ctx
+        self.prefix_tokens: List[int] = []
+
+    def close(self):
+        self.batch.close()
+        self.ctx.close()
+
+    def _decode(self, tokens: Sequence[int], start_pos: int, seq_id: int) -> int:
+        """Декодирует токены одной последовательности, возвращает индекс логитов последнего"""
+        last_idx = 0
+        for offset in range(0, len(tokens), self.n_batch):
+            chunk = tokens[offset:offset + self.n_batch]
+            batch = self.batch.batch
+            batch.n_tokens = len(chunk)
+            for i, token in enumerate(chunk):
+                batch.token[i] = token
+                batch.pos[i] = start_pos + offset + i
+                batch.seq_id[i][0] = seq_id
+                batch.n_seq_id[i] = 1
+                batch.logits[i] = False
+            last_idx = len(chunk) - 1
+            batch.logits[last_idx] = True
+            self.ctx.decode(self.batch)
+        return last_idx
+
+    def _ensure_prefix(self, prefix_tokens: List[int]):
+        if self.prefix_tokens == prefix_tokens:
+            return
+        start_time = time.time()
+        self.ctx.kv_cache_clear()
+        self._decode(prefix_tokens, 0, 0)
+        self.prefix_tokens = list(prefix_tokens)
+        print(f"[{get_timestamp()}] 🧊 Префикс для батча ({len(prefix_tokens)} токенов) вычислен за {time.time() - start_time:.2f} сек")
+
+    def _make_sampler(self, grammar: Optional[LlamaGrammar], temperature: float, seed: int) -> internals.LlamaSampler:
+        sampler = internals.LlamaSampler()
+        if grammar is not None:
+            sampler.add_grammar(self.llama._model, grammar)
+        sampler.add_top_k(40)
+        sampler.add_top_p(0.95, 1)
+        sampler.add_min_p(0.05, 1)
+        sampler.add_temp(temperature)
+        sampler.add_dist(seed)
+        return sampler
+
+    def generate(
+        self,
+        prefix_tokens: List[int],
+        suffixes: List[List[int]],
+        temperatures: List[float],
+        max_tokens: List[int],
+        grammar: Optional[LlamaGrammar] = None,
+        seed: int = llama_cpp.LLAMA_DEFAULT_SEED,
+    ) -> List[str]:
+        """Генерирует ответы для всех суффиксов, возвращает сырой текст по каждому"""
+        if len(suffixes) > self.n_seq_max:
+            raise ValueError(f"Батч из {len(suffixes)} последовательностей больше n_seq_max={self.n_seq_max}")
+        required = len(prefix_tokens) + sum(len(s) + m for s, m in zip(suffixes, max_tokens))
+        if required > self.n_ctx:
+            raise ValueError(f"Батчу нужно {required} токенов контекста, доступно {self.n_ctx}")
+
+        self._ensure_prefix(prefix_tokens)
+        n_prefix = len(prefix_tokens)
+        # Убираем хвосты прошлого батча, префикс в seq 0 остаётся
+        self.ctx.kv_cache_seq_rm(0, n_prefix, -1)
+        for seq_id in range(1, self.n_seq_max):
+            self.ctx.kv_cache_seq_rm(seq_id, -1, -1)
+
+        vocab = self.llama._model.vocab
+        samplers = [self._make_sampler(grammar, t, seed + i) for i, t in enumerate(temperatures)]
+        outputs: List[List[int]] = [[] for _ in suffixes]
+        positions = [n_prefix + len(suffix) for suffix in suffixes]
+        active = []
+
+        # Префилл суффиксов: по одной последовательности, сразу берём первый токен
+        for seq_id, suffix in enumerate(suffixes):
+            if seq_id > 0:
+                self.ctx.kv_cache_seq_cp(0, seq_id, 0, n_prefix)
+            idx = self._decode(suffix, n_prefix, seq_id)
+            token = samplers[seq_id].sample(self.ctx, idx)
+            if llama_cpp.llama_vocab_is_eog(vocab, token) or max_tokens[seq_id] <= 0:
+                continue
+            outputs[seq_id].append(token)
+            active.append(seq_id)
+
+        # Декод: один токен от каждой активной последовательности за шаг
+        while active:
+            batch = self.batch.batch
+            batch.n_tokens = len(active)
+            for i, seq_id in enumerate(active):
+                batch.token[i] = outputs[seq_id][-1]
+                batch.pos[i] = positions[seq_id]
+                batch.seq_id[i][0] = seq_id
+                batch.n_seq_id[i] = 1
+                batch.logits[i] = True
+                positions[seq_id] += 1
+            self.ctx.decode(self.batch)
+
+            still_active = []
+            for i, seq_id in enumerate(active):
+                token = samplers[seq_id].sample(self.ctx, i)
+                if llama_cpp.llama_vocab_is_eog(vocab, token):
+                    continue
+                outputs[seq_id].append(token)
+                if len(outputs[seq_id]) < max_tokens[seq_id]:
+                    still_active.append(seq_id)
+            active = still_active
+
+        for sampler in samplers:
+            sampler.close()
+        return [
+            self.llama.detokenize(tokens).decode("utf-8", errors="ignore")
+            for tokens in outputs
+        ]
@@ -0,0 +1,195 @@
+import argparse
+import os
+import random
+import re
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from src.config import (
+    CATEGORIES_DICT, THEMES_DICT, CLASSIFIER_FILE, CLASSIFIER_DIM, CLASSIFIER_THRESHOLD
+)
+from src.utils import load_parsed_results
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+HEADS = {
+    "eventCategories": CATEGORIES_DICT,
+    "eventThemes": THEMES_DICT,
+}
+
+
+def hashed_features(text: str, dim: int = CLASSIFIER_DIM) -> Tuple[np.ndarray, np.ndarray]:
+    """Индексы и веса хешированных признаков: слова, биграммы слов и символьные 4-граммы"""
+    words = re.findall(r"\w+", text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        grams.extend(padded[i:i + 4] for i in range(max(1, len(padded) - 3)))
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    indices, counts = np.unique(
+        np.fromiter((zlib.crc32(gram.encode("utf-8")) % dim for gram in grams), dtype=np.int64, count=len(grams)),
+        return_counts=True
+    )
+    values = np.log1p(counts).astype(np.float32)
+    return indices, values / np.linalg.norm(values)
+
+
+class CategoryClassifier:
+    """One-vs-rest логистическая регрессия по хешированным n-граммам для категорий и тем.
+
+    Для каждого поля своя матрица весов dim × число меток; предсказание — сумма
+    нескольких сотен строк матрицы и сигмоида, без модели и GPU.
+    """
+
+    def __init__(self, dim: int = CLASSIFIER_DIM):
+        self.dim = dim
+        self.weights = {field: np.zeros((dim, len(labels)), dtype=np.float32) for field, labels in HEADS.items()}
+        self.biases = {field: np.zeros(len(labels), dtype=np.float32) for field, labels in HEADS.items()}
+
+    @staticmethod
+    def _targets(field: str, values: Sequence[str]) -> np.ndarray:
+        labels = HEADS[field]
+        target = np.zeros(len(labels), dtype=np.float32)
+        for value in values:
+            if value in labels:
+                target[labels.index(value)] = 1.0
+        return target
+
+    def fit(self, texts: List[str], answers: List[Dict[str, List[str]]], epochs: int = 8, lr: float = 0.5, l2: float = 1e-6):
+        """SGD по примерам; answers — словари с eventCategories и eventThemes"""
+        features = [hashed_features(text, self.dim) for text in texts]
+        targets = {field: [self._targets(field, answer.get(field, [])) for answer in answers] for field in HEADS}
+        order = list(range(len(texts)))
+        rng = random.Random(0)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            step = lr / (1 + epoch)
+            for i in order:
+                indices, values = features[i]
+                for field in HEADS:
+                    weights, bias = self.weights[field], self.biases[field]
+                    rows = weights[indices]
+                    probs = 1.0 / (1.0 + np.exp(-(values @ rows + bias)))
+                    grad = probs - targets[field][i]
+                    weights[indices] = rows * (1 - step * l2) - step * np.outer(values, grad)
+                    bias -= step * grad
+
+    def predict_proba(self, text: str) -> Dict[str, np.ndarray]:
+        indices, values = hashed_features(text, self.dim)
+        return {
+            field: 1.0 / (1.0 + np.exp(-(values @ self.weights[field][indices] + self.biases[field])))
+            for field in HEADS
+        }
+
+    def predict(self, text: str, threshold: float = CLASSIFIER_THRESHOLD) -> Dict[str, Any]:
+        """Метки с вероятностью не ниже threshold (до 3) и флаг уверенности по каждому полю.
+
+        Поле уверенное, если хотя бы одна метка прошла порог; иначе решает модель.
+        """
+        result: Dict[str, Any] = {"confident": {}}
+        for field, probs in self.predict_proba(text).items():
+            ranked = np.argsort(-probs)[:3]
+            labels = [HEADS[field][i] for i in ranked if probs[i] >= threshold]
+            result["confident"][field] = bool(labels)
+            result[field] = labels or [HEADS[field][ranked[0]]]
+        return result
+
+    def save(self, path: str = CLASSIFIER_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {}
+        for field in HEADS:
+            arrays[f"{field}_weights"] = self.weights[field]
+            arrays[f"{field}_bias"] = self.biases[field]
+            arrays[f"{field}_labels"] = np.array(HEADS[field])
+        np.savez_compressed(path, dim=self.dim, **arrays)
+
+    @classmethod
+    def load(cls, path: str = CLASSIFIER_FILE) -> Optional["CategoryClassifier"]:
+        """Загружает модель; None, если файла нет или справочники с тех пор изменились"""
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        for field, labels in HEADS.items():
+            if data[f"{field}_labels"].tolist() != list(labels):
+                print(f"[{get_timestamp()}] ⚠️ Справочник {field} изменился, классификатор нужно переобучить")
+                return None
+        model = cls(dim=int(data["dim"]))
+        for field in HEADS:
+            model.weights[field] = data[f"{field}_weights"]
+            model.biases[field] = data[f"{field}_bias"]
+        return model
+
+
+def training_examples() -> Tuple[List[str], List[Dict[str, List[str]]]]:
+    """Пары (текст события, категории и темы) из разобранных результатов"""
+    texts, answers = [], []
+    for entry in load_parsed_results():
+        text, result = entry.get("initial_event"), entry.get("result")
+        if not isinstance(text, str) or not isinstance(result, dict):
+            continue
+        if result.get("eventCategories") and result.get("eventThemes"):
+            texts.append(text)
+            answers.append({field: result[field] for field in HEADS})
+    return texts, answers
+
+
+def evaluate(model: CategoryClassifier, texts: List[str], answers: List[Dict[str, List[str]]], threshold: float = CLASSIFIER_THRESHOLD) -> Dict[str, Any]:
+    """Точность и полнота меток, доля уверенных предсказаний и их точность, время предсказания"""
+    report: Dict[str, Any] = {}
+    start = time.perf_counter()
+    predictions = [model.predict(text, threshold) for text in texts]
+    report["predict_us"] = (time.perf_counter() - start) / max(1, len(texts)) * 1e6
+    for field in HEADS:
+        true_positive = predicted = actual = confident = confident_correct = 0
+        for prediction, answer in zip(predictions, answers):
+            labels, expected = set(prediction[field]), set(answer[field])
+            true_positive += len(labels & expected)
+            predicted += len(labels)
+            actual += len(expected)
+            if prediction["confident"][field]:
+                confident += 1
+                confident_correct += int(labels <= expected)
+        report[field] = {
+            "precision": true_positive / predicted if predicted else 0,
+            "recall": true_positive / actual if actual else 0,
+            "confident_share": confident / len(texts) if texts else 0,
+            "confident_precision": confident_correct / confident if confident else 0,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Классификатор категорий и тем событий")
+    parser.add_argument("command", choices=["train", "eval"])
+    parser.add_argument("--holdout", type=float, default=0.2, help="доля примеров для оценки при train")
+    parser.add_argument("--threshold", type=float, default=CLASSIFIER_THRESHOLD)
+    args = parser.parse_args()
+
+    texts, answers = training_examples()
+    print(f"[{get_timestamp()}] 📚 Примеров с категориями и темами: {len(texts)}")
+    if args.command == "eval":
+        model = CategoryClassifier.load()
+        if model is None:
+            print(f"[{get_timestamp()}] ❌ Классификатор не обучен: {CLASSIFIER_FILE}")
+            return
+        print(evaluate(model, texts, answers, args.threshold))
+        return
+
+    split = int(len(texts) * (1 - args.holdout))
+    model = CategoryClassifier()
+    if split and split < len(texts):
+        model.fit(texts[:split], answers[:split])
+        print(f"[{get_timestamp()}] 📊 Отложенная выборка: {evaluate(model, texts[split:], answers[split:], args.threshold)}")
+    # Финальная модель обучается на всех примерах
+    model = CategoryClassifier()
+    model.fit(texts, answers)
+    model.save()
+    print(f"[{get_timestamp()}] 💾 Классификатор сохранён в {CLASSIFIER_FILE}")
+
+
+if __name__ == "__main__":
+    main()
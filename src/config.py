@@ -15,6 +15,156 @@ JSON_SCHEME_FILE = os.path.expanduser("json_scheme.md")
 SCHEME_HINTS_FILE = os.path.expanduser("schema_hints.md")
 TEST_JSON_PATH = "../dataForParse/SwaggerUIresponse_1.json"
 
+# Prefix KV cache
+# Состояние модели после статической части промпта хранится в памяти для каждой модели;
+# при PREFIX_CACHE_TO_DISK=True оно также сохраняется на диск (сотни МБ на модель)
+PREFIX_CACHE_TO_DISK = False
+PREFIX_CACHE_DIR = os.path.expanduser("data/prefix_cache")
+
+# Response grammar
+# GBNF собирается из JSON_SCHEME_FILE и CATEGORIES_DICT/THEMES_DICT и кешируется здесь
+GRAMMAR_CACHE_DIR = os.path.expanduser("data/grammar")
+GRAMMAR_FIXED_CACHE_SIZE = 256  # грамматик с подставленными датами держится в памяти
+
+# Model pool
+# Обе модели держатся в памяти одновременно; при превышении бюджета выгружается давно не использованная
+MODEL_POOL_RAM_BUDGET_GB = 24  # None — без ограничения
+MODEL_POOL_OVERHEAD = 1.25  # запас на контекст и KV-кеш относительно размера GGUF
+MODEL_USE_MMAP = True
+MODEL_USE_MLOCK = False
+
+# Inference worker pool
+# При SYNC_WORKERS > 1 события обрабатываются несколькими процессами, каждый на своём наборе ядер
+# Бюджет MODEL_POOL_RAM_BUDGET_GB делится между воркерами: у каждого свой ModelPool
+SYNC_WORKERS = 1
+SYNC_CORES_PER_WORKER = None  # None — ядра делятся поровну между воркерами
+
+# Batched decoding
+# Сколько событий декодируется параллельно в одном контексте (1 — по одному)
+BATCH_SIZE = 1
+BATCH_N_CTX = 32768  # общий контекст батча: префикс + суффиксы и ответы всех последовательностей
+
+# Speculative decoding
+# Черновые токены берутся из входного текста (prompt lookup), для пути very smart — ещё и от обычной модели.
+# Внимание: llama-cpp с draft_model хранит логиты всех позиций (n_ctx × n_vocab float32, ~5 ГБ на модель)
+SPECULATIVE_DECODING = False
+SPECULATIVE_NUM_PRED_TOKENS = 10
+SPECULATIVE_MAX_NGRAM = 3
+SPECULATIVE_DRAFT_MODELS = {MODEL_NAME_VERY_SMART: MODEL_NAME}
+
+# Token budget
+# max_tokens предсказывается по числу токенов сообщения, зависимость подбирается по истории результатов
+MODEL_N_CTX = 8192
+TOKEN_BUDGET_MIN = 256
+TOKEN_BUDGET_MAX = 2000
+TOKEN_BUDGET_MARGIN = 1.2  # запас поверх предсказания с учётом разброса
+TOKEN_BUDGET_HISTORY = 500  # сколько последних результатов использовать для подбора
+TOKEN_BUDGET_MIN_SAMPLES = 10  # меньше — остаются значения по умолчанию
+
+# JSON repair
+# Оборванный или невалидный ответ чинится перегенерацией только проблемных полей, а не всего ответа
+JSON_REPAIR = True
+
+# Model routing
+# Тексты, на которых обычная модель часто ошибается, сразу отправляются умной модели
+ROUTER_ENABLED = True
+ROUTER_ERRORS_FILE = "data/regular_request_error.json"
+ROUTER_MIN_SAMPLES = 5  # меньше примеров в корзине — всегда сначала обычная модель
+ROUTER_TIME_RATIO = 0.4  # t_regular / t_very_smart до первых замеров
+
+# Result cache
+# Готовые ответы по одинаковым текстам событий берутся из SQLite без инференса
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_FILE = "data/result_cache.sqlite"
+RESULT_CACHE_TTL_DAYS = 7
+RESULT_CACHE_MAX_MB = 200
+RESULT_CACHE_SCHEMA_VERSION = 1  # увеличить при изменении формата ответа или валидации
+
+# Near-duplicate detection
+# Копии события с другими хештегами, UTM-метками или порядком абзацев берут готовый результат
+NEAR_DUPLICATE_ENABLED = True
+NEAR_DUPLICATE_NUM_PERM = 128
+NEAR_DUPLICATE_BANDS = 16  # 16 полос по 8 строк: кандидаты начиная с сходства ~0.7
+NEAR_DUPLICATE_THRESHOLD = 0.85
+
+# Span-reference output
+# Строки сообщения нумеруются, и вместо длинных полей модель выдаёт диапазон строк {from, to};
+# текст поля собирается из исходных строк после декодирования
+SPAN_REFERENCE_MODE = False
+SPAN_FIELDS = ("eventDescription",)
+
+# Fast path
+# Шаблонные тексты «Название: … Дата: … Цена: …» разбираются правилами, модель выбирает только категории и темы
+FAST_PATH_ENABLED = True
+FAST_PATH_DESCRIPTION_CHARS = 1500  # сколько описания показывать модели для выбора категорий
+
+# Russian date extraction
+# Если в тексте ровно один диапазон дат, eventDate подставляется из src/ru_dates.py, а модель пишет остальные поля
+RU_DATES_PREFILL = True
+
+# Category classifier
+# Обучение: python -m src.category_classifier train; без файла модели классификатор не используется
+CLASSIFIER_FILE = "data/category_classifier.npz"
+CLASSIFIER_DIM = 2 ** 18
+CLASSIFIER_THRESHOLD = 0.8  # вероятность, с которой метке доверяют без модели
+
+# Schema hints pruning
+# В статическом префиксе — правила и список ключей справочников, описания подходящих записей — рядом с событием
+HINTS_PRUNING = True
+HINTS_TOP_CATEGORIES = 6
+HINTS_TOP_THEMES = 4
+
+# Dynamic few-shot
+# Вместо примеров из few_shot.md в промпт попадают похожие события из истории результатов
+EXAMPLES_RETRIEVAL = True
+EXAMPLES_TOP_K = 2
+EXAMPLES_HISTORY = 2000  # сколько последних результатов индексировать
+EXAMPLES_VOCAB = 4096
+EXAMPLES_MAX_INPUT_CHARS = 1200  # длинные события в примеры не берём
+EXAMPLES_MIN_SIMILARITY = 0.15
+
+# Work queue
+# События на разбор хранятся в SQLite: добавление, захват и подтверждение — по одной строке
+WORK_QUEUE_FILE = "data/work_queue.sqlite"
+WORK_QUEUE_CLAIM_SIZE = 50  # сколько событий sync забирает из очереди за проход
+
+# Result store
+# Разобранные события пишутся в SQLite по одной строке; старый parserList.json переносится при первом запуске
+RESULT_STORE_FILE = "data/results.sqlite"
+RESULT_STORE_LEGACY_FILE = "data/parserList.json"
+RESULT_STORE_COMPACT_EVERY = 1000  # после скольких записей удалять устаревшие результаты по тем же id
+
+# Backend client
+# Для работы без сети: python -m src.backend_stub и BACKEND_URL = "http://127.0.0.1:8099"
+BACKEND_URL = "https://back.momenta.place/backend/integration/parsing"
+BACKEND_CONCURRENCY = 4  # одновременных запросов и соединений в пуле
+BACKEND_TIMEOUT = 30  # секунд на запрос
+BACKEND_RETRIES = 3
+BACKEND_BACKOFF = 0.5  # базовая задержка повтора, удваивается с каждой попыткой
+
+# Result outbox
+# Результаты сначала сохраняются локально, фоновый flusher отправляет их пачками и повторяет неудачные
+OUTBOX_FILE = "data/outbox.sqlite"
+OUTBOX_BATCH_SIZE = 16  # сколько результатов отправляется параллельно за проход
+OUTBOX_FLUSH_INTERVAL = 2.0  # секунд между проходами, если пачка не набралась
+OUTBOX_RETRY_BACKOFF = 5.0  # задержка после первой неудачи, дальше удваивается
+OUTBOX_RETRY_MAX_DELAY = 600.0
+OUTBOX_MAX_REJECTIONS = 3  # после стольких ответов 4xx результат переносится в outbox_dead
+
+# Sync pipeline
+# Выборка, поиск готовых результатов, инференс и отправка идут параллельно через ограниченные очереди;
+# используется, когда SYNC_WORKERS == 1 и BATCH_SIZE == 1
+PIPELINE_ENABLED = True
+PIPELINE_QUEUE_SIZE = 8  # ёмкость очереди между стадиями
+PIPELINE_INFER_WORKERS = 2  # второй воркер готовит следующее событие, пока модель занята
+PIPELINE_REPORT_INTERVAL = 60.0  # секунд между отчётами о стадиях
+
+# Sync daemon
+# python -m src.daemon: опрашивает бэкенд, разбирает очередь и продолжает с чекпоинта после перезапуска
+DAEMON_POLL_INTERVAL = 300.0  # секунд между опросами getEventsForParsing
+DAEMON_CHECKPOINT_FILE = "data/daemon_checkpoint.json"
+DAEMON_MAX_ATTEMPTS = 3  # после скольких захватов с упавшим инференсом событие отправляется на бэкенд как NOT_PARSED
+
 # Age Limits
 EVENT_AGE_LIMITS = ('0', '6', '12', '16', '18')
 
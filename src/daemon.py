@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import signal
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from src.api import ModelAPI
+from src.config import DAEMON_POLL_INTERVAL, DAEMON_CHECKPOINT_FILE, DAEMON_MAX_ATTEMPTS, ERROR_CODES
+from src.pipeline import Pipeline
+from src.sync import (
+    fetchNewEvents, getBackendClient, getOutbox, getResultStore, getWorkQueue, submitEventResult
+)
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class SyncDaemon:
+    """Долгоживущий sync: опрос бэкенда, разбор очереди и отправка результатов по кругу.
+
+    Каждый цикл — один прогон Pipeline: новые id из getEventsForParsing
+    добавляются к рабочей очереди, ничего из уже стоящего не выбрасывая.
+    Прогресс (время последнего опроса, счётчики) сохраняется в чекпоинт, а
+    захваченные до падения события возвращает очередь, так что после
+    перезапуска работа продолжается с того же места. Событие с упавшим
+    инференсом возвращается в очередь, пока не исчерпает DAEMON_MAX_ATTEMPTS
+    захватов, после чего на бэкенд уходит NOT_PARSED.
+    SIGINT/SIGTERM прекращают выборку новых событий, дожидаются идущих
+    инференсов и досылают outbox.
+    """
+
+    def __init__(self, poll_interval: float = DAEMON_POLL_INTERVAL, checkpoint_file: str = DAEMON_CHECKPOINT_FILE):
+        self.poll_interval = poll_interval
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint = self._load_checkpoint()
+        self.pipeline: Optional[Pipeline] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        checkpoint = {"last_poll_at": 0.0, "polls": 0, "processed": 0}
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                checkpoint.update(json.load(f))
+            # Попытки теперь считает рабочая очередь
+            checkpoint.pop("failed", None)
+            print(f"[{get_timestamp()}] ⏯️ Чекпоинт загружен: {checkpoint['polls']} опросов, {checkpoint['processed']} событий")
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        return checkpoint
+
+    def _save_checkpoint(self):
+        os.makedirs(os.path.dirname(self.checkpoint_file) or ".", exist_ok=True)
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    async def _fetch(self) -> Optional[List[Dict[str, Any]]]:
+        events = await fetchNewEvents()
+        self.checkpoint["last_poll_at"] = time.time()
+        self.checkpoint["polls"] += 1
+        self._save_checkpoint()
+        return events
+
+    def _submit(self, event: Dict[str, Any], response: Dict[str, Any]):
+        submitEventResult(event, response)
+        self.checkpoint["processed"] += 1
+
+    def _on_error(self, event: Dict[str, Any], error: Exception):
+        print(f"[{get_timestamp()}] 💥 Error processing event {event['id']}: {error}")
+        if getWorkQueue().retry(event['id'], DAEMON_MAX_ATTEMPTS):
+            return
+        # Попытки кончились: сообщаем бэкенду NOT_PARSED, иначе он будет отдавать событие при каждом опросе
+        print(f"[{get_timestamp()}] 🚫 Событие {event['id']} не разобрано за {DAEMON_MAX_ATTEMPTS} попыток")
+        submitEventResult(event, {"result": {
+            'errorCode': ERROR_CODES['NOT_PARSED'],
+            'errorDetails': str(error),
+            'errorText': 'NOT_PARSED'
+        }})
+
+    def stop(self):
+        if self._stop is None or self._stop.is_set():
+            return
+        print(f"[{get_timestamp()}] 🛑 Остановка: дорабатываем взятые события")
+        self._stop.set()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows: обработчик signal.signal вызывается вне цикла, stop передаём в цикл,
+                # иначе Ctrl+C поднял бы KeyboardInterrupt и отменил идущие инференсы
+                signal.signal(sig, lambda *_: loop.call_soon_threadsafe(self.stop))
+
+    async def run(self):
+        self._stop = asyncio.Event()
+        self._install_signal_handlers()
+        work_queue = getWorkQueue()
+        getResultStore().import_legacy()
+        model_api = ModelAPI()
+        flusher = asyncio.create_task(getOutbox().run(getBackendClient()))
+        print(f"[{get_timestamp()}] 🚀 Демон запущен, в очереди {len(work_queue)} событий, опрос раз в {self.poll_interval:.0f} сек")
+        try:
+            while not self._stop.is_set():
+                poll_due = time.time() - self.checkpoint["last_poll_at"] >= self.poll_interval
+                self.pipeline = Pipeline(
+                    model_api, work_queue, submit=self._submit, on_error=self._on_error,
+                    fetch=self._fetch if poll_due else None,
+                )
+                await self.pipeline.run()
+                self.pipeline = None
+                self._save_checkpoint()
+                wait = self.checkpoint["last_poll_at"] + self.poll_interval - time.time()
+                # Если пока ждали, события добавили через /get_events, разбираем их сразу
+                if wait > 0 and not work_queue.report()["pending"]:
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            getOutbox().stop()
+            await flusher
+            self._save_checkpoint()
+            await getBackendClient().close()
+            print(f"[{get_timestamp()}] 👋 Демон остановлен: {self.checkpoint['processed']} событий, outbox {getOutbox().report()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(SyncDaemon().run())
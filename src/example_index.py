@@ -0,0 +1,88 @@
+import json
+import math
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from src.config import (
+    EXAMPLES_HISTORY, EXAMPLES_VOCAB, EXAMPLES_MAX_INPUT_CHARS, EXAMPLES_MIN_SIMILARITY
+)
+from src.hints import stems
+from src.utils import load_parsed_results
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ExampleIndex:
+    """TF-IDF-индекс удачно разобранных событий для динамических few-shot примеров.
+
+    Словарь — EXAMPLES_VOCAB самых частых основ слов по истории, строки матрицы
+    нормированы, поэтому поиск — одно умножение матрицы на вектор запроса.
+    В индекс попадают только короткие входы, чтобы примеры не раздували промпт.
+    """
+
+    def __init__(self, vocab_size: int = EXAMPLES_VOCAB, max_input_chars: int = EXAMPLES_MAX_INPUT_CHARS):
+        self.vocab_size = vocab_size
+        self.max_input_chars = max_input_chars
+        self.vocab: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.examples: List[Tuple[str, Dict[str, Any]]] = []
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    def fit(self, examples: List[Tuple[str, Dict[str, Any]]]):
+        examples = [(text, result) for text, result in examples if text and len(text) <= self.max_input_chars]
+        counts = [Counter(stems(text)) for text, _ in examples]
+        document_frequency = Counter(stem for count in counts for stem in count)
+        self.vocab = {stem: i for i, (stem, _) in enumerate(document_frequency.most_common(self.vocab_size))}
+        self.idf = np.zeros(len(self.vocab), dtype=np.float32)
+        for stem, i in self.vocab.items():
+            self.idf[i] = math.log((1 + len(examples)) / (1 + document_frequency[stem])) + 1
+        self.matrix = np.stack([self._vector(count) for count in counts]) if counts else np.zeros((0, len(self.vocab)), dtype=np.float32)
+        self.examples = examples
+
+    def _vector(self, count: Counter) -> np.ndarray:
+        vector = np.zeros(len(self.vocab), dtype=np.float32)
+        for stem, n in count.items():
+            i = self.vocab.get(stem)
+            if i is not None:
+                vector[i] = (1 + math.log(n)) * self.idf[i]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def load_history(self, history: Optional[List[Dict[str, Any]]] = None, limit: int = EXAMPLES_HISTORY) -> "ExampleIndex":
+        """Строит индекс по последним успешным результатам (уже загруженным или из хранилища)"""
+        entries = history[-limit:] if history is not None else load_parsed_results(limit)
+        examples = [
+            (entry.get("initial_event", ""), entry["result"])
+            for entry in entries
+            if isinstance(entry.get("result"), dict) and entry["result"].get("eventDate")
+        ]
+        self.fit(examples)
+        print(f"[{get_timestamp()}] 📚 Индекс примеров: {len(self.examples)} событий, словарь {len(self.vocab)} основ")
+        return self
+
+    def nearest(self, text: str, k: int, min_similarity: float = EXAMPLES_MIN_SIMILARITY) -> List[Tuple[str, Dict[str, Any]]]:
+        """k самых похожих примеров; сам текст (повтор события) в выдачу не попадает"""
+        if not self.examples or k <= 0:
+            return []
+        similarities = self.matrix @ self._vector(Counter(stems(text)))
+        order = np.argsort(-similarities)[:k + 1]
+        return [
+            self.examples[i] for i in order
+            if min_similarity <= similarities[i] < 0.999
+        ][:k]
+
+    @staticmethod
+    def render(examples: List[Tuple[str, Dict[str, Any]]]) -> str:
+        """Примеры в формате few_shot.md для динамической части промпта"""
+        if not examples:
+            return ""
+        blocks = [
+            f"Пример {n}:\nInput:\n{text}\nOutput:\n{json.dumps({'data': result}, ensure_ascii=False)}"
+            for n, (text, result) in enumerate(examples, 1)
+        ]
+        return "### 📚 ПОХОЖИЕ РАЗОБРАННЫЕ СОБЫТИЯ:\n\n```\n" + "\n\n".join(blocks) + "\n```\n\n---\n\n"
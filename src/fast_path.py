@@ -0,0 +1,180 @@
+import html
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from src.config import (
+    CATEGORIES_DICT, THEMES_DICT, EVENT_AGE_LIMITS, SCHEME_HINTS_FILE, FAST_PATH_DESCRIPTION_CHARS
+)
+from src.ru_dates import extract_single_date
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# Метка поля шаблона -> ключ во внутреннем разборе
+FIELD_MARKERS = {
+    "Название": "title",
+    "Дата": "date",
+    "Описание": "description",
+    "Возрастное ограничение": "age",
+    "Цена": "price",
+    "Место проведения": "place",
+    "Место": "place",
+    "Адрес": "address",
+    "Категория": "category",
+    "Категории": "category",
+}
+MARKER_PATTERN = re.compile(
+    r"(?:^|(?<=[\s.]))(" + "|".join(sorted(FIELD_MARKERS, key=len, reverse=True)) + r"):\s*"
+)
+REQUIRED_FIELDS = ("title", "date", "address")
+LINK_PATTERN = re.compile(r"https://[^\s)\"'»]+")
+# Начало адреса, которое называет площадку, а не город или улицу: «Клуб Танцы, ул. …»
+VENUE_PATTERN = re.compile(
+    r"[«\"]|\b(?:клуб\w*|дк|дом культуры|театр\w*|музе\w+|галере\w+|центр[аеу]?|парк[аеу]?|зал[аеу]?"
+    r"|бар|кафе|ресторан\w*|библиотек\w+|лофт\w*|пространств\w+|филармони\w+|кинотеатр\w*|арт-\w+)\b",
+    re.IGNORECASE
+)
+
+
+def split_fields(text: str) -> Dict[str, str]:
+    """Делит шаблонный текст «Название: … Дата: … Цена: …» на поля.
+
+    Берётся первое вхождение каждой метки, значение — текст до следующей метки.
+    """
+    matches = []
+    seen = set()
+    for match in MARKER_PATTERN.finditer(text):
+        key = FIELD_MARKERS[match.group(1)]
+        if key not in seen:
+            seen.add(key)
+            matches.append((key, match.start(), match.end()))
+    fields = {}
+    for i, (key, _, value_start) in enumerate(matches):
+        value_end = matches[i + 1][1] if i + 1 < len(matches) else len(text)
+        fields[key] = text[value_start:value_end].strip().rstrip(".").strip()
+    return fields
+
+
+def parse_price_field(value: str) -> Optional[List[int]]:
+    if re.search(r"бесплатн|свободн", value, re.IGNORECASE):
+        return [0]
+    numbers = [int(re.sub(r"\s", "", number)) for number in re.findall(r"\d[\d\s]*\d|\d", value)]
+    if not numbers or len(numbers) > 2:
+        return None
+    return numbers
+
+
+def split_location(place: Optional[str], address: str) -> Tuple[str, str]:
+    """(название площадки, адрес) из полей «Место» и «Адрес».
+
+    Без поля «Место» названием считается первая часть адреса до запятой, если она
+    явно называет площадку: «Клуб Танцы, ул. Садовая, 12». Иначе название пустое.
+    """
+    if place:
+        return place, address
+    head, sep, rest = address.partition(",")
+    head = head.strip()
+    if sep and rest.strip() and VENUE_PATTERN.search(head) and not re.search(r"\d", head):
+        return head, rest.strip()
+    return "", address
+
+
+def parse_age_field(value: Optional[str]) -> str:
+    if value:
+        match = re.search(r"\d+", value)
+        if match and match.group() in EVENT_AGE_LIMITS:
+            return match.group()
+    # Правило из schema_hints.md: если не определить — 12
+    return "12"
+
+
+def load_dictionary_descriptions(hints_file: str = SCHEME_HINTS_FILE) -> Dict[str, str]:
+    """key -> «Название: описание» из JSON-таблиц справочников в schema_hints.md"""
+    with open(hints_file, "r", encoding="utf-8") as f:
+        text = f.read()
+    descriptions = {}
+    for block in re.findall(r"```json\s*(.*?)```", text, re.DOTALL):
+        try:
+            entries = json.loads(block)
+        except json.JSONDecodeError:
+            continue
+        for entry in entries:
+            if isinstance(entry, dict) and entry.get("key"):
+                descriptions[entry["key"]] = f"{entry.get('name', '')}: {entry.get('description', '')}"
+    return descriptions
+
+
+class FastPathParser:
+    """Детерминированный разбор шаблонных текстов «Название: … Дата: … Цена: …».
+
+    Название, даты, цена, место и возраст берутся прямо из полей шаблона; модели
+    остаются только категории и темы, для которых строится короткий промпт со
+    справочниками вместо полного prompt.md. Если из шаблона не выделить название
+    площадки, текст уходит на полный разбор.
+    """
+
+    def __init__(self):
+        self.descriptions = load_dictionary_descriptions()
+        self.stats = {"inputs": 0, "covered": 0, "fallback": 0, "reasons": {}}
+
+    def _reject(self, reason: str) -> None:
+        self.stats["reasons"][reason] = self.stats["reasons"].get(reason, 0) + 1
+        self.record(covered=False)
+        return None
+
+    def parse(self, text: str) -> Optional[Tuple[Dict[str, Any], Dict[str, str]]]:
+        """Возвращает (событие без категорий и тем, поля шаблона) или None, если шаблон не распознан"""
+        self.stats["inputs"] += 1
+        fields = split_fields(html.unescape(text).replace("\xa0", " "))
+        missing = [field for field in REQUIRED_FIELDS if not fields.get(field)]
+        if missing:
+            return self._reject(f"missing_{missing[0]}")
+        event_dates = extract_single_date(fields["date"])
+        if event_dates is None:
+            return self._reject("date_format")
+        prices = parse_price_field(fields["price"]) if fields.get("price") else [0]
+        if prices is None:
+            return self._reject("price_format")
+        location_name, address = split_location(fields.get("place"), fields["address"])
+        if not location_name:
+            return self._reject("missing_location_name")
+        link = LINK_PATTERN.search(text)
+        event = {
+            "eventTitle": fields["title"],
+            "eventDescription": fields.get("description") or fields["title"],
+            "eventDate": event_dates,
+            "eventPrice": prices,
+            "eventCategories": [],
+            "eventThemes": [],
+            "eventAgeLimit": parse_age_field(fields.get("age")),
+            "eventLocation": {"name": location_name, "address": address},
+            "linkSource": link.group() if link else "",
+        }
+        return event, fields
+
+    def classification_prompt(self, fields: Dict[str, str]) -> str:
+        def dictionary(keys: List[str]) -> str:
+            return "\n".join(f"- {key} — {self.descriptions.get(key, '')}" for key in keys)
+
+        event_text = f"Название: {fields['title']}"
+        if fields.get("category"):
+            event_text += f"\nКатегория по данным источника: {fields['category']}"
+        if fields.get("description"):
+            event_text += f"\nОписание: {fields['description'][:FAST_PATH_DESCRIPTION_CHARS]}"
+        return (
+            "Выбери для события от 1 до 3 категорий и от 1 до 3 тематик строго из справочников.\n\n"
+            f"Категории (key — описание):\n{dictionary(CATEGORIES_DICT)}\n\n"
+            f"Тематики (key — описание):\n{dictionary(THEMES_DICT)}\n\n"
+            f"Событие:\n```\n{event_text}\n```\n\n"
+            'Ответ — JSON {"eventCategories": [...], "eventThemes": [...]}'
+        )
+
+    def record(self, covered: bool):
+        self.stats["covered" if covered else "fallback"] += 1
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "coverage": self.stats["covered"] / self.stats["inputs"] if self.stats["inputs"] else 0,
+        }
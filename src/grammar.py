@@ -0,0 +1,215 @@
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from llama_cpp import LlamaGrammar
+from llama_cpp.llama_grammar import json_schema_to_gbnf
+from src.config import (
+    CATEGORIES_DICT, THEMES_DICT, JSON_SCHEME_FILE, GRAMMAR_CACHE_DIR, GRAMMAR_FIXED_CACHE_SIZE,
+    SPAN_REFERENCE_MODE, SPAN_FIELDS
+)
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# Поля, значения которых ограничены справочниками из config
+ENUM_FIELDS = {
+    "eventCategories": CATEGORIES_DICT,
+    "eventThemes": THEMES_DICT,
+}
+
+# Поля, которые модель генерирует первыми: по ним StreamGuard может досрочно остановить генерацию
+PROPERTY_ORDER = ["eventDate"]
+
+# Значение-заглушка поля в шаблоне with_fixed, правило поля потом заменяется целиком
+FIXED_PLACEHOLDER = "__fixed__"
+
+
+def _infer_schema(value: Any) -> Dict[str, Any]:
+    """Строит JSON-схему по значению-образцу из json_scheme.md"""
+    if isinstance(value, dict):
+        return {
+            "type": "object",
+            "properties": {key: _infer_schema(item) for key, item in value.items()},
+            "required": list(value.keys()),
+        }
+    if isinstance(value, list):
+        return {"type": "array", "items": _infer_schema(value[0]) if value else {}}
+    if isinstance(value, bool):
+        return {"type": "boolean"}
+    if isinstance(value, (int, float)):
+        return {"type": "number"}
+    return {"type": "string"}
+
+
+SPAN_SCHEMA = {
+    "type": "object",
+    "properties": {"from": {"type": "integer"}, "to": {"type": "integer"}},
+    "required": ["from", "to"],
+}
+
+
+def build_event_schema(example: Dict[str, Any], span_mode: bool = False) -> Dict[str, Any]:
+    """JSON-схема ответа: структура из json_scheme.md, перечисления из config.
+
+    В span_mode поля SPAN_FIELDS — диапазоны номеров строк сообщения вместо текста.
+    """
+    schema = _infer_schema(example)
+    data_properties = schema["properties"]["data"]["properties"]
+    for field, values in ENUM_FIELDS.items():
+        data_properties[field] = {
+            "type": "array",
+            "items": {"type": "string", "enum": list(values)},
+            "minItems": 1,
+        }
+    if span_mode:
+        for field in SPAN_FIELDS:
+            data_properties[field] = SPAN_SCHEMA
+    return schema
+
+
+def build_classification_schema() -> Dict[str, Any]:
+    """Схема ответа быстрого пути: только категории и темы"""
+    return {
+        "type": "object",
+        "properties": {
+            field: {
+                "type": "array",
+                "items": {"type": "string", "enum": list(values)},
+                "minItems": 1,
+                "maxItems": 3,
+            }
+            for field, values in ENUM_FIELDS.items()
+        },
+        "required": list(ENUM_FIELDS),
+    }
+
+
+class GrammarCache:
+    """Кеш GBNF-грамматики ответа.
+
+    Грамматика строится один раз из json_scheme.md и справочников категорий и тем и
+    перестраивается, только когда меняется один из этих источников. Грамматика не
+    зависит от токенизатора, поэтому один объект переиспользуется всеми моделями.
+    Готовый GBNF также сохраняется на диск, чтобы не конвертировать схему при каждом запуске.
+    """
+
+    def __init__(
+        self,
+        scheme_file: str = JSON_SCHEME_FILE,
+        cache_dir: str = GRAMMAR_CACHE_DIR,
+        span_mode: bool = SPAN_REFERENCE_MODE,
+    ):
+        self.scheme_file = scheme_file
+        self.cache_dir = cache_dir
+        self.span_mode = span_mode
+        self._scheme_stat: Tuple[int, int] = (-1, -1)
+        self._scheme_text = ""
+        self._fingerprint = ""
+        self._grammar: Optional[LlamaGrammar] = None
+        self._field_grammars: Dict[str, LlamaGrammar] = {}
+        # поле -> строки GBNF с заглушкой вместо значения и номер строки правила поля
+        self._fixed_templates: Dict[str, Tuple[List[str], int]] = {}
+        # (поле, значение в каноническом JSON) -> грамматика, LRU
+        self._fixed_grammars: "OrderedDict[Tuple[str, str], LlamaGrammar]" = OrderedDict()
+        self._classification_grammar: Optional[LlamaGrammar] = None
+        self.schema: Dict[str, Any] = {}
+
+    def _sources_fingerprint(self) -> str:
+        stat = os.stat(self.scheme_file)
+        if (stat.st_mtime_ns, stat.st_size) != self._scheme_stat:
+            with open(self.scheme_file, "r", encoding="utf-8") as f:
+                self._scheme_text = f.read()
+            self._scheme_stat = (stat.st_mtime_ns, stat.st_size)
+        sources = json.dumps(
+            [self._scheme_text, ENUM_FIELDS, PROPERTY_ORDER, list(SPAN_FIELDS) if self.span_mode else []],
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(sources.encode("utf-8")).hexdigest()[:16]
+
+    def _load_gbnf(self, fingerprint: str) -> str:
+        cache_file = os.path.join(self.cache_dir, f"event_{fingerprint}.gbnf")
+        if os.path.exists(cache_file):
+            with open(cache_file, "r", encoding="utf-8") as f:
+                return f.read()
+        gbnf = json_schema_to_gbnf(json.dumps(self.schema), prop_order=PROPERTY_ORDER)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(cache_file, "w", encoding="utf-8") as f:
+            f.write(gbnf)
+        return gbnf
+
+    def get(self) -> LlamaGrammar:
+        """Возвращает грамматику ответа, перестраивая её при изменении источников"""
+        fingerprint = self._sources_fingerprint()
+        if fingerprint != self._fingerprint:
+            self.schema = build_event_schema(json.loads(self._scheme_text), self.span_mode)
+            self._grammar = LlamaGrammar.from_string(self._load_gbnf(fingerprint), verbose=False)
+            self._field_grammars = {}
+            self._fixed_templates = {}
+            self._fixed_grammars.clear()
+            self._fingerprint = fingerprint
+            print(f"[{get_timestamp()}] 📐 Грамматика ответа собрана ({fingerprint})")
+        return self._grammar
+
+    def field_order(self) -> List[str]:
+        """Порядок полей data в ответе: сначала PROPERTY_ORDER, затем порядок схемы"""
+        self.get()
+        names = list(self.schema["properties"]["data"]["properties"])
+        return sorted(names, key=lambda name: PROPERTY_ORDER.index(name) if name in PROPERTY_ORDER else len(PROPERTY_ORDER))
+
+    def field(self, name: str) -> LlamaGrammar:
+        """Грамматика значения одного поля data, для точечной перегенерации"""
+        self.get()
+        grammar = self._field_grammars.get(name)
+        if grammar is None:
+            field_schema = self.schema["properties"]["data"]["properties"][name]
+            grammar = LlamaGrammar.from_string(json_schema_to_gbnf(json.dumps(field_schema)), verbose=False)
+            self._field_grammars[name] = grammar
+        return grammar
+
+    def _fixed_template(self, name: str) -> Tuple[List[str], int]:
+        """GBNF ответа с заглушкой в поле name, собирается один раз на схему"""
+        template = self._fixed_templates.get(name)
+        if template is None:
+            schema = copy.deepcopy(self.schema)
+            schema["properties"]["data"]["properties"][name] = {"const": FIXED_PLACEHOLDER}
+            lines = json_schema_to_gbnf(json.dumps(schema), prop_order=PROPERTY_ORDER).split("\n")
+            rule = f"data-{name} ::= "
+            template = (lines, next(i for i, line in enumerate(lines) if line.startswith(rule)))
+            self._fixed_templates[name] = template
+        return template
+
+    def with_fixed(self, name: str, value: Any) -> LlamaGrammar:
+        """Грамматика ответа, в которой поле data задано константой (даты из ru_dates).
+
+        Модель проходит это поле принудительно за несколько токенов и пишет
+        остальные поля тем же потоковым вызовом. Полная схема конвертируется
+        один раз, для нового значения подменяется только правило поля, а
+        готовые грамматики хранятся в LRU по значению.
+        """
+        self.get()
+        key = (name, json.dumps(value, ensure_ascii=False, sort_keys=True))
+        grammar = self._fixed_grammars.get(key)
+        if grammar is not None:
+            self._fixed_grammars.move_to_end(key)
+            return grammar
+        lines, index = self._fixed_template(name)
+        # Правило константы из схемы с одним const: "root ::= <литерал>"
+        literal = json_schema_to_gbnf(json.dumps({"const": value})).split("\n")[0].split(" ::= ", 1)[1]
+        lines = list(lines)
+        lines[index] = f"data-{name} ::= {literal}"
+        grammar = LlamaGrammar.from_string("\n".join(lines), verbose=False)
+        self._fixed_grammars[key] = grammar
+        if len(self._fixed_grammars) > GRAMMAR_FIXED_CACHE_SIZE:
+            self._fixed_grammars.popitem(last=False)
+        return grammar
+
+    def classification(self) -> LlamaGrammar:
+        """Грамматика ответа быстрого пути, справочники не меняются во время работы"""
+        if self._classification_grammar is None:
+            gbnf = json_schema_to_gbnf(json.dumps(build_classification_schema()))
+            self._classification_grammar = LlamaGrammar.from_string(gbnf, verbose=False)
+        return self._classification_grammar
@@ -0,0 +1,79 @@
+import json
+import math
+import re
+from typing import Dict, List
+from src.config import CATEGORIES_DICT, THEMES_DICT, HINTS_TOP_CATEGORIES, HINTS_TOP_THEMES
+
+JSON_BLOCK_PATTERN = re.compile(r"```json\s*(.*?)```", re.DOTALL)
+
+
+def stems(text: str) -> List[str]:
+    """Грубые основы слов: первые 5 букв, чтобы «концерт» и «концерты» совпадали"""
+    return [word[:5] for word in re.findall(r"[^\W\d_]{3,}", text.lower())]
+
+
+class SchemaHints:
+    """schema_hints.md, разделённый на правила и справочники категорий и тем.
+
+    Правила и короткий список ключей справочников не зависят от события и идут в
+    статический префикс промпта. Развёрнутые описания выбираются по тексту
+    события: каждая запись оценивается по совпадающим основам слов с весом idf,
+    и в динамическую часть промпта попадают только лучшие.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.entries: Dict[str, List[Dict[str, str]]] = {"eventCategories": [], "eventThemes": []}
+        for block in JSON_BLOCK_PATTERN.findall(text):
+            try:
+                items = [item for item in json.loads(block) if isinstance(item, dict) and item.get("key")]
+            except json.JSONDecodeError:
+                continue
+            field = "eventCategories" if any(item["key"] in CATEGORIES_DICT for item in items) else "eventThemes"
+            self.entries[field].extend(items)
+        self._entry_stems = {
+            field: [set(stems(f"{item.get('name', '')} {item.get('description', '')}")) for item in items]
+            for field, items in self.entries.items()
+        }
+        n_entries = sum(len(items) for items in self.entries.values()) or 1
+        document_frequency: Dict[str, int] = {}
+        for entry_stems in self._entry_stems.values():
+            for item_stems in entry_stems:
+                for stem in item_stems:
+                    document_frequency[stem] = document_frequency.get(stem, 0) + 1
+        self.idf = {stem: math.log(1 + n_entries / count) for stem, count in document_frequency.items()}
+
+    def compact_rules(self) -> str:
+        """Правила целиком, таблицы справочников — одной строкой на ключ"""
+        def compact(match: re.Match) -> str:
+            try:
+                items = json.loads(match.group(1))
+            except json.JSONDecodeError:
+                return match.group(0)
+            return "\n".join(f"- {item['key']} — {item.get('name', '')}" for item in items if isinstance(item, dict) and item.get("key"))
+        return JSON_BLOCK_PATTERN.sub(compact, self.text)
+
+    def _top(self, field: str, message_stems: set, k: int) -> List[Dict[str, str]]:
+        scored = []
+        for item, item_stems in zip(self.entries[field], self._entry_stems[field]):
+            score = sum(self.idf[stem] for stem in item_stems & message_stems)
+            if score > 0:
+                scored.append((score, item))
+        scored.sort(key=lambda pair: -pair[0])
+        return [item for _, item in scored[:k]]
+
+    def relevant(self, message: str) -> str:
+        """Описания категорий и тем, лексически близких к тексту события"""
+        message_stems = set(stems(message))
+        sections = []
+        for field, title, k in (
+            ("eventCategories", "Категории", HINTS_TOP_CATEGORIES),
+            ("eventThemes", "Тематики", HINTS_TOP_THEMES),
+        ):
+            items = self._top(field, message_stems, k)
+            if items:
+                lines = "\n".join(f"- `{item['key']}` ({item.get('name', '')}): {item.get('description', '')}" for item in items)
+                sections.append(f"{title}:\n{lines}")
+        if not sections:
+            return ""
+        return "### 🔎 ВОЗМОЖНО ПОДХОДЯЩИЕ КАТЕГОРИИ И ТЕМАТИКИ:\n\n" + "\n\n".join(sections) + "\n\n---\n\n"
@@ -0,0 +1,61 @@
+import json
+from typing import Any, List, NamedTuple, Optional
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class PartialField(NamedTuple):
+    name: str
+    value: Any
+    start: int  # позиция ключа в сыром тексте
+    end: int  # позиция сразу после значения
+
+
+class PartialObject(NamedTuple):
+    body_start: int  # позиция сразу после "{" объекта data
+    fields: List[PartialField]
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def scan_partial_object(text: str, key: str = "data") -> Optional[PartialObject]:
+    """Разбирает, сколько полей объекта `key` модель успела выдать целиком.
+
+    Работает с оборванным или испорченным JSON: поля читаются по одному, и разбор
+    останавливается на первом значении, которое не декодируется. Возвращает None,
+    если объект даже не начат.
+    """
+    key_pos = text.find(f'"{key}"')
+    if key_pos < 0:
+        return None
+    pos = _skip_whitespace(text, key_pos + len(key) + 2)
+    if pos >= len(text) or text[pos] != ":":
+        return None
+    pos = _skip_whitespace(text, pos + 1)
+    if pos >= len(text) or text[pos] != "{":
+        return None
+    body_start = pos + 1
+    pos = body_start
+    fields: List[PartialField] = []
+    while True:
+        pos = _skip_whitespace(text, pos)
+        if pos < len(text) and text[pos] == "," and fields:
+            pos = _skip_whitespace(text, pos + 1)
+        if pos >= len(text) or text[pos] != '"':
+            break
+        start = pos
+        try:
+            name, pos = _decoder.raw_decode(text, pos)
+            pos = _skip_whitespace(text, pos)
+            if pos >= len(text) or text[pos] != ":":
+                break
+            value, pos = _decoder.raw_decode(text, _skip_whitespace(text, pos + 1))
+        except json.JSONDecodeError:
+            break
+        fields.append(PartialField(name, value, start, pos))
+    return PartialObject(body_start, fields)
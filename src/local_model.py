@@ -1,18 +1,40 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import hashlib
 import json
-from typing import List, Dict, Any, Optional
-from llama_cpp import Llama
+import pickle
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from llama_cpp import LlamaState, StoppingCriteriaList
 import os
 import psutil
 import GPUtil
 import time
-from dateutil import parser
-from src.config import MODEL_NAME
+from src.config import (
+    MODEL_NAME, PREFIX_CACHE_TO_DISK, PREFIX_CACHE_DIR, BATCH_SIZE,
+    SPECULATIVE_DECODING, SPECULATIVE_DRAFT_MODELS, TOKEN_BUDGET_HISTORY, JSON_REPAIR,
+    SPAN_REFERENCE_MODE, RU_DATES_PREFILL, MODEL_POOL_RAM_BUDGET_GB
+)
 from src.prompt_manager import PromptManager
+from src.model_pool import ModelPool
+from src.batch_decoder import BatchDecoder
+from src.speculative import SpeculativeDraft, ModelDraft
+from src.grammar import GrammarCache
+from src.stream_guard import StreamGuard, EarlyAbort, TokenCounter
+from src.token_budget import TokenBudget, ContextOverflow
+from src.utils import load_parsed_results
+from src.json_repair import scan_partial_object
+from src.spans import expand_spans, segments_from_prompt
+from src.ru_dates import parse_iso, extract_single_date
 
 def get_timestamp():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+class InferenceCancelled(Exception):
+    """Генерация прервана отменой ожидающей её корутины"""
+
+
 def check_system_info():
     info = []
     info.append(f"CPU использование: {psutil.cpu_percent()}%")
@@ -28,11 +50,36 @@ def check_system_info():
 
 
 class LocalModel:
-    def __init__(self):
+    def __init__(
+        self,
+        n_threads: Optional[int] = None,
+        prompt_manager: Optional[PromptManager] = None,
+        history: Optional[List[Dict[str, Any]]] = None,
+        ram_budget_gb: Optional[float] = MODEL_POOL_RAM_BUDGET_GB,
+    ):
         self.model = None
         self.loaded_path = None
         self.max_retries = 3
         self.retry_delay = 1  # seconds
+        self.prompt_manager = prompt_manager or PromptManager(history)
+        # Последние результаты для подбора бюджета токенов; None — прочитать из хранилища при подборе
+        self.budget_history = history[-TOKEN_BUDGET_HISTORY:] if history is not None else None
+        self.grammars = GrammarCache()
+        # n_threads задаётся воркерами пула процессов, по умолчанию — все ядра
+        threads = n_threads or os.cpu_count()
+        self.pool = ModelPool(ram_budget_gb, n_threads=threads, n_threads_batch=threads)
+        self.pool.on_evict.append(self._drop_prefix_state)
+        # model_path -> состояние контекста после статического префикса промпта
+        self.prefix_states: Dict[str, LlamaState] = {}
+        # model_path -> контекст для параллельного декодирования нескольких событий
+        self.batch_decoders: Dict[str, BatchDecoder] = {}
+        # model_path -> источник черновых токенов при SPECULATIVE_DECODING
+        self.drafts: Dict[str, SpeculativeDraft] = {}
+        self.last_speculative_stats: Optional[Dict[str, Any]] = None
+        # model_path -> бюджет токенов ответа, подобранный токенизатором модели
+        self.budgets: Dict[str, TokenBudget] = {}
+        # llama-контексты не потокобезопасны: весь инференс идёт в одном выделенном потоке
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llama-inference")
         
         # Enhanced system prompts for better context
         self.system_prompts = {
@@ -50,47 +97,89 @@ class LocalModel:
         }
 
     def initialize_model(self, model_path: str):
-        try:
-            self.model = Llama(
-                model_path=model_path,
-                n_ctx=8192,
-                n_gpu_layers=48,
-                n_threads=os.cpu_count(),
-                n_batch=1024,
-                chat_format="chatml",
-                verbose=False,
-            )
-            self.loaded_path = model_path
-        except Exception as e:
-            print(f"[{get_timestamp()}] 💥 Ошибка при инициализации: {str(e)}")
-            raise
+        if SPECULATIVE_DECODING:
+            self.model = self._get_speculative_model(model_path)
+        else:
+            self.model = self.pool.get(model_path)
+        self.loaded_path = model_path
 
-    def _adjust_temperature(self, text: str) -> float:
-        """Динамически корректирует temperature на основе входного текста"""
+    def _get_speculative_model(self, model_path: str):
+        """Загружает модель с черновиком для спекулятивного декодирования"""
+        draft = self.drafts.setdefault(model_path, SpeculativeDraft())
+        model = self.pool.get(model_path, draft_model=draft)
+        draft_path = SPECULATIVE_DRAFT_MODELS.get(model_path)
+        if not draft_path:
+            return model
+        # Отдельный экземпляр: тот же файл как обычная модель загружен с draft_model и своим
+        # KV-кешем префикса, который черновые create_completion иначе затирали бы
+        draft_key = f"{draft_path}#draft"
+        draft_llama = self.pool.get(draft_path, key=draft_key)
+        if model_path not in self.pool.models:
+            # Обе модели не помещаются в бюджет пула — остаётся только prompt lookup
+            print(f"[{get_timestamp()}] ⚠️ Черновая модель {draft_path.split('/')[-1]} не помещается в пул вместе с целевой")
+            draft.model_draft = None
+            return self.pool.get(model_path, draft_model=draft)
+        if draft.model_draft is None or draft.model_draft.target is not model or draft.model_draft.draft is not draft_llama:
+            draft.model_draft = ModelDraft(model, draft_llama, draft_key)
+        return model
+
+    def _drop_prefix_state(self, model_path: str):
+        self.prefix_states.pop(model_path, None)
+        for target_path, draft in self.drafts.items():
+            if draft.model_draft is not None and model_path in (target_path, draft.model_draft.draft_key):
+                draft.model_draft = None
+        decoder = self.batch_decoders.pop(model_path, None)
+        if decoder is not None:
+            decoder.close()
+        if self.loaded_path == model_path:
+            self.model = None
+            self.loaded_path = None
+
+    def _adjust_temperature(self, message_tokens: int) -> float:
+        """Динамически корректирует temperature по числу токенов сообщения"""
         # Более низкая temperature для коротких и четких текстов
-        if len(text) < 200:
+        if message_tokens < 64:
             return 0.2
         # Средняя temperature для текстов средней длины
-        elif len(text) < 500:
+        elif message_tokens < 160:
             return 0.3
         # Более высокая temperature для длинных и сложных текстов
         return 0.4
 
-    def _adjust_max_tokens(self, text: str) -> int:
-        """Динамически корректирует max_tokens на основе входного текста"""
-        # Базовое соотношение: примерно 2 токена на каждый символ текста
-        base_tokens = len(text) * 2
-        
-        # Минимальное количество токенов для корректной работы
-        min_tokens = 500
-        # Максимальное количество токенов для оптимизации производительности
-        max_tokens = 2000
-        
-        # Округляем до ближайшей сотни для читаемости
-        adjusted_tokens = round(base_tokens / 100) * 100
-        
-        # Ограничиваем значение в допустимых пределах
-        return max(min_tokens, min(adjusted_tokens, max_tokens))
+    def _get_budget(self) -> TokenBudget:
+        """Бюджет токенов загруженной модели, подобранный по истории её токенизатором"""
+        budget = self.budgets.get(self.loaded_path)
+        if budget is not None:
+            return budget
+        budget = TokenBudget()
+        samples = []
+        history = self.budget_history if self.budget_history is not None else load_parsed_results(TOKEN_BUDGET_HISTORY)
+        for entry in history:
+            message, result = entry.get("initial_event"), entry.get("result")
+            if not isinstance(message, str) or not isinstance(result, dict):
+                continue
+            # Только удачные ответы: ошибки и пустые {} занижают длину ответа и ведут к обрезке
+            if 'errorCode' in result or not result.get("eventTitle") or not result.get("eventDate"):
+                continue
+            # x — токены одного сообщения, как при генерации: примеры и подсказки в суффиксе не считаются
+            output_text = json.dumps({"data": result}, ensure_ascii=False)
+            samples.append((
+                self._count_tokens(self.prompt_manager.prepare_message_section(message)),
+                len(self.model.tokenize(output_text.encode("utf-8"), add_bos=False, special=False)),
+            ))
+        budget.fit(samples)
+        if budget.samples:
+            print(f"[{get_timestamp()}] 📏 Бюджет токенов по {budget.samples} примерам: {budget.intercept:.0f} + {budget.slope:.2f}·n (+{budget.spread:.0f})")
+        self.budgets[self.loaded_path] = budget
+        return budget
+
+    def _count_tokens(self, text: str) -> int:
+        return len(self.model.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+
+    def _adjust_max_tokens(self, message_tokens: int, prompt_tokens: int) -> int:
+        """Подбирает max_tokens по длине сообщения и свободному месту в контексте"""
+        budget = self._get_budget()
+        return budget.fit_context(prompt_tokens, budget.predict(message_tokens), self.model.n_ctx())
 
     def _validate_response(self, response: Dict) -> Optional[Dict]:
         """Проверяет корректность ответа модели"""
@@ -113,8 +202,8 @@ class LocalModel:
                 for date_entry in response["data"]["eventDate"]:
                     try:
                         # Парсим даты и убираем информацию о timezone
-                        from_date = parser.parse(date_entry["from"]).replace(tzinfo=None)
-                        to_date = parser.parse(date_entry["to"]).replace(tzinfo=None)
+                        from_date = parse_iso(date_entry["from"])
+                        to_date = parse_iso(date_entry["to"])
                         # Обновляем даты в формате ISO
                         date_entry["from"] = from_date.isoformat()
                         date_entry["to"] = to_date.isoformat()
@@ -127,137 +216,337 @@ class LocalModel:
             print(f"[{get_timestamp()}] Ошибка валидации: {str(e)}")
             return None
 
-    def generate_structured_response(self, user_prompt: str, model_path: str) -> Dict[str, Any]:
-        if not self.model or self.loaded_path != model_path:
-            self.initialize_model(model_path)
+    @staticmethod
+    def _field_is_valid(name: str, value: Any) -> bool:
+        """Проходит ли одно поле ту же проверку, что и в _validate_response"""
+        if name != "eventDate":
+            return True
+        if not isinstance(value, list):
+            return False
+        try:
+            for date_entry in value:
+                parse_iso(date_entry["from"])
+                parse_iso(date_entry["to"])
+        except Exception:
+            return False
+        return True
 
-        # Автоматически подбираем temperature и max_tokens
-        temperature = self._adjust_temperature(user_prompt)
-        max_tokens = self._adjust_max_tokens(user_prompt)
+    def _decode_missing_fields(self, prompt_tokens: List[int], raw_text: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+        """Дописывает ответ, декодируя только отсутствующие и невалидные поля.
 
-        retries = 0
-        last_error = None
+        Используется для починки оборванного ответа. Поля, которые уже есть
+        целиком и корректны, сохраняются как есть. Текст
+        до первого проблемного поля совпадает с уже сгенерированным, поэтому
+        Llama.generate переиспользует его KV-кеш, и декодируются только недостающие
+        значения — каждое под грамматикой своего поля.
+        """
+        partial = scan_partial_object(raw_text)
+        if partial is None:
+            raise ValueError("В ответе нет даже начала объекта data")
+        kept = {field.name: field for field in partial.fields if self._field_is_valid(field.name, field.value)}
+        text = raw_text[:partial.body_start]
+        missing = []
+        start_time = time.time()
+        for name in self.grammars.field_order():
+            separator = ", " if text[-1] != "{" else ""
+            if name in kept:
+                field = kept[name]
+                text += separator + raw_text[field.start:field.end]
+                continue
+            missing.append(name)
+            text += f'{separator}"{name}": '
+            tokens = prompt_tokens + self.model.tokenize(text.encode("utf-8"), add_bos=False, special=False)
+            budget = min(max_tokens, self.model.n_ctx() - len(tokens))
+            if budget <= 0:
+                raise ContextOverflow(f"Нет места в контексте для перегенерации поля {name}")
+            completion = self.model.create_completion(
+                prompt=tokens,
+                grammar=self.grammars.field(name),
+                stop=["<|im_end|>"],
+                temperature=temperature,
+                max_tokens=budget,
+            )
+            text += completion["choices"][0]["text"]
+        text += "}}"
+        print(f"[{get_timestamp()}] 🩹 Поля {', '.join(missing) or '—'} декодированы по отдельности за {time.time() - start_time:.2f} сек")
+        return self._parse_raw_text(text)
 
-        while retries < self.max_retries:
+    def _parse_or_repair(self, prompt_tokens: List[int], raw_text: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+        """Разбирает ответ, а при ошибке пробует починить его вместо полной перегенерации"""
+        try:
+            return self._parse_raw_text(raw_text)
+        except (json.JSONDecodeError, ValueError) as e:
+            if not JSON_REPAIR:
+                raise
+            print(f"[{get_timestamp()}] 🩹 Ответ не прошёл разбор ({str(e)}), перегенерирую только проблемные поля")
+            return self._decode_missing_fields(prompt_tokens, raw_text, temperature, max_tokens)
+
+    def _split_prompt(self, user_prompt: str) -> Tuple[str, str]:
+        """Делит chatml-промпт на статический префикс и часть конкретного события"""
+        head = (
+            f"<|im_start|>system\n{self.system_prompts['event_parser']}<|im_end|>\n"
+            "<|im_start|>user\n"
+        )
+        tail = "<|im_end|>\n<|im_start|>assistant\n"
+        static_prefix = self.prompt_manager.static_prefix
+        if user_prompt.startswith(static_prefix):
+            return head + static_prefix, user_prompt[len(static_prefix):] + tail
+        return head, user_prompt + tail
+
+    def _prefix_cache_file(self, prefix_tokens: List[int]) -> str:
+        key = hashlib.sha256(
+            f"{self.loaded_path}:{','.join(map(str, prefix_tokens))}".encode("utf-8")
+        ).hexdigest()
+        return os.path.join(PREFIX_CACHE_DIR, f"{key}.state")
+
+    def _load_prefix_state_from_disk(self, prefix_tokens: List[int]) -> Optional[LlamaState]:
+        cache_file = self._prefix_cache_file(prefix_tokens)
+        if not PREFIX_CACHE_TO_DISK or not os.path.exists(cache_file):
+            return None
+        try:
+            with open(cache_file, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"[{get_timestamp()}] ⚠️ Не удалось прочитать кеш префикса {cache_file}: {str(e)}")
+            return None
+
+    def _save_prefix_state_to_disk(self, prefix_tokens: List[int], state: LlamaState):
+        if not PREFIX_CACHE_TO_DISK:
+            return
+        cache_file = self._prefix_cache_file(prefix_tokens)
+        os.makedirs(PREFIX_CACHE_DIR, exist_ok=True)
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+
+    @staticmethod
+    def _state_matches(state: Optional[LlamaState], prefix_tokens: List[int]) -> bool:
+        return (
+            state is not None
+            and state.n_tokens == len(prefix_tokens)
+            and state.input_ids[:state.n_tokens].tolist() == prefix_tokens
+        )
+
+    def _ensure_prefix_state(self, prefix_tokens: List[int]):
+        """Гарантирует, что KV-кеш модели содержит вычисленный статический префикс"""
+        n_prefix = len(prefix_tokens)
+        if self.model.n_tokens >= n_prefix and self.model._input_ids[:n_prefix].tolist() == prefix_tokens:
+            # Префикс уже в контексте, Llama.generate сама отрежет хвост прошлого события
+            return
+
+        state = self.prefix_states.get(self.loaded_path)
+        if not self._state_matches(state, prefix_tokens):
+            state = self._load_prefix_state_from_disk(prefix_tokens)
+        if self._state_matches(state, prefix_tokens):
+            self.model.load_state(state)
+            self.prefix_states[self.loaded_path] = state
+            return
+
+        start_time = time.time()
+        self.model.reset()
+        self.model.eval(prefix_tokens)
+        state = self.model.save_state()
+        self.prefix_states[self.loaded_path] = state
+        self._save_prefix_state_to_disk(prefix_tokens, state)
+        print(f"[{get_timestamp()}] 🧊 Префикс промпта ({n_prefix} токенов) вычислен за {time.time() - start_time:.2f} сек")
+
+    def _parse_raw_text(self, raw_text: str) -> Dict[str, Any]:
+        """Разбирает и валидирует сырой ответ модели, при ошибке бросает исключение"""
+        # Clean markdown formatting if present
+        if raw_text.startswith("```"):
+            raw_text = raw_text.split("\n", 1)[1]
+            raw_text = raw_text.rsplit("\n", 1)[0]
+        
+        try:
+            parsed = json.loads(raw_text)
+        except json.JSONDecodeError as e:
+            print(f"[ERROR] Failed to parse JSON: {str(e)}")
+            print(f"[ERROR] Raw text was: {raw_text}")
+            raise
+        # Проверяем корректность ответа
+        validated = self._validate_response(parsed)
+        if validated:
+            return validated
+        raise ValueError("Invalid response structure")
+
+    def _expand_spans(self, response: Dict[str, Any], user_prompt: str) -> Dict[str, Any]:
+        """В режиме ссылок собирает текст полей из пронумерованных строк сообщения"""
+        if not SPAN_REFERENCE_MODE:
+            return response
+        expand_spans(response["data"], segments_from_prompt(self._message_part(user_prompt)))
+        return response
+
+    def _tokenize_prompt(self, user_prompt: str) -> Tuple[List[int], List[int]]:
+        prefix_text, suffix_text = self._split_prompt(user_prompt)
+        prefix_tokens = self.model.tokenize(prefix_text.encode("utf-8"), add_bos=True, special=True)
+        suffix_tokens = self.model.tokenize(suffix_text.encode("utf-8"), add_bos=False, special=True)
+        return prefix_tokens, suffix_tokens
+
+    def _get_batch_decoder(self, n_seq: int) -> BatchDecoder:
+        decoder = self.batch_decoders.get(self.loaded_path)
+        if decoder is None or decoder.n_seq_max < n_seq:
+            if decoder is not None:
+                decoder.close()
+            decoder = BatchDecoder(self.model, n_seq_max=max(n_seq, BATCH_SIZE))
+            self.batch_decoders[self.loaded_path] = decoder
+        return decoder
+
+    def generate_structured_batch(self, prompts: List[str], model_path: str) -> List[Any]:
+        """Декодирует несколько промптов параллельно в одном контексте.
+
+        Возвращает список той же длины: для каждого промпта провалидированный ответ
+        либо исключение, если и повторная одиночная генерация не удалась.
+        """
+        if len(prompts) == 1:
             try:
-                response = self.model.create_chat_completion(
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": self.system_prompts["event_parser"]
-                        },
-                        {
-                            "role": "user",
-                            "content": user_prompt
-                        }
-                    ],
-                    response_format={
-                        "type": "json_object",
-                        "schema": {
-                            "type": "object",
-                            "properties": {
-                                "data": {
-                                    "type": "object",
-                                    "properties": {
-                                        "eventTitle": {"type": "string"},
-                                        "eventDescription": {"type": "string"},
-                                        "eventDate": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "from": {"type": "string"},
-                                                    "to": {"type": "string"},
-                                                },
-                                                "required": ["from", "to"]
-                                            }
-                                        },
-                                        "eventPrice": {
-                                            "type": "array",
-                                            "items": {"type": "number"}
-                                        },
-                                        "eventCategories": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "string",
-                                                "enum": [
-                                                    "excursion", "exhibitions", "well", "lecture",
-                                                    "seminar", "conference", "presentation", "webinar",
-                                                    "training", "master_class", "vorkshop", "business_game",
-                                                    "class", "forum", "mitap", "business_breakfast",
-                                                    "meeting", "networking", "mastermind", "theater",
-                                                    "movie", "stand__up", "concerts", "party",
-                                                    "circus", "festivals", "show", "games",
-                                                    "active_rest", "olympics", "battle", "championship",
-                                                    "league", "competition", "volunteering", "charity",
-                                                    "social_initiatives"
-                                                ]
-                                            },
-                                            "minItems": 1
-                                        },
-                                        "eventThemes": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "string",
-                                                "enum": [
-                                                    "culture_and_art", "science_and_education",
-                                                    "industry_specialized", "it_and_the_internet",
-                                                    "business_and_entrepreneurship",
-                                                    "visual_creativity_visual_graphics",
-                                                    "psychology_and_self__knowledge", "humor",
-                                                    "music", "travel_and_tourism",
-                                                    "cooking_and_gastronomy", "beauty_and_health",
-                                                    "sport"
-                                                ]
-                                            },
-                                            "minItems": 1
-                                        },
-                                        "eventAgeLimit": {"type": "string"},
-                                        "eventLocation": {
-                                            "type": "object",
-                                            "properties": {
-                                                "name": {"type": "string"},
-                                                "address": {"type": "string"}
-                                            },
-                                            "required": ["name", "address"]
-                                        },
-                                        "linkSource": {"type": "string"}
-                                    },
-                                    "required": [
-                                        "eventTitle", "eventDescription", "eventDate",
-                                        "eventPrice", "eventCategories", "eventThemes",
-                                        "eventAgeLimit", "eventLocation", "linkSource"
-                                    ]
-                                }
-                            },
-                            "required": ["data"]
-                        }
-                    },
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
+                return [self.generate_structured_response(prompts[0], model_path)]
+            except Exception as e:
+                return [e]
 
-                raw_text = response["choices"][0]["message"]["content"]
-                
-                # Clean markdown formatting if present
-                if raw_text.startswith("```"):
-                    raw_text = raw_text.split("\n", 1)[1]
-                    raw_text = raw_text.rsplit("\n", 1)[0]
-                
+        self.initialize_model(model_path)
+        tokenized = [self._tokenize_prompt(prompt) for prompt in prompts]
+        message_tokens = [self._count_tokens(self._message_part(prompt)) for prompt in prompts]
+        prefix_tokens = tokenized[0][0]
+        if any(prefix != prefix_tokens for prefix, _ in tokenized):
+            raise ValueError("Все промпты батча должны иметь общий статический префикс")
+
+        grammar = self.grammars.get()
+        start_time = time.time()
+        raw_texts = self._get_batch_decoder(len(prompts)).generate(
+            prefix_tokens,
+            [suffix for _, suffix in tokenized],
+            temperatures=[self._adjust_temperature(n) for n in message_tokens],
+            max_tokens=[
+                self._adjust_max_tokens(n, len(prefix) + len(suffix))
+                for n, (prefix, suffix) in zip(message_tokens, tokenized)
+            ],
+            grammar=grammar,
+        )
+        print(f"[{get_timestamp()}] 📚 Батч из {len(prompts)} событий декодирован за {time.time() - start_time:.2f} сек")
+
+        results: List[Any] = []
+        for prompt, n, (prefix, suffix), raw_text in zip(prompts, message_tokens, tokenized, raw_texts):
+            try:
                 try:
-                    parsed = json.loads(raw_text)
-                    # Проверяем корректность ответа
-                    validated = self._validate_response(parsed)
-                    if validated:
-                        return validated
-                    else:
-                        raise ValueError("Invalid response structure")
-                        
-                except json.JSONDecodeError as e:
-                    print(f"[ERROR] Failed to parse JSON: {str(e)}")
-                    print(f"[ERROR] Raw text was: {raw_text}")
-                    raise
+                    result = self._parse_raw_text(raw_text)
+                except (json.JSONDecodeError, ValueError):
+                    if not JSON_REPAIR:
+                        raise
+                    # Чиним в основном контексте модели: префикс промпта там уже закеширован
+                    self._ensure_prefix_state(prefix)
+                    result = self._decode_missing_fields(
+                        prefix + suffix, raw_text,
+                        self._adjust_temperature(n),
+                        self._adjust_max_tokens(n, len(prefix) + len(suffix)),
+                    )
+                results.append(self._expand_spans(result, prompt))
+            except Exception as e:
+                # Неудачные элементы батча добираем обычной генерацией с повторами
+                print(f"[{get_timestamp()}] ♻️ Элемент батча не прошёл валидацию ({str(e)}), повторяю отдельно")
+                try:
+                    results.append(self.generate_structured_response(prompt, model_path))
+                except Exception as retry_error:
+                    results.append(retry_error)
+        return results
+
+    def _message_part(self, user_prompt: str) -> str:
+        """Часть промпта с сообщением события: без примеров и подсказок, в которых тоже бывают даты"""
+        _, suffix_text = self._split_prompt(user_prompt)
+        return self.prompt_manager.message_section(suffix_text)
+
+    def _message_text(self, user_prompt: str) -> str:
+        """Сообщение события без нумерации строк режима ссылок"""
+        message = self._message_part(user_prompt)
+        if SPAN_REFERENCE_MODE:
+            return "\n".join(segments_from_prompt(message))
+        return message
+
+    def _dates_grammar(self, event_dates: List[Dict[str, str]]) -> Any:
+        """Грамматика с eventDate, подставленным из ru_dates: модель дописывает остальные поля.
+
+        Бросает EarlyAbort, если по самим датам исход уже ясен.
+        """
+        StreamGuard().feed('{"data": {"eventDate": ' + json.dumps(event_dates))
+        print(f"[{get_timestamp()}] 📅 Даты подставлены из текста: {event_dates[0]['from']} – {event_dates[0]['to']}")
+        return self.grammars.with_fixed("eventDate", event_dates)
+
+    def _generate_once(
+        self,
+        user_prompt: str,
+        model_path: str,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """Одна попытка генерации; при ошибке бросает исключение"""
+        self.initialize_model(model_path)
+
+        prefix_tokens, suffix_tokens = self._tokenize_prompt(user_prompt)
+
+        # Автоматически подбираем temperature и max_tokens по токенам сообщения, без примеров и подсказок
+        message_tokens = self._count_tokens(self._message_part(user_prompt))
+        temperature = self._adjust_temperature(message_tokens)
+        max_tokens = self._adjust_max_tokens(message_tokens, len(prefix_tokens) + len(suffix_tokens))
+        grammar = self.grammars.get()
+
+        self._ensure_prefix_state(prefix_tokens)
+        event_dates = extract_single_date(self._message_text(user_prompt)) if RU_DATES_PREFILL else None
+        if event_dates is not None:
+            try:
+                grammar = self._dates_grammar(event_dates)
+            except EarlyAbort as abort:
+                # Даты известны до инференса — решение принимается без единого токена
+                print(f"[{get_timestamp()}] ✂️ Генерация не запускалась: {abort.reason}")
+                return {
+                    "data": abort.partial,
+                    "earlyAbort": {"reason": abort.reason, "details": abort.details}
+                }
+
+        draft = self.drafts.get(model_path) if SPECULATIVE_DECODING else None
+        if draft is not None:
+            draft.reset_stats()
+        token_counter = TokenCounter()
+        guard = StreamGuard()
+        stream = self.model.create_completion(
+            prompt=prefix_tokens + suffix_tokens,
+            grammar=grammar,
+            stop=["<|im_end|>"],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stopping_criteria=StoppingCriteriaList([token_counter]),
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    stream.close()
+                    raise InferenceCancelled(f"Генерация отменена после {token_counter.count} токенов")
+                guard.feed(chunk["choices"][0]["text"])
+        except EarlyAbort as abort:
+            # Исход уже решён по первым полям: закрываем генератор, декодирование останавливается
+            stream.close()
+            print(f"[{get_timestamp()}] ✂️ Генерация остановлена после {token_counter.count} токенов: {abort.reason}")
+            return {
+                "data": abort.partial,
+                "earlyAbort": {"reason": abort.reason, "details": abort.details}
+            }
+        finally:
+            if draft is not None:
+                self.last_speculative_stats = draft.report(token_counter.count)
+                print(f"[{get_timestamp()}] 🎯 Спекулятивное декодирование: принято {self.last_speculative_stats['accepted']}/{self.last_speculative_stats['proposed']} черновых токенов ({self.last_speculative_stats['accept_rate'] * 100:.1f}%)")
+
+        result = self._parse_or_repair(prefix_tokens + suffix_tokens, guard.text, temperature, max_tokens)
+        return self._expand_spans(result, user_prompt)
+
+    def generate_structured_response(self, user_prompt: str, model_path: str) -> Dict[str, Any]:
+        retries = 0
+        last_error = None
 
+        while retries < self.max_retries:
+            try:
+                return self._generate_once(user_prompt, model_path)
+            except ContextOverflow:
+                # Повтор не поможет: промпт не станет короче
+                raise
             except Exception as e:
                 last_error = e
                 retries += 1
@@ -269,6 +558,68 @@ class LocalModel:
         print(f"[{get_timestamp()}] 💥 Все попытки исчерпаны. Последняя ошибка: {str(last_error)}")
         raise last_error
 
+    async def agenerate_structured_response(self, user_prompt: str, model_path: str) -> Dict[str, Any]:
+        """Асинхронная версия generate_structured_response.
+
+        Инференс идёт в выделенном потоке модели, event loop в это время свободен.
+        Отмена корутины останавливает декодирование на ближайшем токене.
+        """
+        loop = asyncio.get_running_loop()
+        retries = 0
+        last_error = None
+
+        while retries < self.max_retries:
+            cancel_event = threading.Event()
+            try:
+                return await loop.run_in_executor(
+                    self.executor, self._generate_once, user_prompt, model_path, cancel_event
+                )
+            except asyncio.CancelledError:
+                cancel_event.set()
+                raise
+            except ContextOverflow:
+                raise
+            except Exception as e:
+                last_error = e
+                retries += 1
+                if retries < self.max_retries:
+                    print(f"[{get_timestamp()}] Попытка {retries}/{self.max_retries}. Ошибка: {str(e)}")
+                    await asyncio.sleep(self.retry_delay * retries)  # Увеличиваем задержку с каждой попыткой
+                continue
+
+        print(f"[{get_timestamp()}] 💥 Все попытки исчерпаны. Последняя ошибка: {str(last_error)}")
+        raise last_error
+
+    def classify_event(self, prompt: str, model_path: str) -> Dict[str, Any]:
+        """Категории и темы по короткому промпту быстрого пути"""
+        self.initialize_model(model_path)
+        tokens = self.model.tokenize(
+            (
+                "<|im_start|>system\nТы классифицируешь мероприятия по справочникам.<|im_end|>\n"
+                f"<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n"
+            ).encode("utf-8"),
+            add_bos=True,
+            special=True
+        )
+        completion = self.model.create_completion(
+            prompt=tokens,
+            grammar=self.grammars.classification(),
+            stop=["<|im_end|>"],
+            temperature=0.2,
+            max_tokens=128,
+        )
+        return json.loads(completion["choices"][0]["text"])
+
+    async def aclassify_event(self, prompt: str, model_path: str) -> Dict[str, Any]:
+        """Асинхронная версия classify_event, выполняется в потоке модели"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.classify_event, prompt, model_path)
+
+    async def agenerate_structured_batch(self, prompts: List[str], model_path: str) -> List[Any]:
+        """Асинхронная версия generate_structured_batch, выполняется в потоке модели"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.generate_structured_batch, prompts, model_path)
+
 textAds = "Из Калининграда организуют регулярные экскурсии в национальный парк «Куршская коса». Участники посетят ключевые локации заповедника, услышат, как «поёт» песок, пообедают в трактире, а в завершение дня посетят сыроварню и прогуляются по Зеленоградску. \n\n👉 забронировать экскурсию (https://dvuhmetrovigid.ru/excursions/?did=0039&utm_source=part&utm_medium=0039&excursion=233)\n\nЦена с плотным обедом 3900 ₽, длительность 8 часов.\n\nПодписаться на АНОНС39 (https://t.me/+-cCRoVroPdZiMDYy)"
 textEvent = "Название: Екатерина Яшникова в Калининграде. Дата: 27 июля (воскресенье) 20:00 – 22:30. Описание: Екатерина Яшникова – девушка с гитарой и огромными амбициями. Понятные истории и блестяще адаптированный для поп-рока русский язык делают каждую песню притягательной.\n\nОна создает себя сама — и у нее это получается. Миллионы просмотров на YouTube, концерты по всей стране, мощные коллаборации, в том числе с группой Uma2rman, ставшие народными песнями — это только часть побед за девятилетнюю историю проекта.\n\nОна поет на «Квартирнике у Маргулиса» и «Дикой Мяте», YLETAЙ и STEREOLETO и один за другим покоряет рок-фестивали и снимает клипы, которые выигрывают награды на конкурсе короткометражек. В ее дискографии – 5 EP, 7 полноценных альбомов и большое количество синглов, в которых много любви. Потому что без любви — к миру и слушателю — невозможно творить, как Екатерина Яшникова: ярко, живо, остро и предельно честно, создавая не просто песни — целые миры, в которых каждый находит себя.\n\nВнимание: нумерация и расположение мест за столами являются условными, имеет значение только номер стола. Цена: 1200. Адрес: ул. Дзержинского, 31В, Калининград. Категория: концерт"
 textEvent2 = "Название: ELECTRODVOR x Ш presents. Дата: 13 (пятница) 23:22 – 14 (суббота) 06:00 июня. Описание: ELECTRODVOR x Ш presents:\n\nUTOPIA: CHAPTER ONE\nsluts, zombies, vampires, dolls, plants\n\n локация: electrodvor\n дата: пятница, 13 июня\n хосты: Ш\n\nв эту ночь всё скрытое — всплывёт.\nвсё мёртвое — задвигается в ритме.\nа все «не такие» — станут собой.\n\nзомби целуются с растениями,\nкуклы режут воздух,\nslutty tatty ведут в утопию…\nили прямо в ад. who knows?\n\n лекция об истории рейва\n мистический опыт и напитки\n музыкальный стол от декадентов и декаденток городка К:\nHard girls crew (Naya, YASYA, Xenia Raketa) Ah_Ulya, Selectica, daria ave_sna, przrk, dj voroffka, nrthwst, givemeyourtop & ownernaservere\nтранслируют:\nHard style,\nArtist open mind selection,\nTropical bass,\nGothic rave\nDarkwave\nWitch House \nIndustrial / EBM  & live performances\n\n 13 июня — ночь, чтобы сиять.\nпокажи миру свой аутфит и выиграй приз.\n\nглава первая скоро откроется.\nне пропусти портал:\nподписывайся, следи, входи.\n\n early bird — в продаже\n\n#utopia_party #chapterone #slutszombiesvampires #undergroundmagic. Цена: 666. Адрес: Каштановая аллея 1 «а», Калининград. Категория: рейв"
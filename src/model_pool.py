@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from llama_cpp import Llama
+import os
+from src.config import (
+    MODEL_POOL_RAM_BUDGET_GB, MODEL_POOL_OVERHEAD, MODEL_USE_MMAP, MODEL_USE_MLOCK, MODEL_N_CTX
+)
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ModelPool:
+    """Держит несколько GGUF-моделей загруженными одновременно.
+
+    Модели хранятся по ключу (по умолчанию — путь к файлу) в порядке последнего
+    использования. Если новая модель не помещается в бюджет RAM, выгружаются давно
+    не использованные. Параметры загрузки применяются только при загрузке, поэтому
+    экземпляры с другими параметрами (например, черновая модель без draft_model)
+    должны получать собственный ключ.
+    """
+
+    def __init__(
+        self,
+        ram_budget_gb: Optional[float] = MODEL_POOL_RAM_BUDGET_GB,
+        use_mmap: bool = MODEL_USE_MMAP,
+        use_mlock: bool = MODEL_USE_MLOCK,
+        **llama_kwargs: Any,
+    ):
+        self.ram_budget = int(ram_budget_gb * 1024 ** 3) if ram_budget_gb else None
+        self.use_mmap = use_mmap
+        self.use_mlock = use_mlock
+        self.llama_kwargs = {
+            "n_ctx": MODEL_N_CTX,
+            "n_gpu_layers": 48,
+            "n_threads": os.cpu_count(),
+            "n_batch": 1024,
+            "chat_format": "chatml",
+            "verbose": False,
+            **llama_kwargs,
+        }
+        self.models: "OrderedDict[str, Llama]" = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.on_evict: List[Callable[[str], None]] = []
+        self.stats = {'loads': 0, 'hits': 0, 'evictions': 0}
+
+    @staticmethod
+    def estimate_size(model_path: str) -> int:
+        """Оценка занимаемой памяти: размер весов плюс запас на контекст и KV-кеш"""
+        return int(os.path.getsize(model_path) * MODEL_POOL_OVERHEAD)
+
+    def used_bytes(self) -> int:
+        return sum(self.sizes.values())
+
+    def get(self, model_path: str, key: Optional[str] = None, **llama_kwargs: Any) -> Llama:
+        """Возвращает загруженную модель, при необходимости загружая её"""
+        key = key or model_path
+        if key in self.models:
+            self.models.move_to_end(key)
+            self.stats['hits'] += 1
+            return self.models[key]
+
+        size = self.estimate_size(model_path)
+        self._make_room(size)
+        try:
+            model = Llama(
+                model_path=model_path,
+                use_mmap=self.use_mmap,
+                use_mlock=self.use_mlock,
+                **{**self.llama_kwargs, **llama_kwargs},
+            )
+        except Exception as e:
+            print(f"[{get_timestamp()}] 💥 Ошибка при инициализации: {str(e)}")
+            raise
+        self.models[key] = model
+        self.sizes[key] = size
+        self.stats['loads'] += 1
+        print(f"[{get_timestamp()}] 📦 Загружена модель {model_path.split('/')[-1]} (~{size / 1024 ** 3:.1f} ГБ, в пуле: {len(self.models)})")
+        return model
+
+    def _make_room(self, size: int):
+        if self.ram_budget is None:
+            return
+        while self.models and self.used_bytes() + size > self.ram_budget:
+            self.evict(next(iter(self.models)))
+        if size > self.ram_budget:
+            print(f"[{get_timestamp()}] ⚠️ Модель (~{size / 1024 ** 3:.1f} ГБ) больше бюджета пула {self.ram_budget / 1024 ** 3:.1f} ГБ")
+
+    def evict(self, key: str):
+        """Выгружает модель из пула"""
+        model = self.models.pop(key, None)
+        self.sizes.pop(key, None)
+        if model is None:
+            return
+        for callback in self.on_evict:
+            callback(key)
+        model.close()
+        self.stats['evictions'] += 1
+        print(f"[{get_timestamp()}] ♻️ Модель {key.split('/')[-1]} выгружена из пула")
+
+    def close(self):
+        for key in list(self.models):
+            self.evict(key)
@@ -0,0 +1,176 @@
+import html
+import re
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from src.config import (
+    NEAR_DUPLICATE_NUM_PERM, NEAR_DUPLICATE_BANDS, NEAR_DUPLICATE_THRESHOLD
+)
+from src.result_store import ResultStore
+from src.router import DATE_PATTERN
+from src.utils import load_parsed_results
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+HASHTAG_PATTERN = re.compile(r"#[\w-]+")
+URL_QUERY_PATTERN = re.compile(r"(https?://[^\s?#)]+)[?#][^\s)]*")
+PRICE_PATTERN = re.compile(r"(\d[\d\s]*)\s*(?:₽|руб)|Цена:\s*(?:от\s*)?(\d[\d\s]*)", re.IGNORECASE)
+
+
+def normalize_event_text(text: str) -> str:
+    """Убирает то, чем отличаются копии одного события в разных лентах"""
+    text = html.unescape(text).replace("\xa0", " ")
+    text = URL_QUERY_PATTERN.sub(r"\1", text)
+    text = HASHTAG_PATTERN.sub(" ", text)
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    words = normalize_event_text(text).split()
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def extract_dates(text: str) -> set:
+    return {re.sub(r"\s+", " ", match.lower()) for match in DATE_PATTERN.findall(html.unescape(text))}
+
+
+def extract_prices(text: str) -> List[int]:
+    prices = []
+    for match in PRICE_PATTERN.finditer(html.unescape(text).replace("\xa0", " ")):
+        digits = re.sub(r"\s", "", match.group(1) or match.group(2))
+        if digits:
+            prices.append(int(digits))
+    return prices
+
+
+def _is_parsed(result: Any) -> bool:
+    return isinstance(result, dict) and bool(result) and "errorCode" not in result
+
+
+class NearDuplicateIndex:
+    """MinHash LSH-индекс ранее разобранных текстов событий.
+
+    Сигнатура — NUM_PERM минимумов хешей по словесным 3-граммам нормализованного
+    текста, поэтому перестановка абзацев, другие хештеги или UTM-метки почти не
+    меняют её. Сигнатура режется на BANDS полос, и кандидатами считаются тексты,
+    совпавшие хотя бы в одной полосе целиком; поиск стоит несколько словарных
+    обращений независимо от размера индекса. В памяти лежат только сигнатуры и
+    id событий: текст и результат кандидата читаются из хранилища результатов
+    при проверке, поэтому событие находится, когда бэкенд принял его результат.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = NEAR_DUPLICATE_NUM_PERM,
+        bands: int = NEAR_DUPLICATE_BANDS,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        store: Optional[ResultStore] = None,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm={num_perm} должно делиться на bands={bands}")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._size = 0
+        self.event_ids: List[str] = []
+        self._store = store
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self.stats = {"lookups": 0, "reused": 0, "rejected": 0}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)] or [0],
+            dtype=np.uint64
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    @property
+    def store(self) -> ResultStore:
+        if self._store is None:
+            self._store = ResultStore()
+        return self._store
+
+    def add(self, text: str, event_id: str):
+        signature = self.signature(text)
+        if self._size == len(self.signatures):
+            grown = np.empty((max(1024, self._size * 2), self.num_perm), dtype=np.uint32)
+            grown[:self._size] = self.signatures[:self._size]
+            self.signatures = grown
+        self.signatures[self._size] = signature
+        for band, key in zip(self.buckets, self._band_keys(signature)):
+            band.setdefault(key, []).append(self._size)
+        self.event_ids.append(str(event_id))
+        self._size += 1
+
+    def load_history(self, history: Optional[List[Dict[str, Any]]] = None):
+        for entry in history if history is not None else load_parsed_results():
+            text, result = entry.get("initial_event"), entry.get("result")
+            if isinstance(text, str) and _is_parsed(result) and entry.get("id") is not None:
+                self.add(text, entry["id"])
+        print(f"[{get_timestamp()}] 🔎 Индекс похожих событий: {len(self)} текстов")
+
+    def find(self, text: str) -> Optional[Tuple[int, float]]:
+        """Ближайший ранее разобранный текст с оценкой сходства Жаккара не ниже порога"""
+        signature = self.signature(text)
+        candidates = set()
+        for band, key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(band.get(key, ()))
+        if not candidates:
+            return None
+        ids = np.fromiter(candidates, dtype=np.int64)
+        similarity = (self.signatures[ids] == signature).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] < self.threshold:
+            return None
+        return int(ids[best]), float(similarity[best])
+
+    def reuse(self, text: str) -> Optional[Dict[str, Any]]:
+        """Результат похожего события с поправленной ценой или None, если нужен инференс.
+
+        Даты определяют само событие, поэтому при любом расхождении в упоминаниях дат
+        результат не переиспользуется. Цена переизвлекается из нового текста.
+        """
+        self.stats["lookups"] += 1
+        match = self.find(text)
+        if match is None:
+            return None
+        index, similarity = match
+        source = self.store.get(self.event_ids[index])
+        if source is None or not _is_parsed(source.get("result")):
+            # Результат ещё не принят бэкендом или событие потом не разобрано
+            self.stats["rejected"] += 1
+            return None
+        source_text, result = source.get("initial_event", ""), source["result"]
+        if extract_dates(text) != extract_dates(source_text):
+            self.stats["rejected"] += 1
+            return None
+        prices, source_prices = extract_prices(text), extract_prices(source_text)
+        if prices != source_prices:
+            if not prices:
+                self.stats["rejected"] += 1
+                return None
+            result["eventPrice"] = prices
+        link = result.get("linkSource")
+        if link and link not in text:
+            result["linkSource"] = ""
+        self.stats["reused"] += 1
+        print(f"[{get_timestamp()}] 🔎 Похожее событие (сходство {similarity:.2f}): {result.get('eventTitle', '')}")
+        return result
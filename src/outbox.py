@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.backend_client import BackendClient
+from src.config import (
+    OUTBOX_FILE, OUTBOX_BATCH_SIZE, OUTBOX_FLUSH_INTERVAL, OUTBOX_RETRY_BACKOFF, OUTBOX_RETRY_MAX_DELAY,
+    OUTBOX_MAX_REJECTIONS
+)
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Outbox:
+    """Надёжная очередь результатов на отправку в fillParsingEventResult.
+
+    Результат сначала записывается в SQLite, и только потом событие снимается
+    с рабочей очереди, поэтому недоступность бэкенда не теряет уже сделанный
+    инференс. Фоновый flusher отправляет накопленное пачками параллельных
+    запросов через общий BackendClient. Ключ — id события: повторная отправка
+    того же результата безопасна, а не подтверждённые записи повторяются с
+    растущей задержкой. Ответ бэкенда передаётся в on_ack, и только после этого
+    запись удаляется. Результаты, которые бэкенд отклоняет с 4xx
+    OUTBOX_MAX_REJECTIONS раз подряд, переносятся в таблицу outbox_dead.
+    """
+
+    def __init__(
+        self,
+        on_ack: Optional[Callable[[Dict[str, Any]], None]] = None,
+        db_file: str = OUTBOX_FILE,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+    ):
+        self.on_ack = on_ack
+        self.batch_size = batch_size
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id TEXT PRIMARY KEY, entry TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_next_attempt ON outbox (next_attempt_at)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox_dead ("
+            "id TEXT PRIMARY KEY, entry TEXT NOT NULL, error TEXT NOT NULL, failed_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.stats = {"submitted": 0, "failed_attempts": 0, "dead": 0}
+
+    def put(self, entry: Dict[str, Any]):
+        """Ставит результат в очередь на отправку; новый результат по тому же id заменяет старый"""
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO outbox (id, entry, attempts, next_attempt_at, created_at) VALUES (?, ?, 0, ?, ?)",
+                (str(entry["id"]), json.dumps(entry, ensure_ascii=False), now, now)
+            )
+            self.conn.commit()
+        if self._wakeup is not None and len(self) >= self.batch_size:
+            self._wakeup.set()
+
+    def __contains__(self, event_id: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM outbox WHERE id = ?", (str(event_id),)).fetchone() is not None
+
+    def depth(self) -> int:
+        return len(self)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def _due(self) -> List[Tuple[Dict[str, Any], int, float]]:
+        rows = self.conn.execute(
+            "SELECT entry, attempts, created_at FROM outbox WHERE next_attempt_at <= ? ORDER BY created_at LIMIT ?",
+            (time.time(), self.batch_size)
+        ).fetchall()
+        return [(json.loads(entry), attempts, created_at) for entry, attempts, created_at in rows]
+
+    def _retry_later(self, entry: Dict[str, Any], attempts: int, error: Exception):
+        delay = min(OUTBOX_RETRY_MAX_DELAY, OUTBOX_RETRY_BACKOFF * 2 ** attempts)
+        with self._lock:
+            self.conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                (time.time() + delay, str(entry["id"]))
+            )
+            self.conn.commit()
+        self.stats["failed_attempts"] += 1
+        print(f"[{get_timestamp()}] 📮 Результат {entry['id']} не отправлен ({error!r}), повтор через {delay:.0f} сек")
+
+    def _bury(self, entry: Dict[str, Any], created_at: float, error: Exception):
+        """Бэкенд отклоняет результат (4xx): повторы не помогут, запись уходит в outbox_dead"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO outbox_dead (id, entry, error, failed_at) VALUES (?, ?, ?, ?)",
+                (str(entry["id"]), json.dumps(entry, ensure_ascii=False), str(error), time.time())
+            )
+            self.conn.execute("DELETE FROM outbox WHERE id = ? AND created_at = ?", (str(entry["id"]), created_at))
+            self.conn.commit()
+        self.stats["dead"] += 1
+        print(f"[{get_timestamp()}] ☠️ Результат {entry['id']} отклонён бэкендом ({error}), больше не отправляется")
+
+    async def _submit(self, client: BackendClient, entry: Dict[str, Any], attempts: int, created_at: float) -> bool:
+        payload = {"id": entry["id"], "result": entry["result"]}
+        try:
+            response_from_server = await client.fill_parsing_event_result(payload)
+            if self.on_ack is not None:
+                # До удаления строки: если сохранить ответ не вышло, результат останется в outbox
+                self.on_ack({**entry, "responseFromServer": response_from_server})
+        except Exception as e:
+            status = getattr(e, "status", None)
+            if status is not None and 400 <= status < 500 and attempts + 1 >= OUTBOX_MAX_REJECTIONS:
+                self._bury(entry, created_at, e)
+            else:
+                # Повторная отправка того же результата по тому же id безопасна
+                self._retry_later(entry, attempts, e)
+            return False
+        with self._lock:
+            # Удаляем только ту версию, которую отправили: новый put за время запроса остаётся в очереди
+            self.conn.execute("DELETE FROM outbox WHERE id = ? AND created_at = ?", (str(entry["id"]), created_at))
+            self.conn.commit()
+        self.stats["submitted"] += 1
+        return True
+
+    async def flush(self, client: BackendClient) -> int:
+        """Отправляет одну пачку готовых к отправке результатов, возвращает число подтверждённых"""
+        due = self._due()
+        if not due:
+            return 0
+        sent = await asyncio.gather(*(self._submit(client, *item) for item in due))
+        return sum(sent)
+
+    async def run(self, client: BackendClient, interval: float = OUTBOX_FLUSH_INTERVAL):
+        """Фоновый flusher: пачка за пачкой, пока есть что отправлять, затем ждёт interval или полную пачку"""
+        self._wakeup = asyncio.Event()
+        while not self._stopping:
+            if await self.flush(client):
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+        # Последний проход перед остановкой; что не ушло, останется до следующего запуска
+        while await self.flush(client):
+            pass
+        if len(self):
+            print(f"[{get_timestamp()}] 📮 В outbox осталось {len(self)} неотправленных результатов")
+
+    def stop(self):
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def report(self) -> Dict[str, Any]:
+        oldest = self.conn.execute("SELECT MIN(created_at) FROM outbox").fetchone()[0]
+        return {
+            **self.stats,
+            "depth": len(self),
+            "oldest_age_sec": time.time() - oldest if oldest is not None else 0,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from src.config import PIPELINE_QUEUE_SIZE, PIPELINE_INFER_WORKERS, PIPELINE_REPORT_INTERVAL
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+STAGES = ("fetch", "normalize", "infer", "submit")
+
+
+class Pipeline:
+    """Конвейер sync: выборка → поиск готового результата → инференс → отправка.
+
+    Стадии работают одновременно и связаны ограниченными asyncio.Queue, поэтому
+    быстрая стадия упирается в заполненную очередь, а не копит события в памяти.
+    Выборка из бэкенда идёт параллельно с разбором того, что уже лежит в рабочей
+    очереди, а отправка результатов не задерживает следующий инференс.
+    Для каждой стадии считаются обработанные события, время работы и загрузка.
+    """
+
+    def __init__(
+        self,
+        model_api: Any,
+        work_queue: Any,
+        submit: Callable[[Dict[str, Any], Dict[str, Any]], None],
+        on_error: Callable[[Dict[str, Any], Exception], None],
+        fetch: Optional[Callable[[], Awaitable[Optional[List[Dict[str, Any]]]]]] = None,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        infer_workers: int = PIPELINE_INFER_WORKERS,
+    ):
+        self.model_api = model_api
+        self.work_queue = work_queue
+        self.submit = submit
+        self.on_error = on_error
+        self.fetch = fetch
+        self.queue_size = queue_size
+        self.infer_workers = infer_workers
+        self.stats = {stage: {"items": 0, "busy": 0.0} for stage in STAGES}
+        self.started_at = 0.0
+        self._active_inferences = 0
+        self._infer_busy_since = 0.0
+        self._stopping = False
+        self._remote: Optional[asyncio.Task] = None
+
+    def _track(self, stage: str, started: float):
+        self.stats[stage]["items"] += 1
+        self.stats[stage]["busy"] += time.time() - started
+
+    async def _fetch_remote(self):
+        started = time.time()
+        events = await self.fetch()
+        if events:
+            added = self.work_queue.enqueue_many(events)
+            print(f"[{get_timestamp()}] 🔄 Получил список из {len(events)} элементов, новых в очереди: {added}")
+        self.stats["fetch"]["busy"] += time.time() - started
+
+    async def _fetcher(self):
+        remote = asyncio.create_task(self._fetch_remote()) if self.fetch else None
+        self._remote = remote
+        try:
+            while not self._stopping:
+                started = time.time()
+                events = self.work_queue.claim(self.queue_size)
+                for event in events:
+                    self._track("fetch", started)
+                    await self.to_normalize.put(event)
+                    started = time.time()
+                if events:
+                    continue
+                if remote is None or remote.done():
+                    break
+                # Очередь пуста, но список из бэкенда ещё не получен
+                await asyncio.wait({remote})
+            if remote is not None and remote.done() and not remote.cancelled():
+                remote.result()
+        finally:
+            if remote is not None and not remote.done():
+                remote.cancel()
+            await self.to_normalize.put(None)
+
+    async def _normalizer(self):
+        while True:
+            event = await self.to_normalize.get()
+            if event is None:
+                break
+            started = time.time()
+            known = self.model_api.lookup_known(event['input'])
+            self._track("normalize", started)
+            if known is not None:
+                await self.to_submit.put((event, known))
+            else:
+                await self.to_infer.put(event)
+        for _ in range(self.infer_workers):
+            await self.to_infer.put(None)
+
+    async def _inferer(self):
+        while True:
+            event = await self.to_infer.get()
+            if event is None:
+                break
+            print(f"[{get_timestamp()}] 🤖 Starting AI processing for event {event['id']}")
+            if self._active_inferences == 0:
+                self._infer_busy_since = time.time()
+            self._active_inferences += 1
+            try:
+                response = await self.model_api.call_model_api(event['input'], lookup=False, event_id=event['id'])
+            except Exception as e:
+                self.on_error(event, e)
+                continue
+            finally:
+                # Время infer — время, когда идёт хотя бы один инференс, без двойного счёта воркеров
+                self._active_inferences -= 1
+                self.stats["infer"]["items"] += 1
+                if self._active_inferences == 0:
+                    self.stats["infer"]["busy"] += time.time() - self._infer_busy_since
+            # ModelAPI не бросает исключения, а возвращает ответ с 'error' — это тоже провал инференса
+            if 'error' in response:
+                self.on_error(event, RuntimeError(response['error']))
+                continue
+            await self.to_submit.put((event, response))
+        await self.to_submit.put(None)
+
+    async def _submitter(self):
+        finished_workers = 0
+        while finished_workers < self.infer_workers:
+            item = await self.to_submit.get()
+            if item is None:
+                finished_workers += 1
+                continue
+            event, response = item
+            started = time.time()
+            try:
+                self.submit(event, response)
+            except Exception as e:
+                self.on_error(event, e)
+            self._track("submit", started)
+
+    def stop(self):
+        """Больше не берёт события из рабочей очереди; уже взятые дорабатываются до конца"""
+        self._stopping = True
+        if self._remote is not None and not self._remote.done():
+            self._remote.cancel()
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(PIPELINE_REPORT_INTERVAL)
+            report = self.report()
+            stages = ", ".join(f"{stage} {report[stage]['items']} ({report[stage]['utilization']:.0%})" for stage in STAGES)
+            print(f"[{get_timestamp()}] 🏭 Конвейер: {stages}; очереди {report['queues']}")
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        report: Dict[str, Any] = {
+            stage: {
+                "items": stats["items"],
+                "items_per_sec": stats["items"] / elapsed,
+                "utilization": stats["busy"] / elapsed,
+            }
+            for stage, stats in self.stats.items()
+        }
+        report["queues"] = {
+            name: queue.qsize()
+            for name, queue in (("normalize", self.to_normalize), ("infer", self.to_infer), ("submit", self.to_submit))
+        }
+        report["elapsed_sec"] = elapsed
+        return report
+
+    async def run(self) -> Dict[str, Any]:
+        """Прогоняет всю рабочую очередь и возвращает статистику стадий"""
+        self.to_normalize: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self.to_infer: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self.to_submit: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self.started_at = time.time()
+        tasks = [
+            asyncio.create_task(self._fetcher()),
+            asyncio.create_task(self._normalizer()),
+            *(asyncio.create_task(self._inferer()) for _ in range(self.infer_workers)),
+            asyncio.create_task(self._submitter()),
+        ]
+        reporter = asyncio.create_task(self._reporter())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in (*tasks, reporter):
+                task.cancel()
+        report = self.report()
+        print(f"[{get_timestamp()}] 🏭 Конвейер завершён за {report['elapsed_sec']:.1f} сек: "
+              + ", ".join(f"{stage} {report[stage]['items']} ({report[stage]['items_per_sec']:.2f}/сек)" for stage in STAGES))
+        return report
@@ -1,15 +1,11 @@
 from flask import Flask, render_template
-import json
+from src.utils import iter_parsed_results
 from datetime import datetime
 
 app = Flask(__name__)
 
 def load_parser_list():
-    try:
-        with open('data/parserList.json', 'r', encoding='utf-8') as file:
-            return json.load(file)['data']
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    return iter_parsed_results()
 
 def format_date(date_str):
     try:
@@ -1,13 +1,32 @@
-from typing import Dict
-from src.config import PROMPT_FILE, JSON_SCHEME_FILE, FEW_SHOT_FILE, SCHEME_HINTS_FILE
+from typing import Any, Dict, List, Optional, Tuple
+from src.config import (
+    PROMPT_FILE, JSON_SCHEME_FILE, FEW_SHOT_FILE, SCHEME_HINTS_FILE, SPAN_REFERENCE_MODE, HINTS_PRUNING,
+    EXAMPLES_RETRIEVAL, EXAMPLES_TOP_K
+)
+from src.example_index import ExampleIndex
+from src.hints import SchemaHints
+from src.spans import number_segments, span_instruction
+
+MESSAGE_PLACEHOLDER = "{{ message }}"
+# Переменные, зависящие от события; статический префикс заканчивается перед первой из них
+DYNAMIC_PLACEHOLDERS = ("{{ relevant_examples }}", "{{ relevant_hints }}", MESSAGE_PLACEHOLDER)
+# Заголовок, после которого в промпте идёт только текст события
+MESSAGE_HEADER = "## 📨 ВХОДНОЙ ТЕКСТ:"
+# Общие указания из few_shot.md остаются в статическом префиксе и при динамических примерах
+FEW_SHOT_GUIDANCE_HEADER = "### Дополнительные указания"
 
 class PromptManager:
-    def __init__(self):
+    def __init__(self, history: Optional[List[Dict[str, Any]]] = None):
         self.prompt = self._load_file(PROMPT_FILE)
         self.json_scheme = self._load_file(JSON_SCHEME_FILE)
         # Remove few_shot examples and scheme_hints to reduce token count
         self.few_shot = self._load_file(FEW_SHOT_FILE)
         self.scheme_hints = self._load_file(SCHEME_HINTS_FILE)
+        self.hints = SchemaHints(self.scheme_hints)
+        # history — уже загруженные результаты, чтобы не читать хранилище повторно
+        self.examples = ExampleIndex().load_history(history) if EXAMPLES_RETRIEVAL else ExampleIndex()
+        # Всё, что стоит до {{ message }}, одинаково для всех событий и кешируется моделью
+        self.static_prefix, self.message_template = self._split_template()
 
     @staticmethod
     def _load_file(file_path: str) -> str:
@@ -20,12 +39,58 @@ class PromptManager:
             text = text.replace(f"{{{{ {var_name} }}}}", str(var_value))
         return text
 
-    def prepare_prompt(self, message: str) -> str:
-        """Prepares the full prompt with all variables"""
-        variables = {
+    def _static_few_shot(self) -> str:
+        """Без истории остаются примеры из few_shot.md, иначе только общие указания"""
+        if not len(self.examples):
+            return self.few_shot
+        _, header, guidance = self.few_shot.partition(FEW_SHOT_GUIDANCE_HEADER)
+        return header + guidance
+
+    def _split_template(self) -> Tuple[str, str]:
+        """Renders static variables and splits the template before the first per-event variable"""
+        static_variables = {
             "json_schema": self.json_scheme,
-            "schema_hints": self.scheme_hints,
-            "few_shot_examples": self.few_shot,
-            "message": message
+            "schema_hints": self.hints.compact_rules() if HINTS_PRUNING else self.scheme_hints,
+            "few_shot_examples": self._static_few_shot(),
+        }
+        if MESSAGE_PLACEHOLDER not in self.prompt:
+            raise ValueError(f"{PROMPT_FILE} не содержит {MESSAGE_PLACEHOLDER}")
+        split_at = min(self.prompt.find(p) for p in DYNAMIC_PLACEHOLDERS if p in self.prompt)
+        return (
+            self.replace_variables(self.prompt[:split_at], static_variables),
+            self.replace_variables(self.prompt[split_at:], static_variables),
+        )
+
+    def _render_suffix(self, message: str, relevant_examples: str, relevant_hints: str) -> str:
+        variables = {
+            "relevant_examples": relevant_examples,
+            "relevant_hints": relevant_hints,
+            "message": number_segments(message) if SPAN_REFERENCE_MODE else message,
         }
-        return self.replace_variables(self.prompt, variables) 
\ No newline at end of file
+        suffix = self.replace_variables(self.message_template, variables)
+        if SPAN_REFERENCE_MODE:
+            # Инструкция идёт после сообщения, чтобы статический префикс не зависел от режима
+            suffix += span_instruction()
+        return suffix
+
+    def prepare_prompt_parts(self, message: str) -> Tuple[str, str]:
+        """Returns the static prompt prefix and the per-event suffix"""
+        return self.static_prefix, self._render_suffix(
+            message,
+            self.examples.render(self.examples.nearest(message, EXAMPLES_TOP_K)),
+            self.hints.relevant(message) if HINTS_PRUNING else "",
+        )
+
+    def prepare_message_section(self, message: str) -> str:
+        """Renders only the message section of the suffix, without retrieval"""
+        return self.message_section(self._render_suffix(message, "", ""))
+
+    @staticmethod
+    def message_section(suffix: str) -> str:
+        """Part of the per-event suffix after the input header, without retrieved examples and hints"""
+        _, header, message = suffix.partition(MESSAGE_HEADER)
+        return message if header else suffix
+
+    def prepare_prompt(self, message: str) -> str:
+        """Prepares the full prompt with all variables"""
+        return "".join(self.prepare_prompt_parts(message))
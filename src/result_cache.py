@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+from src.config import (
+    MODEL_NAME, MODEL_NAME_VERY_SMART, PROMPT_FILE, FEW_SHOT_FILE, JSON_SCHEME_FILE,
+    SCHEME_HINTS_FILE, RESULT_CACHE_FILE, RESULT_CACHE_TTL_DAYS, RESULT_CACHE_MAX_MB,
+    RESULT_CACHE_SCHEMA_VERSION, SPAN_REFERENCE_MODE
+)
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста события для ключа кеша: Unicode NFC и схлопнутые пробелы"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def _files_digest(paths: Iterable[str]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            digest.update(f"missing:{path}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Кеш результатов разбора на SQLite с адресацией по содержимому.
+
+    Ключ — хеш нормализованного текста вместе со всем, что влияет на ответ: пути
+    моделей, содержимое файлов промпта и версия схемы. Смена любого из них
+    делает старые записи недостижимыми, а TTL и лимит размера постепенно их вытесняют.
+    """
+
+    def __init__(
+        self,
+        db_file: str = RESULT_CACHE_FILE,
+        ttl_days: float = RESULT_CACHE_TTL_DAYS,
+        max_mb: float = RESULT_CACHE_MAX_MB,
+    ):
+        self.ttl = ttl_days * 24 * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.version = hashlib.sha256(json.dumps([
+            MODEL_NAME,
+            MODEL_NAME_VERY_SMART,
+            _files_digest((PROMPT_FILE, FEW_SHOT_FILE, JSON_SCHEME_FILE, SCHEME_HINTS_FILE)),
+            RESULT_CACHE_SCHEMA_VERSION,
+            SPAN_REFERENCE_MODE,
+        ]).encode("utf-8")).hexdigest()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+        self.conn.commit()
+        self.purge_expired()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.version}:{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            self.stats["misses"] += 1
+            return None
+        self.conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]):
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, payload, len(payload.encode("utf-8")), now, now)
+        )
+        self.conn.commit()
+        self._evict_to_size()
+
+    def purge_expired(self):
+        cursor = self.conn.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl,))
+        self.conn.commit()
+        self.stats["evictions"] += cursor.rowcount
+
+    def _evict_to_size(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Вытесняем давно не читавшиеся записи, пока не уложимся в лимит
+        evicted = 0
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self.conn.commit()
+        self.stats["evictions"] += evicted
+        print(f"[{get_timestamp()}] 🗄️ Из кеша результатов вытеснено {evicted} записей")
+
+    def report(self) -> Dict[str, Any]:
+        requests = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / requests if requests else 0}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,107 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+from src.config import RESULT_STORE_FILE, RESULT_STORE_LEGACY_FILE, RESULT_STORE_COMPACT_EVERY
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ResultStore:
+    """Журнал разобранных событий в SQLite вместо перезаписи data/parserList.json.
+
+    Запись — одна вставка, чтение идёт курсором без загрузки всей истории в
+    память, индексы по id события и времени обработки. Повторные результаты по
+    одному id копятся как журнал, compact оставляет последний из них. Старый
+    parserList.json переносится явным вызовом import_legacy из sync, открытие
+    хранилища ничего не переносит.
+    """
+
+    def __init__(self, db_file: str = RESULT_STORE_FILE, compact_every: int = RESULT_STORE_COMPACT_EVERY):
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self.compact_every = compact_every
+        self._appended = 0
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, event_id TEXT NOT NULL, "
+            "processed_at TEXT NOT NULL, payload TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_event_id ON results (event_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_processed_at ON results (processed_at)")
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    def import_legacy(self, legacy_file: str = RESULT_STORE_LEGACY_FILE) -> int:
+        """Переносит результаты из parserList.json в пустое хранилище"""
+        if len(self) or not os.path.exists(legacy_file):
+            return 0
+        try:
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("data", [])
+        except json.JSONDecodeError:
+            return 0
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO results (event_id, processed_at, payload) VALUES (?, ?, ?)",
+                [(str(entry.get("id", "")), entry.get("processed_at", ""), json.dumps(entry, ensure_ascii=False)) for entry in entries]
+            )
+            self.conn.commit()
+        if entries:
+            print(f"[{get_timestamp()}] 📦 Из {legacy_file} перенесено {len(entries)} результатов")
+        return len(entries)
+
+    def append(self, entry: Dict[str, Any]):
+        processed_at = entry.get("processed_at") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO results (event_id, processed_at, payload) VALUES (?, ?, ?)",
+                (str(entry.get("id", "")), processed_at, json.dumps({**entry, "processed_at": processed_at}, ensure_ascii=False))
+            )
+            self.conn.commit()
+            self._appended += 1
+        if self.compact_every and self._appended % self.compact_every == 0:
+            self.compact()
+
+    def get(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """Последний результат по id события"""
+        row = self.conn.execute(
+            "SELECT payload FROM results WHERE event_id = ? ORDER BY seq DESC LIMIT 1", (str(event_id),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter(self, limit: Optional[int] = None, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Результаты в порядке обработки: последние limit записей и/или обработанные не раньше since"""
+        query, params = "SELECT seq, payload FROM results", []
+        if since is not None:
+            query += " WHERE processed_at >= ?"
+            params.append(since)
+        if limit is not None:
+            query = f"SELECT payload FROM ({query} ORDER BY seq DESC LIMIT ?) ORDER BY seq"
+            params.append(limit)
+        else:
+            query = f"SELECT payload FROM ({query}) ORDER BY seq"
+        # Отдельный курсор, чтобы запись результатов не мешала долгому чтению
+        for payload, in self.conn.cursor().execute(query, params):
+            yield json.loads(payload)
+
+    def compact(self) -> int:
+        """Удаляет устаревшие результаты, оставляя последний по каждому id"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM results WHERE seq NOT IN (SELECT MAX(seq) FROM results GROUP BY event_id)"
+            )
+            self.conn.commit()
+        if cursor.rowcount:
+            print(f"[{get_timestamp()}] 🧹 Хранилище результатов сжато: удалено {cursor.rowcount} старых записей")
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
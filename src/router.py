@@ -0,0 +1,140 @@
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.config import (
+    ROUTER_ERRORS_FILE, ROUTER_MIN_SAMPLES, ROUTER_TIME_RATIO
+)
+from src.utils import load_parsed_results
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+MONTHS = (
+    "января", "февраля", "марта", "апреля", "мая", "июня",
+    "июля", "августа", "сентября", "октября", "ноября", "декабря"
+)
+DATE_PATTERN = re.compile(
+    r"\b\d{1,2}[./]\d{1,2}(?:[./]\d{2,4})?\b|\b\d{1,2}\s*(?:" + "|".join(MONTHS) + r")",
+    re.IGNORECASE
+)
+MARKERS = ("Название:", "Дата:", "Цена:")
+LENGTH_BUCKETS = (300, 800, 2000)
+DATE_BUCKETS = (1, 2, 4)
+
+
+def _bucket(value: int, bounds: Tuple[int, ...]) -> int:
+    for i, bound in enumerate(bounds):
+        if value < bound:
+            return i
+    return len(bounds)
+
+
+def route_features(text: str) -> Tuple[int, int, bool]:
+    """Дешёвые признаки текста: корзина длины, корзина числа дат, есть ли разметка полей"""
+    return (
+        _bucket(len(text), LENGTH_BUCKETS),
+        _bucket(len(DATE_PATTERN.findall(text)), DATE_BUCKETS),
+        all(marker in text for marker in MARKERS),
+    )
+
+
+class ModelRouter:
+    """Выбирает модель до инференса.
+
+    Для каждой корзины признаков ведётся доля событий, которые обычная модель не
+    смогла разобрать и которые поэтому ушли к умной. Отказы, которые умная модель
+    не исправит (прошедшая дата, реклама), провалом не считаются. Сразу к умной
+    модели идти выгодно, когда ожидаемое время
+    «обычная, затем умная» t_r + p·t_s больше t_s, то есть при p > 1 - t_r / t_s.
+    Порог выводится из замеренного времени обеих моделей, доли — из истории
+    (regular_request_error.json и хранилища результатов) и дообучаются на ходу.
+    """
+
+    def __init__(
+        self,
+        errors_file: str = ROUTER_ERRORS_FILE,
+        min_samples: int = ROUTER_MIN_SAMPLES,
+        history: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.min_samples = min_samples
+        # корзина -> [провалы обычной модели, всего]
+        self.buckets: Dict[Tuple[int, int, bool], list] = {}
+        # среднее время вызова: модель -> [сумма секунд, число вызовов]
+        self.times = {"regular": [0.0, 0], "very_smart": [0.0, 0]}
+        self.stats = {"regular": 0, "very_smart_direct": 0, "estimated_saved_time": 0.0}
+        self._learn(errors_file, history)
+
+    def _learn(self, errors_file: str, history: Optional[List[Dict[str, Any]]] = None):
+        try:
+            with open(errors_file, "r", encoding="utf-8") as f:
+                errors = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            errors = []
+        # Провал — то же, что на ходу: обычная модель не справилась и событие ушло к умной
+        failed = {entry.get("text") for entry in errors if isinstance(entry, dict) and entry.get("text")}
+        parsed = set()
+        for entry in history if history is not None else load_parsed_results():
+            text, result = entry.get("initial_event"), entry.get("result")
+            if not text:
+                continue
+            # NOT_PARSED_2 без записи об ошибке — событие сразу отправлено к умной модели, исход обычной неизвестен
+            if isinstance(result, dict) and str(result.get("errorCode", "")).endswith("_2") and text not in failed:
+                continue
+            parsed.add(text)
+        self._fit(failed, parsed | failed)
+        print(f"[{get_timestamp()}] 🧭 Роутер обучен на {len(parsed | failed)} текстах, из них {len(failed)} провалов обычной модели")
+
+    def _fit(self, failed: Iterable[str], seen: Iterable[str]):
+        failed = set(failed)
+        for text in seen:
+            self.record(text, text in failed)
+
+    def record(self, text: str, failed: bool):
+        """Учитывает исход попытки обычной модели"""
+        counts = self.buckets.setdefault(route_features(text), [0, 0])
+        counts[0] += int(failed)
+        counts[1] += 1
+
+    def observe_time(self, model: str, seconds: float):
+        total = self.times[model]
+        total[0] += seconds
+        total[1] += 1
+
+    def _avg_time(self, model: str) -> float:
+        total, count = self.times[model]
+        return total / count if count else 0.0
+
+    def time_ratio(self) -> float:
+        """t_r / t_s по замерам, до первых замеров — ROUTER_TIME_RATIO"""
+        regular, very_smart = self._avg_time("regular"), self._avg_time("very_smart")
+        if regular and very_smart:
+            return min(1.0, regular / very_smart)
+        return ROUTER_TIME_RATIO
+
+    def failure_rate(self, text: str) -> Tuple[float, int]:
+        failures, total = self.buckets.get(route_features(text), [0, 0])
+        # Сглаживание Лапласа, чтобы редкие корзины не давали 0 или 1
+        return (failures + 1) / (total + 2), total
+
+    def should_use_very_smart(self, text: str) -> bool:
+        rate, samples = self.failure_rate(text)
+        threshold = 1.0 - self.time_ratio()
+        if samples < self.min_samples or rate <= threshold:
+            self.stats["regular"] += 1
+            return False
+        self.stats["very_smart_direct"] += 1
+        # Ожидаемая экономия: (t_r + p·t_s) - t_s
+        very_smart = self._avg_time("very_smart")
+        regular = self._avg_time("regular") or very_smart * ROUTER_TIME_RATIO
+        self.stats["estimated_saved_time"] += max(0.0, regular + rate * very_smart - very_smart)
+        print(f"[{get_timestamp()}] 🧭 Доля провалов обычной модели для похожих текстов {rate * 100:.0f}% > {threshold * 100:.0f}%, сразу к умной модели")
+        return True
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "threshold": 1.0 - self.time_ratio(),
+            "avg_time_regular": self._avg_time("regular"),
+            "avg_time_very_smart": self._avg_time("very_smart"),
+        }
@@ -0,0 +1,241 @@
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# Таблица месяцев: основа слова -> номер; покрывает падежи и сокращения («июня», «сент.», «мая»)
+MONTH_STEMS = (
+    (r"янв\w*", 1), (r"фев\w*", 2), (r"мар\w*", 3), (r"апр\w*", 4), (r"ма[йяе]", 5),
+    (r"июн\w*", 6), (r"июл\w*", 7), (r"авг\w*", 8), (r"сен\w*", 9), (r"окт\w*", 10),
+    (r"ноя\w*", 11), (r"дек\w*", 12),
+)
+WEEKDAYS = r"понедельник\w*|вторник\w*|сред[аыуе]|четверг\w*|пятниц\w*|суббот\w*|воскресень\w*|пн|вт|ср|чт|пт|сб|вс"
+RELATIVE_DAYS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+
+# Классы токенов в порядке приоритета; первый совпавший определяет значение
+TOKEN_PATTERN = re.compile(
+    r"(?P<iso>\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2})?)?)"
+    r"|(?P<time>\b\d{1,2}:\d{2}\b)"
+    r"|(?P<numeric>\b\d{1,2}\.\d{1,2}(?:\.\d{2,4})?\b)"
+    r"|(?P<year>\b(?:19|20)\d{2}(?:\b|(?=г))(?:\s*(?:г\.|года|год|г\b))?)"
+    r"|(?P<notdate>\b\d{1,2}\s?[+%])"
+    r"|(?P<day>\b\d{1,2}\b)"
+    r"|(?P<month>\b(?:" + "|".join(stem for stem, _ in MONTH_STEMS) + r")\b\.?)"
+    r"|(?P<relative>\b(?:" + "|".join(RELATIVE_DAYS) + r")\b)"
+    r"|(?P<weekday>\b(?:" + WEEKDAYS + r")\b)"
+    r"|(?P<dash>[–—-]|\bдо\b|\bпо\b)"
+    r"|(?P<break>[;\n]|\.\s|\bи\b|,)",
+    re.IGNORECASE
+)
+MONTH_TABLE = [(re.compile(stem + r"$", re.IGNORECASE), month) for stem, month in MONTH_STEMS]
+
+
+def _month_number(word: str) -> Optional[int]:
+    word = word.rstrip(".").lower()
+    for pattern, month in MONTH_TABLE:
+        if pattern.match(word):
+            return month
+    return None
+
+
+class _Point:
+    __slots__ = ("day", "month", "year", "hour", "minute")
+
+    def __init__(self, day=None, month=None, year=None, hour=None, minute=None):
+        self.day, self.month, self.year, self.hour, self.minute = day, month, year, hour, minute
+
+    def copy_date(self) -> "_Point":
+        return _Point(self.day, self.month, self.year)
+
+
+GAP_WORD_PATTERN = re.compile(r"[^\W\d_]{2,}")
+GAP_FILLERS = {"в", "во", "с", "со", "от", "на", "года", "году"}
+
+
+def _tokenize(text: str) -> List[tuple]:
+    """Токены дат; посторонние слова между ними превращаются в токен gap («10 лет», «1 час»)"""
+    text = text.replace("_", " ").replace("#", " ")
+    tokens = []
+    prev_end = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        gap = text[prev_end:match.start()]
+        if any(word.lower() not in GAP_FILLERS for word in GAP_WORD_PATTERN.findall(gap)):
+            tokens.append(("gap", gap))
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        prev_end = match.end()
+    return tokens
+
+
+def _collect_ranges(tokens: List[tuple], now: datetime) -> List[List[_Point]]:
+    """Собирает токены в диапазоны [начало, конец] (конец может отсутствовать)"""
+    ranges: List[List[_Point]] = []
+    group: List[_Point] = []  # точки текущего выражения, ждущие месяц/год
+    current: Optional[List[_Point]] = None  # диапазон, в который пишем
+    pending_time = None
+    after_dash = False
+
+    def new_point(point: _Point):
+        nonlocal current, after_dash, pending_time
+        if pending_time is not None and point.hour is None:
+            point.hour, point.minute = pending_time
+            pending_time = None
+        if after_dash and current is not None and len(current) == 1:
+            current.append(point)
+        else:
+            current = [point]
+            ranges.append(current)
+        group.append(point)
+        after_dash = False
+
+    prev_kind = None
+    for kind, value in tokens:
+        prev_kind, previous = kind, prev_kind
+        if kind == "iso":
+            date_part, _, time_part = value.replace("T", " ").partition(" ")
+            year, month, day = (int(part) for part in date_part.split("-"))
+            point = _Point(day, month, year)
+            if time_part:
+                point.hour, point.minute = (int(part) for part in time_part.split(":")[:2])
+            new_point(point)
+        elif kind == "numeric":
+            parts = [int(part) for part in value.split(".")]
+            if len(parts) == 2 and not 1 <= parts[1] <= 12 and parts[0] < 24 and parts[1] < 60:
+                # «19.30» — это время, а не дата
+                kind, value = "time", f"{parts[0]}:{parts[1]:02d}"
+            elif 1 <= parts[1] <= 12:
+                year = parts[2] if len(parts) == 3 else None
+                if year is not None and year < 100:
+                    year += 2000
+                new_point(_Point(parts[0], parts[1], year))
+                continue
+            else:
+                continue
+        if kind == "time":
+            hour, minute = (int(part) for part in value.split(":"))
+            if hour > 24 or minute > 59:
+                continue
+            last = current[-1] if current else None
+            if last is None or (not group and not after_dash):
+                pending_time = (hour, minute)
+            elif after_dash and len(current) == 1:
+                # «20:00 – 22:30»: конец в тот же день
+                end = last.copy_date()
+                end.hour, end.minute = hour, minute
+                current.append(end)
+                after_dash = False
+            elif last.hour is None:
+                # «13 и 14 июня в 19:00» — время относится ко всем дням перечисления
+                for point in group or [last]:
+                    if point.hour is None:
+                        point.hour, point.minute = hour, minute
+            else:
+                pending_time = (hour, minute)
+        elif kind == "day":
+            day = int(value)
+            if 1 <= day <= 31:
+                new_point(_Point(day))
+        elif kind == "month":
+            month = _month_number(value)
+            if month is None:
+                continue
+            for point in group:
+                if point.month is None:
+                    point.month = month
+        elif kind == "year":
+            # Год только сразу после даты или с «г.»: «Цена: 2000» годом не считается
+            if previous not in ("month", "day", "numeric") and not re.search(r"г", value):
+                continue
+            for point in group:
+                if point.year is None:
+                    point.year = int(value[:4])
+        elif kind == "relative":
+            date = now + timedelta(days=RELATIVE_DAYS[value.lower()])
+            new_point(_Point(date.day, date.month, date.year))
+        elif kind == "dash":
+            after_dash = current is not None and len(current) == 1
+        elif kind in ("gap", "notdate"):
+            # Число, за которым идёт обычное слово, возрастной ценз «16+» или процент датой не были
+            group = []
+            after_dash = False
+        elif kind == "break":
+            # Месяц, стоящий после перечисления, относится ко всем дням перечисления («13 и 14 июня»)
+            if value.strip() not in ("и", ","):
+                group = [point for point in group if point.month is None]
+            after_dash = False
+        # weekday игнорируется
+    return ranges
+
+
+def _to_datetime(point: _Point, year: int) -> datetime:
+    return datetime(point.year or year, point.month, point.day, point.hour or 0, point.minute or 0)
+
+
+def extract_dates(text: str, now: Optional[datetime] = None) -> List[Dict[str, str]]:
+    """Все диапазоны дат в тексте в формате eventDate.
+
+    Недостающие месяц, год и время одной границы берутся из другой; без года
+    берётся текущий (январь–февраль в ноябре–декабре — следующий); конец раньше
+    начала — переход через полночь.
+    Упоминание того же дня без времени поглощается упоминанием со временем.
+    """
+    now = now or datetime.now()
+    entries: List[Dict[str, Any]] = []
+    for points in _collect_ranges(_tokenize(text), now):
+        start, end = points[0], points[-1]
+        for key in ("day", "month", "year"):
+            if getattr(start, key) is None:
+                setattr(start, key, getattr(end, key))
+            if getattr(end, key) is None:
+                setattr(end, key, getattr(start, key))
+        if start.day is None or start.month is None:
+            continue
+        if end.hour is None:
+            end.hour, end.minute = start.hour, start.minute
+        year = start.year or now.year
+        try:
+            date_from, date_to = _to_datetime(start, year), _to_datetime(end, year)
+        except ValueError:
+            continue
+        if date_to < date_from:
+            if end.day == start.day and end.month == start.month:
+                date_to += timedelta(days=1)
+            else:
+                date_to = date_to.replace(year=date_to.year + 1)
+        if start.year is None and date_from.month <= 2 and now.month >= 11:
+            # Январь–февраль в анонсе, опубликованном в ноябре–декабре, — это следующий год;
+            # в остальных случаях год текущий, чтобы устаревшие анонсы отсекались как DATE_IN_PAST
+            date_from = date_from.replace(year=date_from.year + 1)
+            date_to = date_to.replace(year=date_to.year + 1)
+        entries.append({"from": date_from, "to": date_to, "timed": start.hour is not None})
+    return _merge(entries)
+
+
+def _merge(entries: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    timed_days = {entry["from"].date() for entry in entries if entry["timed"]}
+    result, seen = [], set()
+    for entry in entries:
+        if not entry["timed"] and entry["from"].date() in timed_days:
+            continue
+        key = (entry["from"], entry["to"])
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append({"from": entry["from"].isoformat(), "to": entry["to"].isoformat()})
+    return result
+
+
+def extract_single_date(text: str, now: Optional[datetime] = None) -> Optional[List[Dict[str, str]]]:
+    """eventDate, если в тексте ровно один диапазон дат, иначе None"""
+    entries = extract_dates(text, now)
+    return entries if len(entries) == 1 else None
+
+
+def parse_iso(value: str) -> datetime:
+    """Разбор даты из ответа модели: ISO-строка, иначе русское выражение; без timezone"""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except (ValueError, AttributeError):
+        pass
+    entries = extract_dates(value) if isinstance(value, str) else []
+    if len(entries) != 1:
+        raise ValueError(f"Не удалось разобрать дату: {value!r}")
+    return datetime.fromisoformat(entries[0]["from"])
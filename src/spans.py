@@ -0,0 +1,47 @@
+import re
+from typing import Any, Dict, List, Tuple
+from src.config import SPAN_FIELDS
+
+SEGMENT_PATTERN = re.compile(r"^\[(\d+)\] (.*)$", re.MULTILINE)
+
+SPAN_INSTRUCTION = (
+    "\n\nСтроки входного текста пронумерованы в квадратных скобках. "
+    "Поля {fields} не переписывай: укажи {{\"from\": N, \"to\": M}} — номера первой и "
+    "последней строки входного текста, из которых складывается значение поля."
+)
+
+
+def split_segments(text: str) -> List[str]:
+    """Непустые строки сообщения — единицы, на которые ссылается модель"""
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def number_segments(text: str) -> str:
+    return "\n".join(f"[{i}] {segment}" for i, segment in enumerate(split_segments(text), start=1))
+
+
+def span_instruction() -> str:
+    return SPAN_INSTRUCTION.format(fields=", ".join(f"`{field}`" for field in SPAN_FIELDS))
+
+
+def segments_from_prompt(prompt_suffix: str) -> List[str]:
+    """Восстанавливает пронумерованные строки из части промпта с сообщением"""
+    return [segment for _, segment in SEGMENT_PATTERN.findall(prompt_suffix)]
+
+
+def _span_bounds(span: Dict[str, Any], n_segments: int) -> Tuple[int, int]:
+    start, end = int(span.get("from", 1)), int(span.get("to", span.get("from", 1)))
+    if start > end:
+        start, end = end, start
+    return max(1, start), min(n_segments, end)
+
+
+def expand_spans(data: Dict[str, Any], segments: List[str]) -> Dict[str, Any]:
+    """Заменяет ссылки {from, to} в полях SPAN_FIELDS на текст соответствующих строк"""
+    for field in SPAN_FIELDS:
+        span = data.get(field)
+        if not isinstance(span, dict):
+            continue
+        start, end = _span_bounds(span, len(segments))
+        data[field] = "\n".join(segments[start - 1:end])
+    return data
@@ -0,0 +1,106 @@
+from typing import Any, Dict, Optional
+import numpy as np
+import numpy.typing as npt
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+from src.config import SPECULATIVE_NUM_PRED_TOKENS, SPECULATIVE_MAX_NGRAM
+
+
+class ModelDraft:
+    """Черновик от меньшей модели с другим токенизатором.
+
+    Контекст целевой модели переводится в текст, меньшая модель жадно дописывает
+    несколько токенов, а результат снова токенизируется токенизатором целевой модели.
+    Llama.generate черновой модели сам переиспользует общий префикс, поэтому каждый
+    вызов дописывает только новые токены.
+    """
+
+    def __init__(
+        self,
+        target: Llama,
+        draft: Llama,
+        draft_key: str,
+        num_pred_tokens: int = SPECULATIVE_NUM_PRED_TOKENS,
+    ):
+        self.target = target
+        self.draft = draft
+        # ключ черновой модели в ModelPool
+        self.draft_key = draft_key
+        self.num_pred_tokens = num_pred_tokens
+        self._ids: npt.NDArray[np.intc] = np.array([], dtype=np.intc)
+        self._text = b""
+
+    def _context_text(self, input_ids: npt.NDArray[np.intc]) -> bytes:
+        # Дотокенизируем только новый хвост, если начало контекста не поменялось
+        n = len(self._ids)
+        if n and len(input_ids) >= n and np.array_equal(input_ids[:n], self._ids):
+            self._text += self.target.detokenize(input_ids[n:].tolist(), special=True)
+        else:
+            self._text = self.target.detokenize(input_ids.tolist(), special=True)
+        self._ids = input_ids.copy()
+        return self._text
+
+    def __call__(self, input_ids: npt.NDArray[np.intc]) -> npt.NDArray[np.intc]:
+        text = self._context_text(input_ids)
+        draft_tokens = self.draft.tokenize(text, add_bos=True, special=True)
+        try:
+            completion = self.draft.create_completion(
+                prompt=draft_tokens,
+                max_tokens=self.num_pred_tokens,
+                temperature=0.0,
+            )
+        except ValueError:
+            # Контекст не помещается в окно черновой модели — просто без черновика
+            return np.array([], dtype=np.intc)
+        continuation = completion["choices"][0]["text"]
+        if not continuation:
+            return np.array([], dtype=np.intc)
+        tokens = self.target.tokenize(continuation.encode("utf-8"), add_bos=False, special=False)
+        return np.array(tokens[:self.num_pred_tokens], dtype=np.intc)
+
+
+class SpeculativeDraft(LlamaDraftModel):
+    """Источник черновых токенов для Llama(draft_model=...) со статистикой принятия.
+
+    Сначала ищет продолжение n-граммы во входе (поля ответа в основном копируются
+    из текста события), и только если совпадений нет — спрашивает черновую модель.
+    """
+
+    def __init__(
+        self,
+        num_pred_tokens: int = SPECULATIVE_NUM_PRED_TOKENS,
+        max_ngram_size: int = SPECULATIVE_MAX_NGRAM,
+    ):
+        self.lookup = LlamaPromptLookupDecoding(
+            max_ngram_size=max_ngram_size, num_pred_tokens=num_pred_tokens
+        )
+        self.model_draft: Optional[ModelDraft] = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.proposed = 0
+
+    def __call__(self, input_ids: npt.NDArray[np.intc], /, **kwargs: Any) -> npt.NDArray[np.intc]:
+        self.calls += 1
+        draft = self.lookup(input_ids)
+        if len(draft) == 0 and self.model_draft is not None:
+            draft = self.model_draft(input_ids)
+        self.proposed += len(draft)
+        return draft
+
+    def report(self, completion_tokens: int) -> Dict[str, Any]:
+        """Статистика по последнему запросу.
+
+        Каждый шаг проверки выдаёт все принятые черновые токены плюс один токен
+        самой модели, а первый токен идёт сразу после префилла, поэтому
+        принятые = сгенерированные - 1 - число проверок.
+        """
+        accepted = min(self.proposed, max(0, completion_tokens - 1 - self.calls))
+        return {
+            'completion_tokens': completion_tokens,
+            'verify_steps': self.calls,
+            'proposed': self.proposed,
+            'accepted': accepted,
+            'accept_rate': accepted / self.proposed if self.proposed else 0.0,
+        }
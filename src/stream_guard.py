@@ -0,0 +1,111 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+import numpy.typing as npt
+
+
+class EarlyAbort(Exception):
+    """Исход уже известен по первым полям ответа, дальше декодировать незачем"""
+
+    def __init__(self, reason: str, details: str, partial: Dict[str, Any]):
+        super().__init__(f"{reason}: {details}")
+        self.reason = reason
+        self.details = details
+        self.partial = partial
+
+
+class TokenCounter:
+    """StoppingCriteria, который только считает сгенерированные токены"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, input_ids: npt.NDArray[np.intc], logits: npt.NDArray[np.single]) -> bool:
+        self.count += 1
+        return False
+
+
+class StreamGuard:
+    """Инкрементально следит за потоковым JSON-ответом модели.
+
+    Грамматика ставит eventDate первым полем, поэтому как только массив дат закрыт,
+    можно проверить те же условия, что и ModelAPI._validate_response: нет дат, нет
+    `to` у последней даты или событие уже прошло. В этих случаях feed бросает
+    EarlyAbort, и генерацию можно остановить, не декодируя описание.
+    """
+
+    FIELD = '"eventDate"'
+
+    def __init__(self):
+        self.text = ""
+        self.decided = False
+        self._array_start = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        if self.decided:
+            return
+        if self._array_start < 0:
+            field_pos = self.text.find(self.FIELD)
+            if field_pos < 0:
+                return
+            bracket = self.text.find("[", field_pos + len(self.FIELD))
+            if bracket < 0:
+                return
+            self._array_start = bracket
+            self._pos = bracket
+        end = self._scan()
+        if end is not None:
+            self.decided = True
+            self._check(self.text[self._array_start:end + 1])
+
+    def _scan(self) -> Optional[int]:
+        """Продолжает поиск закрывающей скобки массива с места, где остановился"""
+        while self._pos < len(self.text):
+            char = self.text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    return self._pos
+            self._pos += 1
+        return None
+
+    def _check(self, array_text: str):
+        try:
+            event_dates: List[Dict[str, Any]] = json.loads(array_text)
+        except json.JSONDecodeError:
+            return
+        partial = {"eventDate": event_dates}
+        if not event_dates:
+            raise EarlyAbort("DATE_NOT_FOUND", "No event dates found", partial)
+        date_to = event_dates[-1].get("to") if isinstance(event_dates[-1], dict) else None
+        if not date_to:
+            raise EarlyAbort("INVALID_DATE_FORMAT", "Invalid date format: date 'to' field is missing", partial)
+        try:
+            parsed = datetime.fromisoformat(date_to.replace('Z', '+00:00'))
+        except ValueError:
+            # Нестандартный формат разберёт обычная валидация
+            return
+        current_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if parsed.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None) < current_date:
+            raise EarlyAbort(
+                "DATE_IN_PAST",
+                f"Event date {date_to} is in the past. Current date: {current_date.strftime('%Y-%m-%d')}",
+                partial,
+            )
@@ -1,83 +1,133 @@
 import asyncio
-import json
-import requests
 import os
 from time import sleep
 from src.api import ModelAPI
-from src.config import ACCESS_TOKEN
+from src.backend_client import BackendClient, BackendError
+from src.config import SYNC_WORKERS, BATCH_SIZE, WORK_QUEUE_CLAIM_SIZE, PIPELINE_ENABLED
+from src.outbox import Outbox
+from src.pipeline import Pipeline
+from src.result_store import ResultStore
+from src.work_queue import WorkQueue
+from src.worker_pool import InferenceWorkerPool
 from datetime import datetime
 
 def get_timestamp():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+_backend_client = None
+
+def getBackendClient():
+    global _backend_client
+    if _backend_client is None:
+        _backend_client = BackendClient()
+    return _backend_client
+
 async def getListForSync():
     try:
         print(f"[{get_timestamp()}] 🔄 Starting to fetch list for sync")
-        response = requests.post(
-            'https://back.momenta.place/backend/integration/parsing/getEventsForParsing',
-            headers={
-                'Authorization': f'Bearer {ACCESS_TOKEN}',
-                'Content-Type': 'application/json'
-            }
-        )
-        response.raise_for_status()  # Проверка на ошибки
-        return response.json()['data']
-    except requests.exceptions.RequestException as e:
+        return await getBackendClient().get_events_for_parsing()
+    except BackendError as e:
         print(f"[{get_timestamp()}] 🌐 Error making request: {e}")
         return None
 
 
+_outbox = None
+
+def getOutbox():
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(on_ack=fillModelLocalList)
+    return _outbox
+
+_work_queue = None
+
+def getWorkQueue():
+    global _work_queue
+    if _work_queue is None:
+        _work_queue = WorkQueue()
+        recovered = _work_queue.recover()
+        if recovered:
+            print(f"[{get_timestamp()}] ♻️ В очередь возвращено {recovered} незавершённых событий")
+    return _work_queue
+
 def clearLocalList():
-    with open('data/notParserList.json', 'w', encoding='utf-8') as file:
-        json.dump({"data": []}, file, ensure_ascii=False, indent=4)
+    getWorkQueue().clear()
 
 def deleteFromLocalList(id):
-    with open('data/notParserList.json', 'r', encoding='utf-8') as file:
-        existing_data = json.load(file)
-    existing_data['data'] = [item for item in existing_data['data'] if item['id'] != id]
-    with open('data/notParserList.json', 'w', encoding='utf-8') as file:
-        json.dump(existing_data, file, ensure_ascii=False, indent=4)
-    return
+    getWorkQueue().ack(id)
 
 
 async def parseEventsFromLocalList():
-    with open('data/notParserList.json', 'r', encoding='utf-8') as file:
-        existing_data = json.load(file)
-    # [:1] берет только первый элемент из списка data
-    model_api = ModelAPI()  # Create single instance for all events
-    for event in existing_data['data']:
-        print(f"[{get_timestamp()}] 🤖 Starting AI processing for event {event['id']}")
-        await parseEvent(event, model_api)  # Pass model_api as parameter
-    if len(existing_data['data']) == 0:
-        print(f"[{get_timestamp()}] 🔄 Нет элементов для обработки")
-        return
-    else:
-        await parseEventsFromLocalList()
+    model_api = None
+    # Цикл вместо рекурсии: очередь разбирается порциями, пока не опустеет
+    while True:
+        # Захваченные события не выдаются повторно, пока их не подтвердят или не перезапустят процесс
+        events = getWorkQueue().claim(WORK_QUEUE_CLAIM_SIZE)
+        if len(events) == 0:
+            print(f"[{get_timestamp()}] 🔄 Нет элементов для обработки")
+            return
+        if SYNC_WORKERS > 1:
+            await parseEventsWithWorkerPool(events)
+            continue
+        if model_api is None:
+            model_api = ModelAPI()  # Create single instance for all events
+        if BATCH_SIZE > 1:
+            for i in range(0, len(events), BATCH_SIZE):
+                await parseEventBatch(events[i:i + BATCH_SIZE], model_api)
+        else:
+            for event in events:
+                print(f"[{get_timestamp()}] 🤖 Starting AI processing for event {event['id']}")
+                await parseEvent(event, model_api)  # Pass model_api as parameter
+
+
+async def fetchNewEvents():
+    # Уже разобранные, но ещё не отправленные события бэкенд отдаёт повторно
+    list = await getListForSync()
+    if list is None:
+        return None
+    outbox = getOutbox()
+    return [event for event in list if event['id'] not in outbox]
+
+def dropFailedEvent(event, error):
+    print(f"[{get_timestamp()}] 💥 Error processing event {event['id']}: {error}")
+    # Удаляем проблемный элемент из очереди чтобы не зациклиться
+    deleteFromLocalList(event['id'])
+
+async def parseEventsWithPipeline(fetch=None):
+    pipeline = Pipeline(ModelAPI(), getWorkQueue(), submit=submitEventResult, on_error=dropFailedEvent, fetch=fetch)
+    await pipeline.run()
+
+
+_worker_pool = None
+
+def getWorkerPool():
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = InferenceWorkerPool()
+        _worker_pool.start()
+    return _worker_pool
+
+async def parseEventsWithWorkerPool(events):
+    pool = getWorkerPool()
+    for event in events:
+        print(f"[{get_timestamp()}] 🤖 Queued event {event['id']} for worker pool")
+        pool.submit(event)
+    for _ in events:
+        worker_id, event, response = await pool.next_result()
+        if 'error' in response:
+            dropFailedEvent(event, response['error'])
+            continue
+        print(f"[{get_timestamp()}] 👷 Воркер {worker_id} обработал событие {event['id']}")
+        try:
+            submitEventResult(event, response)
+        except Exception as e:
+            print(f"[{get_timestamp()}] 💥 Error processing event {event['id']}: {e}")
+            deleteFromLocalList(event['id'])
 
 async def parseEvent(event, model_api):  # Add model_api parameter
     try:
-        response = await model_api.call_model_api(event['input'])
-        result = json.dumps(response.get('result', {}), ensure_ascii=False, indent=2)
-        payload = {
-            "id": event['id'],
-            "result": json.loads(result)
-        }
-        request = requests.post(
-            'https://back.momenta.place/backend/integration/parsing/fillParsingEventResult',
-            headers={
-                'Authorization': f'Bearer {ACCESS_TOKEN}',
-                'Content-Type': 'application/json'
-            },
-            json=payload
-        )
-        fillModelLocalList({**payload, "responseFromServer": request.json(), "initial_event": event['input'], "processed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-        deleteFromLocalList(event['id'])
-        
-        result_dict = response.get('result', {})
-        if isinstance(result_dict, dict) and result_dict.get('errorCode', 0) == 1:
-            print(f"[{get_timestamp()}] 🚫 Обработал элемент - {event['id']} {result_dict.get('errorText', '')}")
-        else:
-            print(f"[{get_timestamp()}] ✅ Обработал элемент - {event['id']}")
+        response = await model_api.call_model_api(event['input'], event_id=event['id'])
+        submitEventResult(event, response)
             
         # Report statistics at key points
         stats = model_api.get_stats()
@@ -93,6 +143,33 @@ async def parseEvent(event, model_api):  # Add model_api parameter
         # Удаляем проблемный элемент из списка чтобы не зациклиться
         deleteFromLocalList(event['id'])
 
+async def parseEventBatch(events, model_api):
+    print(f"[{get_timestamp()}] 🤖 Starting AI processing for batch {[event['id'] for event in events]}")
+    responses = await model_api.call_model_api_batch(
+        [event['input'] for event in events], [event['id'] for event in events])
+    for event, response in zip(events, responses):
+        try:
+            submitEventResult(event, response)
+        except Exception as e:
+            print(f"[{get_timestamp()}] 💥 Error processing event {event['id']}: {e}")
+            deleteFromLocalList(event['id'])
+
+def submitEventResult(event, response):
+    # Результат сохранён в outbox, поэтому событие можно снять с очереди до ответа бэкенда
+    getOutbox().put({
+        "id": event['id'],
+        "result": response.get('result', {}),
+        "initial_event": event['input'],
+        "processed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    deleteFromLocalList(event['id'])
+    
+    result_dict = response.get('result', {})
+    if isinstance(result_dict, dict) and result_dict.get('errorCode', 0) == 1:
+        print(f"[{get_timestamp()}] 🚫 Обработал элемент - {event['id']} {result_dict.get('errorText', '')}")
+    else:
+        print(f"[{get_timestamp()}] ✅ Обработал элемент - {event['id']}")
+
 
 
 def fillLocalList(list):    
@@ -100,46 +177,24 @@ def fillLocalList(list):
         print(f"[{get_timestamp()}] 📭 No data received from API")
         return
         
-    clearLocalList()
-    # Сначала читаем существующие данные
-    existing_data = {"data": []}
-    if os.path.exists('data/notParserList.json'):
-        try:
-            with open('data/notParserList.json', 'r', encoding='utf-8') as file:
-                existing_data = json.load(file)
-        except json.JSONDecodeError:
-            pass
-    
-    # Добавляем новые данные
-    if list:
-        existing_data["data"].extend(list)
-    
-    # Записываем обновленные данные
-    with open('data/notParserList.json', 'w', encoding='utf-8') as file:
-        json.dump(existing_data, file, ensure_ascii=False, indent=4)
+    # Новые id добавляются к очереди, уже стоящие и захваченные события не трогаем
+    added = getWorkQueue().enqueue_many(list)
+    print(f"[{get_timestamp()}] 📥 В очередь добавлено {added} событий")
+
 
+_result_store = None
+
+def getResultStore():
+    global _result_store
+    if _result_store is None:
+        _result_store = ResultStore()
+    return _result_store
 
 def fillModelLocalList(payload):
     if not payload:
         print(f"[{get_timestamp()}] 📭 No data received from API")
         return
-    result = json.dumps(payload, ensure_ascii=False, indent=2)  # result will be str, not dict since json.dumps returns string
-   
-    # Сначала читаем существующие данные
-    existing_data = {"data": []}
-    if os.path.exists('data/parserList.json'):
-        try:
-            with open('data/parserList.json', 'r', encoding='utf-8') as file:
-                existing_data = json.load(file)
-        except json.JSONDecodeError:
-            pass
-
-    # Добавляем payload как элемент списка
-    existing_data["data"].append(payload)
-
-    # Записываем обновленные данные
-    with open('data/parserList.json', 'w', encoding='utf-8') as file:
-        json.dump(existing_data, file, ensure_ascii=False, indent=4)
+    getResultStore().append(payload)
 
 
 
@@ -148,15 +203,29 @@ async def sync():
         print(f"[{get_timestamp()}] 🚀 Starting sync process")
         # Создаем директорию если её нет
         os.makedirs('data', exist_ok=True)
+        # Результаты из старого parserList.json переносим до того, как по ним обучится ModelAPI
+        getResultStore().import_legacy()
         
-        list = await getListForSync()
-        print(f"[{get_timestamp()}] 🔄 Получил список из {len(list)} элементов")
-        fillLocalList(list)
-        await parseEventsFromLocalList()
-            
-    except Exception as e:
-        print(f"[{get_timestamp()}] 💥 Error loading config: {e}")
-        await parseEventsFromLocalList()
+        flusher = asyncio.create_task(getOutbox().run(getBackendClient()))
+        try:
+            if PIPELINE_ENABLED and SYNC_WORKERS == 1 and BATCH_SIZE == 1:
+                await parseEventsWithPipeline(fetch=fetchNewEvents)
+                return
+            list = await getListForSync()
+            print(f"[{get_timestamp()}] 🔄 Получил список из {len(list)} элементов")
+            fillLocalList(list)
+            await parseEventsFromLocalList()
+        except Exception as e:
+            print(f"[{get_timestamp()}] 💥 Error loading config: {e}")
+            await parseEventsFromLocalList()
+        finally:
+            getOutbox().stop()
+            await flusher
+            print(f"[{get_timestamp()}] 📮 Outbox: {getOutbox().report()}")
+    finally:
+        if _worker_pool is not None:
+            _worker_pool.close()
+        await getBackendClient().close()
 
 if __name__ == "__main__":
     print(f"[{get_timestamp()}] 🚀 Starting application")
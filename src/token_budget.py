@@ -0,0 +1,66 @@
+import math
+from typing import List, Tuple
+from src.config import (
+    TOKEN_BUDGET_MIN, TOKEN_BUDGET_MAX, TOKEN_BUDGET_MARGIN, TOKEN_BUDGET_MIN_SAMPLES
+)
+
+
+class ContextOverflow(ValueError):
+    """Промпт вместе с минимальным ответом не помещается в контекст модели"""
+
+
+class TokenBudget:
+    """Бюджет токенов ответа для одной модели.
+
+    Длина ответа предсказывается линейно по числу токенов сообщения:
+    intercept + slope * n плюс разброс (95-й перцентиль остатков) с запасом margin.
+    Коэффициенты подбираются по истории разобранных событий, токены считаются
+    токенизатором той же модели. Итог дополнительно ограничивается свободным местом в контексте.
+    """
+
+    def __init__(
+        self,
+        min_tokens: int = TOKEN_BUDGET_MIN,
+        max_tokens: int = TOKEN_BUDGET_MAX,
+        margin: float = TOKEN_BUDGET_MARGIN,
+    ):
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.margin = margin
+        # Значения до подбора: JSON-каркас ответа плюс описание, сжатое относительно входа
+        self.intercept = 300.0
+        self.slope = 0.6
+        self.spread = 0.0
+        self.samples = 0
+
+    def fit(self, samples: List[Tuple[int, int]]):
+        """Подбирает коэффициенты по парам (токены сообщения, токены ответа)"""
+        if len(samples) < TOKEN_BUDGET_MIN_SAMPLES:
+            return
+        n = len(samples)
+        mean_x = sum(x for x, _ in samples) / n
+        mean_y = sum(y for _, y in samples) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x if var_x else 0.0
+        slope = max(0.0, slope)
+        intercept = mean_y - slope * mean_x
+        residuals = sorted(y - (intercept + slope * x) for x, y in samples)
+        self.intercept = intercept
+        self.slope = slope
+        self.spread = max(0.0, residuals[min(n - 1, int(n * 0.95))])
+        self.samples = n
+
+    def predict(self, message_tokens: int) -> int:
+        """Предсказанный max_tokens для сообщения заданной длины"""
+        expected = (self.intercept + self.slope * message_tokens + self.spread) * self.margin
+        return max(self.min_tokens, min(math.ceil(expected), self.max_tokens))
+
+    def fit_context(self, prompt_tokens: int, max_tokens: int, n_ctx: int) -> int:
+        """Урезает max_tokens под свободное место в контексте или бросает ContextOverflow"""
+        available = n_ctx - prompt_tokens
+        if available < self.min_tokens:
+            raise ContextOverflow(
+                f"Промпт занимает {prompt_tokens} из {n_ctx} токенов контекста, "
+                f"на ответ остаётся {available} (нужно минимум {self.min_tokens})"
+            )
+        return min(max_tokens, available)
@@ -1,5 +1,9 @@
 import json
-from typing import Dict, Any, Optional, List, Tuple
+import os
+from typing import Dict, Any, Iterator, Optional, List, Tuple
+from src.config import RESULT_STORE_FILE
+from src.result_store import ResultStore
+from src.work_queue import WorkQueue
 
 class EventValidator:
     @staticmethod
@@ -26,23 +30,30 @@ class EventValidator:
 
 class DataLoader:
     def __init__(self):
-        self.test_data_file = "data/notParserList.json"
+        self.queue = WorkQueue()
 
     def load_test_data(self) -> Optional[Dict[str, Any]]:
-        """Loads test data from JSON file"""
-        try:
-            with open(self.test_data_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return None
-        except json.JSONDecodeError:
-            return None
-
-    def get_event_by_id(self, event_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Gets event by ID from data"""
-        events = data.get("data", [])
-        for event in events:
-            if event.get("id") == event_id:
-                return event
-        return None 
+        """Loads queued events from the work queue"""
+        return {"data": self.queue.items()}
 
+    def get_event_by_id(self, event_id: str, data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Gets event by ID from the work queue"""
+        return self.queue.get(event_id)
+
+
+
+def iter_parsed_results(limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Читает разобранные события из хранилища результатов потоком (последние limit записей)"""
+    # Только чтение: отсутствующее хранилище не создаём
+    if not os.path.exists(RESULT_STORE_FILE):
+        return
+    store = ResultStore(RESULT_STORE_FILE)
+    try:
+        yield from store.iter(limit)
+    finally:
+        store.close()
+
+
+def load_parsed_results(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Загружает разобранные события из хранилища результатов (последние limit записей)"""
+    return list(iter_parsed_results(limit))
@@ -0,0 +1,123 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from src.config import WORK_QUEUE_FILE
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class WorkQueue:
+    """Очередь событий на разбор в SQLite (WAL) вместо data/notParserList.json.
+
+    Каждая операция трогает одну строку по первичному ключу, поэтому добавление,
+    захват и подтверждение не зависят от длины очереди. Захваченные, но не
+    подтверждённые события после падения процесса возвращает recover — его
+    вызывает обработчик очереди при старте. Каждый захват увеличивает attempts,
+    по нему retry решает, возвращать ли упавшее событие в очередь. Повторное
+    добавление того же id ничего не меняет.
+    """
+
+    def __init__(self, db_file: str = WORK_QUEUE_FILE):
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id TEXT PRIMARY KEY, payload TEXT NOT NULL, claimed_at REAL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, enqueued_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        # sync отправляет результаты из asyncio.to_thread, соединение общее
+        self._lock = threading.Lock()
+
+    def enqueue(self, event: Dict[str, Any]) -> bool:
+        return self.enqueue_many([event]) == 1
+
+    def enqueue_many(self, events: Iterable[Dict[str, Any]]) -> int:
+        """Добавляет события одной транзакцией, уже известные id пропускает"""
+        now = time.time()
+        rows = [(str(event["id"]), json.dumps(event, ensure_ascii=False), now) for event in events]
+        with self._lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO events (id, payload, enqueued_at) VALUES (?, ?, ?)", rows
+            )
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def claim(self, limit: int = 1) -> List[Dict[str, Any]]:
+        """Забирает до limit свободных событий в порядке добавления"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, payload FROM events WHERE claimed_at IS NULL ORDER BY rowid LIMIT ?", (limit,)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE events SET claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(time.time(), event_id) for event_id, _ in rows]
+            )
+            self.conn.commit()
+        return [json.loads(payload) for _, payload in rows]
+
+    def ack(self, event_id: str):
+        """Событие обработано, удаляем его из очереди"""
+        with self._lock:
+            self.conn.execute("DELETE FROM events WHERE id = ?", (str(event_id),))
+            self.conn.commit()
+
+    def release(self, event_id: str):
+        """Возвращает захваченное событие в очередь"""
+        with self._lock:
+            self.conn.execute("UPDATE events SET claimed_at = NULL WHERE id = ?", (str(event_id),))
+            self.conn.commit()
+
+    def retry(self, event_id: str, max_attempts: int) -> bool:
+        """Возвращает упавшее событие в очередь, пока захватов меньше max_attempts.
+
+        False — попытки кончились, событие остаётся захваченным до ack.
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT attempts FROM events WHERE id = ?", (str(event_id),)).fetchone()
+            if row is None or row[0] >= max_attempts:
+                return False
+            self.conn.execute("UPDATE events SET claimed_at = NULL WHERE id = ?", (str(event_id),))
+            self.conn.commit()
+        return True
+
+    def recover(self, older_than: Optional[float] = None) -> int:
+        """Освобождает захваченные события (все или захваченные раньше older_than секунд назад)"""
+        cutoff = time.time() - older_than if older_than is not None else float("inf")
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE events SET claimed_at = NULL WHERE claimed_at IS NOT NULL AND claimed_at <= ?", (cutoff,)
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM events")
+            self.conn.commit()
+
+    def get(self, event_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT payload FROM events WHERE id = ?", (str(event_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def items(self) -> List[Dict[str, Any]]:
+        return [json.loads(payload) for payload, in self.conn.execute("SELECT payload FROM events ORDER BY rowid")]
+
+    def report(self) -> Dict[str, int]:
+        total, claimed = self.conn.execute(
+            "SELECT COUNT(*), COUNT(claimed_at) FROM events"
+        ).fetchone()
+        return {"pending": total - claimed, "claimed": claimed}
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,192 @@
+import asyncio
+import mmap
+import multiprocessing as mp
+import os
+import queue
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from src.config import (
+    MODEL_NAME, MODEL_NAME_VERY_SMART, SYNC_WORKERS, SYNC_CORES_PER_WORKER, MODEL_POOL_RAM_BUDGET_GB
+)
+
+def get_timestamp():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(n_workers: int, cores_per_worker: Optional[int] = None) -> List[List[int]]:
+    """Делит доступные ядра на непересекающиеся наборы для каждого воркера.
+
+    cores_per_worker урезается до len(cores) // n_workers; пересекаться наборы
+    могут, только если воркеров больше, чем ядер.
+    """
+    cores = _available_cores()
+    per_worker = max(1, len(cores) // n_workers)
+    if cores_per_worker:
+        per_worker = max(1, min(cores_per_worker, per_worker))
+    return [
+        [cores[(i * per_worker + j) % len(cores)] for j in range(per_worker)]
+        for i in range(n_workers)
+    ]
+
+
+def worker_ram_budget(n_workers: int, ram_budget_gb: Optional[float] = MODEL_POOL_RAM_BUDGET_GB) -> Optional[float]:
+    """Доля общего бюджета RAM на модели для одного воркера.
+
+    Каждый воркер держит собственный ModelPool, поэтому без деления N воркеров
+    загрузили бы модели на N бюджетов сразу.
+    """
+    if not ram_budget_gb:
+        return ram_budget_gb
+    return ram_budget_gb / max(1, n_workers)
+
+
+def _worker_main(
+    worker_id: int,
+    cores: List[int],
+    tasks: "mp.Queue",
+    results: "mp.Queue",
+    ram_budget_gb: Optional[float] = MODEL_POOL_RAM_BUDGET_GB,
+):
+    """Процесс-воркер: своя модель, свои ядра, события из общей очереди"""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # Процесс запущен через spawn/forkserver, llama.cpp инициализируется заново в нём самом
+    from src.api import ModelAPI
+
+    model_api = ModelAPI(
+        n_threads=len(cores),
+        stats_file=f'data/parser_stats_worker{worker_id}.json',
+        ram_budget_gb=ram_budget_gb,
+    )
+    loop = asyncio.new_event_loop()
+    print(f"[{get_timestamp()}] 👷 Воркер {worker_id} запущен на ядрах {cores}")
+    try:
+        while True:
+            event = tasks.get()
+            if event is None:
+                break
+            # Координатор должен знать, какое событие пропало, если воркер упадёт посреди инференса
+            results.put(("started", worker_id, event['id']))
+            try:
+                response = loop.run_until_complete(model_api.call_model_api(event['input'], event_id=event['id']))
+            except Exception as e:
+                response = {"error": f"💥 Ошибка в воркере {worker_id}: {str(e)}"}
+            results.put(("done", worker_id, event, response))
+    finally:
+        loop.close()
+
+
+class InferenceWorkerPool:
+    """Пул процессов инференса для sync.
+
+    Перед запуском воркеров GGUF-файлы отображаются в память координатора и
+    прогреваются, поэтому воркеры, открывающие их через mmap, делят одни и те же
+    страницы page cache вместо того, чтобы каждый читал веса с диска.
+    """
+
+    def __init__(
+        self,
+        n_workers: int = SYNC_WORKERS,
+        cores_per_worker: Optional[int] = SYNC_CORES_PER_WORKER,
+        model_paths: Tuple[str, ...] = (MODEL_NAME, MODEL_NAME_VERY_SMART),
+    ):
+        self.n_workers = n_workers
+        self.core_sets = split_cores(n_workers, cores_per_worker)
+        self.ram_budget_gb = worker_ram_budget(len(self.core_sets))
+        self.model_paths = model_paths
+        # fork из процесса с загруженным llama.cpp, потоками executor и запущенным event loop небезопасен
+        methods = mp.get_all_start_methods()
+        self.ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.tasks = self.ctx.Queue()
+        self.results = self.ctx.Queue()
+        self.processes: List[mp.Process] = []
+        self.mappings: List[Tuple[Any, mmap.mmap]] = []
+        self.pending = 0
+        self.submitted: Dict[str, Dict[str, Any]] = {}
+        self.in_progress: Dict[int, str] = {}
+
+    def _warm_models(self):
+        for model_path in self.model_paths:
+            if not os.path.exists(model_path):
+                continue
+            f = open(model_path, "rb")
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mapping, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+                mapping.madvise(mmap.MADV_WILLNEED)
+            self.mappings.append((f, mapping))
+            print(f"[{get_timestamp()}] 🔥 {model_path.split('/')[-1]} отображён в память для воркеров")
+
+    def start(self):
+        if self.processes:
+            return
+        self._warm_models()
+        for worker_id in range(len(self.core_sets)):
+            self.processes.append(self._start_worker(worker_id))
+
+    def _start_worker(self, worker_id: int) -> mp.Process:
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.core_sets[worker_id], self.tasks, self.results, self.ram_budget_gb),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def submit(self, event: Dict[str, Any]):
+        self.submitted[str(event['id'])] = event
+        self.tasks.put(event)
+        self.pending += 1
+
+    def _reap_dead_worker(self) -> Optional[Tuple[int, Dict[str, Any], Dict[str, Any]]]:
+        """Перезапускает упавший воркер; его незавершённое событие возвращается как ошибка"""
+        for worker_id, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            print(f"[{get_timestamp()}] 💀 Воркер {worker_id} завершился с кодом {process.exitcode}, перезапускаю")
+            self.processes[worker_id] = self._start_worker(worker_id)
+            event_id = self.in_progress.pop(worker_id, None)
+            if event_id is not None and event_id in self.submitted:
+                self.pending -= 1
+                error = {"error": f"💥 Воркер {worker_id} завершился с кодом {process.exitcode}"}
+                return worker_id, self.submitted.pop(event_id), error
+        return None
+
+    async def next_result(self) -> Tuple[int, Dict[str, Any], Dict[str, Any]]:
+        """Ожидает следующий готовый результат, не блокируя event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                message = await loop.run_in_executor(None, self.results.get, True, 1)
+            except queue.Empty:
+                failed = self._reap_dead_worker()
+                if failed is not None:
+                    return failed
+                continue
+            if message[0] == "started":
+                _, worker_id, event_id = message
+                self.in_progress[worker_id] = str(event_id)
+                continue
+            _, worker_id, event, response = message
+            self.in_progress.pop(worker_id, None)
+            self.submitted.pop(str(event['id']), None)
+            self.pending -= 1
+            return worker_id, event, response
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        for f, mapping in self.mappings:
+            mapping.close()
+            f.close()
+        self.mappings = []
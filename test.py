@@ -1,7 +1,7 @@
 import json
 import os
 from datetime import datetime
-from src.config import MODEL_NAME
+from src.config import MODEL_NAME, BATCH_SIZE
 from src.local_model import LocalModel
 from src.prompt_manager import PromptManager
 
@@ -55,7 +55,7 @@ def test_model():
 
     # Инициализируем модель и промпт менеджер
     model = LocalModel()
-    prompt_manager = PromptManager()
+    prompt_manager = model.prompt_manager
 
     # Получаем имя модели для ключа
     model_key = MODEL_NAME.split("/")[-1].replace(".gguf", "")
@@ -71,51 +71,57 @@ def test_model():
         f"[{get_timestamp()}] 📊 Обрабатываю {len(test_data['data'])} тестовых событий..."
     )
 
-    # Обрабатываем каждое тестовое событие
-    for i, event in enumerate(test_data["data"], 1):
+    # Обрабатываем тестовые события микро-батчами по BATCH_SIZE
+    events = test_data["data"]
+    for batch_start in range(0, len(events), BATCH_SIZE):
+        batch = events[batch_start:batch_start + BATCH_SIZE]
         print(
-            f"[{get_timestamp()}] 🔄 Обрабатываю событие {i}/{len(test_data['data'])} (ID: {event['id']})"
+            f"[{get_timestamp()}] 🔄 Обрабатываю события {batch_start + 1}-{batch_start + len(batch)}/{len(events)} (ID: {', '.join(str(event['id']) for event in batch)})"
         )
 
-        try:
-            # Подготавливаем промпт
-            prompt = prompt_manager.prepare_prompt(event["initialText"])
-
-            # Засекаем время начала обработки
-            start_time = datetime.now()
-            
-            # Получаем ответ от модели
-            response = model.generate_structured_response(prompt, MODEL_NAME)
-            
-            # Вычисляем время обработки
-            processing_time = (datetime.now() - start_time).total_seconds()
-
-            # Сохраняем результат
-            result = {
-                "event_id": event["id"],
-                "input_text": event["initialText"],
-                "output_json": response,
-                "processing_time_seconds": processing_time,
-                "processed_at": get_timestamp(),
-            }
-
-            model_results["results"].append(result)
+        # Подготавливаем промпты
+        prompts = [prompt_manager.prepare_prompt(event["initialText"]) for event in batch]
 
-            print(f"[{get_timestamp()}] ✅ Событие {event['id']} обработано успешно")
+        # Засекаем время начала обработки
+        start_time = datetime.now()
 
+        # Получаем ответы от модели
+        try:
+            responses = model.generate_structured_batch(prompts, MODEL_NAME)
         except Exception as e:
-            print(
-                f"[{get_timestamp()}] ❌ Ошибка при обработке события {event['id']}: {str(e)}"
-            )
-
-            # Сохраняем ошибку
-            result = {
-                "event_id": event["id"],
-                "input_text": event["initialText"],
-                "error": str(e),
-                "processing_time_seconds": None,
-                "processed_at": get_timestamp(),
-            }
+            responses = [e] * len(batch)
+
+        # События батча декодируются параллельно, поэтому отдельного времени у них нет:
+        # processing_time_seconds — доля события во времени батча, при BATCH_SIZE = 1 совпадает с прежним
+        batch_time = (datetime.now() - start_time).total_seconds()
+        processing_time = batch_time / len(batch)
+
+        for event, response in zip(batch, responses):
+            if isinstance(response, Exception):
+                print(
+                    f"[{get_timestamp()}] ❌ Ошибка при обработке события {event['id']}: {str(response)}"
+                )
+
+                # Сохраняем ошибку
+                result = {
+                    "event_id": event["id"],
+                    "input_text": event["initialText"],
+                    "error": str(response),
+                    "processing_time_seconds": None,
+                    "processed_at": get_timestamp(),
+                }
+            else:
+                # Сохраняем результат
+                result = {
+                    "event_id": event["id"],
+                    "input_text": event["initialText"],
+                    "output_json": response,
+                    "processing_time_seconds": processing_time,
+                    "batch_size": len(batch),
+                    "batch_time_seconds": batch_time,
+                    "processed_at": get_timestamp(),
+                }
+                print(f"[{get_timestamp()}] ✅ Событие {event['id']} обработано успешно")
 
             model_results["results"].append(result)
 
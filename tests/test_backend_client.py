@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp.test_utils import TestServer
+from src.backend_client import BackendClient, BackendError
+from src.backend_stub import make_app
+
+EVENTS = [{"id": "1", "input": "Концерт 20 июня"}]
+
+
+def run_with_stub(scenario, failure_rate=0.0):
+    async def main():
+        server = TestServer(make_app(EVENTS, failure_rate))
+        await server.start_server()
+        client = BackendClient(base_url=str(server.make_url("")), retries=2, backoff=0.01)
+        try:
+            return await scenario(client, server)
+        finally:
+            await client.close()
+            await server.close()
+    return asyncio.run(main())
+
+
+def test_fetch_and_submit():
+    async def scenario(client, server):
+        assert await client.get_events_for_parsing() == EVENTS
+        await client.fill_parsing_event_result({"id": "1", "result": {"eventTitle": "Концерт"}})
+        return await client.get_events_for_parsing()
+
+    assert run_with_stub(scenario) == []
+
+
+def test_retries_then_raises_with_status():
+    async def scenario(client, server):
+        with pytest.raises(BackendError) as error:
+            await client.get_events_for_parsing()
+        return error.value.status, client.stats
+
+    status, stats = run_with_stub(scenario, failure_rate=1.0)
+    assert status == 503
+    assert stats["retries"] == 2
+    assert stats["failures"] == 1
+
+
+def test_session_of_another_running_loop_is_closed_there():
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+    client = BackendClient(base_url="http://127.0.0.1:9")
+
+    async def open_session():
+        return client._get_session()
+
+    stale = asyncio.run_coroutine_threadsafe(open_session(), other_loop).result()
+
+    async def reopen():
+        session = client._get_session()
+        await asyncio.sleep(0.05)
+        await client.close()
+        return session
+
+    try:
+        assert asyncio.run(reopen()) is not stale
+        assert stale.closed
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
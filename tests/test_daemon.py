@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+
+pytest.importorskip("llama_cpp")
+pytest.importorskip("aiohttp")
+
+from src import daemon
+from src.config import DAEMON_MAX_ATTEMPTS, ERROR_CODES
+from src.daemon import SyncDaemon
+from src.pipeline import Pipeline
+from src.work_queue import WorkQueue
+
+
+class FailingModelAPI:
+    def __init__(self):
+        self.calls = 0
+
+    def lookup_known(self, text):
+        return None
+
+    async def call_model_api(self, text, lookup=True, event_id=None):
+        self.calls += 1
+        return {"error": "💥 Ошибка при вызове модели: boom", "processing_time": 0.0}
+
+
+def test_failing_inference_ends_as_not_parsed(tmp_path, monkeypatch):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.enqueue({"id": 7, "input": "Текст"})
+    submitted = []
+
+    def submit(event, response):
+        submitted.append((event["id"], response["result"]))
+        queue.ack(event["id"])
+
+    monkeypatch.setattr(daemon, "getWorkQueue", lambda: queue)
+    monkeypatch.setattr(daemon, "submitEventResult", submit)
+    model_api = FailingModelAPI()
+    sync_daemon = SyncDaemon(checkpoint_file=str(tmp_path / "checkpoint.json"))
+
+    async def drain():
+        while queue.report()["pending"]:
+            await Pipeline(model_api, queue, submit=sync_daemon._submit, on_error=sync_daemon._on_error).run()
+
+    asyncio.run(drain())
+    assert model_api.calls == DAEMON_MAX_ATTEMPTS
+    assert len(submitted) == 1
+    event_id, result = submitted[0]
+    assert event_id == 7
+    assert result["errorCode"] == ERROR_CODES["NOT_PARSED"]
+    assert "boom" in result["errorDetails"]
+    assert len(queue) == 0
@@ -0,0 +1,41 @@
+from src.fast_path import FastPathParser, split_fields, split_location
+
+TEMPLATE = (
+    "Название: Концерт группы Кино. Дата: 20 июня 2027 в 19:00. "
+    "Описание: Все песни со всех альбомов. Возрастное ограничение: 16+. "
+    "Цена: 1500 руб. Адрес: Клуб Танцы, ул. Садовая, 12. https://example.com/kino"
+)
+
+
+def test_split_fields_takes_value_up_to_next_marker():
+    fields = split_fields(TEMPLATE)
+    assert fields["title"] == "Концерт группы Кино"
+    assert fields["price"] == "1500 руб"
+    assert fields["address"].startswith("Клуб Танцы, ул. Садовая, 12")
+
+
+def test_location_name_from_place_or_address():
+    assert split_location("Клуб Танцы", "ул. Садовая, 12") == ("Клуб Танцы", "ул. Садовая, 12")
+    assert split_location(None, "Клуб Танцы, ул. Садовая, 12") == ("Клуб Танцы", "ул. Садовая, 12")
+    assert split_location(None, "Москва, ул. Садовая, 12") == ("", "Москва, ул. Садовая, 12")
+
+
+def test_parses_template_with_location():
+    parser = FastPathParser()
+    event, _ = parser.parse(TEMPLATE)
+    assert event["eventTitle"] == "Концерт группы Кино"
+    assert event["eventPrice"] == [1500]
+    assert event["eventAgeLimit"] == "16"
+    assert event["eventLocation"]["name"] == "Клуб Танцы"
+    assert event["eventLocation"]["address"].startswith("ул. Садовая, 12")
+    assert event["linkSource"] == "https://example.com/kino"
+
+
+def test_rejects_count_as_fallback():
+    parser = FastPathParser()
+    assert parser.parse("Просто текст про концерт без шаблона") is None
+    assert parser.parse(TEMPLATE.replace("Клуб Танцы, ", "")) is None
+    report = parser.report()
+    assert report["fallback"] == 2
+    assert report["reasons"] == {"missing_title": 1, "missing_location_name": 1}
+    assert report["coverage"] == 0
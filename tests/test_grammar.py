@@ -0,0 +1,26 @@
+import copy
+import json
+import pytest
+
+pytest.importorskip("llama_cpp")
+
+from llama_cpp.llama_grammar import json_schema_to_gbnf
+from src.grammar import GrammarCache, PROPERTY_ORDER
+
+DATES = [{"from": "2026-06-20T19:00:00", "to": "2026-06-20T19:00:00"}]
+
+
+def test_fixed_field_matches_full_conversion(tmp_path):
+    grammars = GrammarCache(cache_dir=str(tmp_path))
+    fixed = grammars.with_fixed("eventDate", DATES)
+    schema = copy.deepcopy(grammars.schema)
+    schema["properties"]["data"]["properties"]["eventDate"] = {"const": DATES}
+    assert fixed._grammar == json_schema_to_gbnf(json.dumps(schema), prop_order=PROPERTY_ORDER)
+
+
+def test_fixed_grammar_is_cached_by_value(tmp_path):
+    grammars = GrammarCache(cache_dir=str(tmp_path))
+    fixed = grammars.with_fixed("eventDate", DATES)
+    assert grammars.with_fixed("eventDate", copy.deepcopy(DATES)) is fixed
+    other = [{"from": "2026-06-21T19:00:00", "to": "2026-06-21T19:00:00"}]
+    assert grammars.with_fixed("eventDate", other) is not fixed
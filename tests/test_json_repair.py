@@ -0,0 +1,22 @@
+from src.json_repair import scan_partial_object
+
+
+def test_keeps_fields_decoded_before_the_break():
+    text = '{"data": {"eventTitle": "Кино", "eventPrice": [1500], "eventDescription": "Обрыв'
+    partial = scan_partial_object(text)
+    assert [(field.name, field.value) for field in partial.fields] == [
+        ("eventTitle", "Кино"), ("eventPrice", [1500])
+    ]
+    assert text[partial.fields[-1].end:].startswith(', "eventDescription"')
+    assert text[partial.body_start - 1] == "{"
+
+
+def test_stops_at_malformed_value():
+    partial = scan_partial_object('{"data": {"eventTitle": "Кино", "eventPrice": [15 00], "eventAgeLimit": "16"}}')
+    assert [field.name for field in partial.fields] == ["eventTitle"]
+
+
+def test_object_not_started():
+    assert scan_partial_object('{"dat') is None
+    assert scan_partial_object('{"data": ') is None
+    assert scan_partial_object('{"data": {').fields == []
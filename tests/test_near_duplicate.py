@@ -0,0 +1,52 @@
+from src.near_duplicate import NearDuplicateIndex
+from src.result_store import ResultStore
+
+BODY = (
+    "Концерт группы Кино в клубе Танцы 20 июня в 19:00. Прозвучат песни со всех альбомов "
+    "группы, на сцене выступит полный состав, гостей ждут бар и фотозона. Возраст 16+. "
+    "Билеты по ссылке https://example.com/kino"
+)
+TEXT = BODY + "?utm_source=vk Цена: 1500 руб. #концерт #кино"
+COPY = BODY + "?utm_source=tg Цена: 1800 руб. #музыка"
+
+
+def make_index(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    return NearDuplicateIndex(store=store), store
+
+
+def test_reuses_stored_result_with_new_price(tmp_path):
+    index, store = make_index(tmp_path)
+    store.append({"id": "1", "initial_event": TEXT, "result": {"eventTitle": "Кино", "eventPrice": [1500]}})
+    index.add(TEXT, "1")
+    result = index.reuse(COPY)
+    assert result == {"eventTitle": "Кино", "eventPrice": [1800]}
+    assert index.stats["reused"] == 1
+    # Индекс хранит только id события, не текст и не результат
+    assert index.event_ids == ["1"]
+
+
+def test_rejects_until_result_is_stored(tmp_path):
+    index, store = make_index(tmp_path)
+    index.add(TEXT, "1")
+    assert index.reuse(COPY) is None
+    store.append({"id": "1", "initial_event": TEXT, "result": {"errorCode": "NOT_PARSED_1"}})
+    assert index.reuse(COPY) is None
+    assert index.stats["rejected"] == 2
+
+
+def test_rejects_different_dates(tmp_path):
+    index, store = make_index(tmp_path)
+    store.append({"id": "1", "initial_event": TEXT, "result": {"eventTitle": "Кино"}})
+    index.add(TEXT, "1")
+    assert index.reuse(TEXT.replace("20 июня", "21 июня")) is None
+
+
+def test_load_history_skips_failures(tmp_path):
+    index, _ = make_index(tmp_path)
+    index.load_history([
+        {"id": "1", "initial_event": TEXT, "result": {"eventTitle": "Кино"}},
+        {"id": "2", "initial_event": COPY, "result": {"errorCode": "NOT_PARSED_2"}},
+        {"id": "3", "initial_event": COPY, "result": {}},
+    ])
+    assert index.event_ids == ["1"]
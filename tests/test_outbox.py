@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from src import outbox as outbox_module
+from src.outbox import Outbox
+
+
+class FakeClient:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def fill_parsing_event_result(self, payload):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(payload)
+        return {"ok": True}
+
+
+class Rejected(Exception):
+    status = 422
+
+
+def test_unsent_result_is_replayed_after_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(outbox_module, "OUTBOX_RETRY_BACKOFF", 0)
+    db_file = str(tmp_path / "outbox.sqlite")
+    outbox = Outbox(db_file=db_file)
+    outbox.put({"id": 7, "result": {"eventTitle": "Кино"}})
+    assert asyncio.run(outbox.flush(FakeClient([ConnectionError("down")]))) == 0
+    assert "7" in outbox
+    outbox.close()
+
+    acked = []
+    restarted = Outbox(on_ack=acked.append, db_file=db_file)
+    client = FakeClient()
+    assert asyncio.run(restarted.flush(client)) == 1
+    assert client.sent == [{"id": 7, "result": {"eventTitle": "Кино"}}]
+    assert acked[0]["responseFromServer"] == {"ok": True}
+    assert len(restarted) == 0
+
+
+def test_failed_result_waits_for_backoff(tmp_path):
+    outbox = Outbox(db_file=str(tmp_path / "outbox.sqlite"))
+    outbox.put({"id": 1, "result": {}})
+    assert asyncio.run(outbox.flush(FakeClient([ConnectionError("down")]))) == 0
+    # Следующий проход раньше задержки ничего не отправляет
+    client = FakeClient()
+    assert asyncio.run(outbox.flush(client)) == 0
+    assert client.sent == []
+    assert outbox.report()["failed_attempts"] == 1
+
+
+def test_repeated_rejections_are_buried(tmp_path, monkeypatch):
+    monkeypatch.setattr(outbox_module, "OUTBOX_RETRY_BACKOFF", 0)
+    outbox = Outbox(db_file=str(tmp_path / "outbox.sqlite"))
+    outbox.put({"id": 1, "result": {}})
+    client = FakeClient([Rejected("bad")] * outbox_module.OUTBOX_MAX_REJECTIONS)
+    for _ in range(outbox_module.OUTBOX_MAX_REJECTIONS):
+        asyncio.run(outbox.flush(client))
+    assert len(outbox) == 0
+    assert outbox.stats["dead"] == 1
+    assert outbox.conn.execute("SELECT COUNT(*) FROM outbox_dead").fetchone()[0] == 1
+
+
+def test_run_drains_before_stopping(tmp_path):
+    outbox = Outbox(db_file=str(tmp_path / "outbox.sqlite"))
+    for event_id in range(3):
+        outbox.put({"id": event_id, "result": {}})
+    client = FakeClient()
+
+    async def main():
+        flusher = asyncio.create_task(outbox.run(client, interval=0.01))
+        await asyncio.sleep(0.05)
+        outbox.stop()
+        await flusher
+
+    asyncio.run(main())
+    assert sorted(payload["id"] for payload in client.sent) == [0, 1, 2]
+    assert len(outbox) == 0
@@ -0,0 +1,16 @@
+from src.prompt_manager import MESSAGE_HEADER, PromptManager
+from src.ru_dates import extract_single_date
+
+
+def test_message_section_skips_retrieved_examples():
+    suffix = (
+        "### 📚 ПОХОЖИЕ РАЗОБРАННЫЕ СОБЫТИЯ:\n\nInput:\nКонцерт 5 марта в 19:00\n\n---\n\n"
+        f"{MESSAGE_HEADER}\n\n```\nТекст без даты\n```\n"
+    )
+    message = PromptManager.message_section(suffix)
+    assert "5 марта" not in message
+    assert extract_single_date(message) is None
+
+
+def test_message_section_without_header_returns_suffix():
+    assert PromptManager.message_section("Текст") == "Текст"
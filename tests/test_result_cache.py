@@ -0,0 +1,50 @@
+import time
+from src.result_cache import ResultCache
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResultCache(db_file=str(tmp_path / "cache.sqlite"), **kwargs)
+
+
+def test_key_ignores_whitespace_and_unicode_form(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.key("Концерт  20 июня\n") == cache.key("Концерт 20 июня")
+    # «й» одной буквой и «и» с комбинируемым бреве — один и тот же текст
+    assert cache.key("Мой концерт") == cache.key("Мои\u0306 концерт")
+    assert cache.key("Концерт 20 июня") != cache.key("Концерт 21 июня")
+
+
+def test_put_and_get_survive_reopen(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.key("Концерт")
+    assert cache.get(key) is None
+    cache.put(key, {"eventTitle": "Концерт"})
+    cache.close()
+    reopened = make_cache(tmp_path)
+    assert reopened.get(key) == {"eventTitle": "Концерт"}
+    assert reopened.report()["hit_rate"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, ttl_days=1)
+    key = cache.key("Концерт")
+    cache.put(key, {"eventTitle": "Концерт"})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 2 * 24 * 3600)
+    assert cache.get(key) is None
+    cache.purge_expired()
+    assert cache.stats["evictions"] == 1
+
+
+def test_least_recently_read_is_evicted_over_size(tmp_path, monkeypatch):
+    clock = iter(range(1_000_000_000, 1_000_001_000))
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    cache = make_cache(tmp_path, max_mb=300 / (1024 * 1024))
+    value = {"eventDescription": "x" * 100}
+    cache.put("old", value)
+    cache.put("read", value)
+    cache.get("read")
+    cache.put("new", value)
+    assert cache.get("old") is None
+    assert cache.get("read") == value
+    assert cache.get("new") == value
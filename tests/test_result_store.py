@@ -0,0 +1,35 @@
+import json
+from src import utils
+from src.result_store import ResultStore
+
+
+def write_legacy(path, entries):
+    path.write_text(json.dumps({"data": entries}, ensure_ascii=False), encoding="utf-8")
+
+
+def test_opening_does_not_migrate(tmp_path):
+    legacy = tmp_path / "parserList.json"
+    write_legacy(legacy, [{"id": 1, "initial_event": "a", "result": {}}])
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    assert len(store) == 0
+    assert store.import_legacy(str(legacy)) == 1
+    # В непустое хранилище повторно не переносится
+    assert store.import_legacy(str(legacy)) == 0
+    assert store.get(1)["initial_event"] == "a"
+
+
+def test_compact_keeps_latest_result(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite"), compact_every=0)
+    store.append({"id": 1, "result": {"eventTitle": "old"}})
+    store.append({"id": 1, "result": {"eventTitle": "new"}})
+    store.append({"id": 2, "result": {"eventTitle": "other"}})
+    assert store.compact() == 1
+    assert [entry["result"]["eventTitle"] for entry in store.iter()] == ["new", "other"]
+    assert [entry["id"] for entry in store.iter(limit=1)] == [2]
+
+
+def test_reading_missing_store_creates_nothing(tmp_path, monkeypatch):
+    db_file = tmp_path / "results.sqlite"
+    monkeypatch.setattr(utils, "RESULT_STORE_FILE", str(db_file))
+    assert utils.load_parsed_results() == []
+    assert not db_file.exists()
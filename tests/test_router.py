@@ -0,0 +1,57 @@
+import json
+from src import router
+from src.router import ModelRouter
+
+HARD = "Концерт 5 мая, 6 мая, 7 мая и 8 мая"
+
+
+def make_router(tmp_path, monkeypatch, errors=(), parsed=()):
+    errors_file = tmp_path / "errors.json"
+    errors_file.write_text(json.dumps([{"text": text} for text in errors], ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(router, "load_parsed_results", lambda: list(parsed))
+    return ModelRouter(errors_file=str(errors_file), min_samples=5)
+
+
+def record_half_failed(model_router):
+    # Доля провалов со сглаживанием: (3 + 1) / (6 + 2) = 0.5
+    for failed in (True, True, True, False, False, False):
+        model_router.record(HARD, failed=failed)
+
+
+def test_few_samples_stay_on_regular_model(tmp_path, monkeypatch):
+    model_router = make_router(tmp_path, monkeypatch)
+    for _ in range(4):
+        model_router.record(HARD, failed=True)
+    assert not model_router.should_use_very_smart(HARD)
+
+
+def test_slow_regular_model_lowers_threshold(tmp_path, monkeypatch):
+    model_router = make_router(tmp_path, monkeypatch)
+    record_half_failed(model_router)
+    model_router.observe_time("regular", 8.0)
+    model_router.observe_time("very_smart", 10.0)
+    # Порог 1 - 8 / 10 = 0.2 < 0.5
+    assert model_router.should_use_very_smart(HARD)
+    assert model_router.report()["estimated_saved_time"] > 0
+
+
+def test_fast_regular_model_raises_threshold(tmp_path, monkeypatch):
+    model_router = make_router(tmp_path, monkeypatch)
+    record_half_failed(model_router)
+    model_router.observe_time("regular", 3.0)
+    model_router.observe_time("very_smart", 10.0)
+    # Порог 1 - 3 / 10 = 0.7 > 0.5
+    assert not model_router.should_use_very_smart(HARD)
+
+
+def test_history_counts_only_escalations_as_failures(tmp_path, monkeypatch):
+    parsed = [
+        {"initial_event": "escalated", "result": {"errorCode": "4_2"}},
+        {"initial_event": "routed directly", "result": {"errorCode": "4_2"}},
+        {"initial_event": "date in past", "result": {"errorCode": "4_1"}},
+        {"initial_event": "parsed", "result": {"eventTitle": "Лекция"}},
+    ]
+    model_router = make_router(tmp_path, monkeypatch, errors=["escalated"], parsed=parsed)
+    failures = sum(counts[0] for counts in model_router.buckets.values())
+    seen = sum(counts[1] for counts in model_router.buckets.values())
+    assert (failures, seen) == (1, 3)
@@ -0,0 +1,64 @@
+from datetime import datetime
+from src.ru_dates import extract_dates, extract_single_date, parse_iso
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+
+def test_missing_year_is_current_year():
+    assert extract_dates("Концерт 14 сентября в 19:00", NOW) == [
+        {"from": "2026-09-14T19:00:00", "to": "2026-09-14T19:00:00"}
+    ]
+
+
+def test_past_date_without_year_stays_in_the_past():
+    date_to = datetime.fromisoformat(extract_dates("Выставка 3 октября", NOW)[0]["to"])
+    assert date_to < NOW
+
+
+def test_january_announced_in_november_is_next_year():
+    now = datetime(2026, 11, 20)
+    assert extract_dates("Ёлка 5 января в 12:00", now)[0]["from"] == "2027-01-05T12:00:00"
+
+
+def test_january_announced_in_october_is_current_year():
+    assert extract_dates("Лекция 5 января", NOW)[0]["from"].startswith("2026-01-05")
+
+
+def test_explicit_year_is_kept():
+    assert extract_dates("14 сентября 2025 года в 19:00", NOW)[0]["from"] == "2025-09-14T19:00:00"
+
+
+def test_time_range_and_overnight():
+    assert extract_dates("20 октября с 22:00 до 02:00", NOW) == [
+        {"from": "2026-10-20T22:00:00", "to": "2026-10-21T02:00:00"}
+    ]
+
+
+def test_numeric_date():
+    assert extract_dates("Когда: 25.10.2026 18:30", NOW)[0]["from"] == "2026-10-25T18:30:00"
+
+
+def test_prices_and_ages_are_not_dates():
+    assert extract_dates("Цена: 2000 ₽, 10 лет и старше, 1 час", NOW) == []
+
+
+def test_single_date_requires_exactly_one_range():
+    assert extract_single_date("25 октября в 19:00", NOW) is not None
+    assert extract_single_date("25 октября и 3 ноября", NOW) is None
+    assert extract_single_date("без даты", NOW) is None
+
+
+def test_parse_iso_falls_back_to_russian():
+    assert parse_iso("2026-10-25T18:30:00Z") == datetime(2026, 10, 25, 18, 30)
+
+
+def test_age_rating_is_not_a_day():
+    assert extract_dates("Цена 500 руб, 16+, 20 июня", NOW) == [
+        {"from": "2026-06-20T00:00:00", "to": "2026-06-20T00:00:00"}
+    ]
+
+
+def test_percent_is_not_a_day():
+    assert extract_dates("Скидка 15 %, 21 ноября в 18:00", NOW) == [
+        {"from": "2026-11-21T18:00:00", "to": "2026-11-21T18:00:00"}
+    ]
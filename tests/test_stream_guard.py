@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+import pytest
+from src.stream_guard import EarlyAbort, StreamGuard
+
+
+def feed_all(guard, text, step=7):
+    for i in range(0, len(text), step):
+        guard.feed(text[i:i + step])
+
+
+def future(days=30):
+    return (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%dT19:00:00")
+
+
+def test_aborts_on_past_date_before_description():
+    guard = StreamGuard()
+    with pytest.raises(EarlyAbort) as caught:
+        feed_all(guard, '{"data": {"eventDate": [{"from": "2020-01-01T19:00:00", "to": "2020-01-01T21:00:00"}], "eventTitle": "')
+    assert caught.value.reason == "DATE_IN_PAST"
+    assert caught.value.partial["eventDate"][0]["to"] == "2020-01-01T21:00:00"
+    assert guard.decided
+
+
+@pytest.mark.parametrize("dates, reason", [
+    ("[]", "DATE_NOT_FOUND"),
+    ('[{"from": "2030-01-01T19:00:00"}]', "INVALID_DATE_FORMAT"),
+])
+def test_aborts_on_missing_dates(dates, reason):
+    with pytest.raises(EarlyAbort) as caught:
+        feed_all(StreamGuard(), '{"data": {"eventDate": ' + dates + ', "eventTitle": "x"}}')
+    assert caught.value.reason == reason
+
+
+def test_future_date_streams_to_the_end():
+    guard = StreamGuard()
+    text = '{"data": {"eventDate": [{"from": "%s", "to": "%s"}], "eventTitle": "Концерт ]"}}' % (future(), future())
+    feed_all(guard, text)
+    assert guard.decided
+    assert guard.text == text
+
+
+def test_brackets_inside_strings_do_not_close_the_array():
+    guard = StreamGuard()
+    guard.feed('{"data": {"eventDate": [{"from": "]", ')
+    assert not guard.decided
+    guard.feed('"to": "%s"}]' % future())
+    assert guard.decided
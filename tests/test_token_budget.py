@@ -0,0 +1,32 @@
+import pytest
+from src.token_budget import ContextOverflow, TokenBudget
+
+
+def test_defaults_until_enough_samples():
+    budget = TokenBudget(min_tokens=100, max_tokens=5000, margin=1.0)
+    budget.fit([(100, 400)] * 3)
+    assert budget.samples == 0
+    assert budget.predict(100) == 360
+
+
+def test_fit_follows_message_length():
+    budget = TokenBudget(min_tokens=100, max_tokens=5000, margin=1.0)
+    budget.fit([(x, 200 + x // 2) for x in range(100, 2100, 100)])
+    assert budget.samples == 20
+    assert budget.slope == pytest.approx(0.5, abs=0.01)
+    assert budget.predict(1000) == pytest.approx(700, abs=3)
+
+
+def test_prediction_is_clamped():
+    budget = TokenBudget(min_tokens=256, max_tokens=2000, margin=1.2)
+    budget.fit([(x, 10) for x in range(10, 30)])
+    assert budget.predict(10) == 256
+    budget.fit([(x, 5 * x) for x in range(1000, 1020)])
+    assert budget.predict(1010) == 2000
+
+
+def test_context_limits_answer():
+    budget = TokenBudget(min_tokens=256)
+    assert budget.fit_context(prompt_tokens=7000, max_tokens=2000, n_ctx=8192) == 1192
+    with pytest.raises(ContextOverflow):
+        budget.fit_context(prompt_tokens=8000, max_tokens=2000, n_ctx=8192)
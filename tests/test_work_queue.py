@@ -0,0 +1,51 @@
+from src.work_queue import WorkQueue
+
+
+def make_queue(tmp_path):
+    return WorkQueue(str(tmp_path / "queue.sqlite"))
+
+
+def test_enqueue_skips_known_ids(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.enqueue_many([{"id": 1, "input": "a"}, {"id": 2, "input": "b"}]) == 2
+    assert queue.enqueue_many([{"id": 2, "input": "b"}, {"id": 3, "input": "c"}]) == 1
+    assert len(queue) == 3
+
+
+def test_claimed_events_are_not_claimed_again(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue_many([{"id": 1, "input": "a"}, {"id": 2, "input": "b"}])
+    assert [event["id"] for event in queue.claim(1)] == [1]
+    assert [event["id"] for event in queue.claim(5)] == [2]
+    assert queue.claim(5) == []
+    assert queue.report() == {"pending": 0, "claimed": 2}
+
+
+def test_ack_removes_event(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue({"id": 1, "input": "a"})
+    queue.claim()
+    queue.ack(1)
+    assert len(queue) == 0
+    assert queue.get(1) is None
+
+
+def test_recover_returns_claimed_events(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue({"id": 1, "input": "a"})
+    queue.claim()
+    reopened = make_queue(tmp_path)
+    assert reopened.recover() == 1
+    assert [event["id"] for event in reopened.claim()] == [1]
+
+
+def test_retry_until_attempts_run_out(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue({"id": 1, "input": "a"})
+    for _ in range(2):
+        assert queue.claim()
+        assert queue.retry(1, max_attempts=3)
+    assert queue.claim()
+    assert not queue.retry(1, max_attempts=3)
+    assert queue.claim() == []
+    assert queue.report() == {"pending": 0, "claimed": 1}
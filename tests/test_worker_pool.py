@@ -0,0 +1,15 @@
+from src import worker_pool
+from src.worker_pool import split_cores, worker_ram_budget
+
+
+def test_ram_budget_is_shared_between_workers():
+    assert worker_ram_budget(4, 24) == 6
+    assert worker_ram_budget(1, 24) == 24
+    assert worker_ram_budget(4, None) is None
+
+
+def test_cores_do_not_overlap(monkeypatch):
+    monkeypatch.setattr(worker_pool, "_available_cores", lambda: list(range(8)))
+    assert split_cores(2) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert split_cores(2, cores_per_worker=8) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert split_cores(3, cores_per_worker=1) == [[0], [1], [2]]